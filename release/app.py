@@ -1,14 +1,27 @@
 import os
-import ast
+import glob
+import atexit
 import time
 import json
+import sqlite3
 import random
 import hashlib
 from datetime import datetime
 import builtins
-
-from core.qrcode import generate_qr_ascii
-from core.encryption import get_ssn, generate_keypair, generate_keystream, encrypt, decrypt_with_priv, decrypt_with_pub, sign, check_integrity
+from itertools import islice
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from core.ed25519 import set_base_table_file, verify_keypairs
+from core.keystream import keystream_cache
+from core.compression import compress_payload
+from core.contacts import ContactIndex, CONTACT_ADDED, CONTACT_UNCHANGED
+from core.archive import MessageArchive
+from core.records import Keypair, Contact, MessageRing, compact, as_dicts
+from core.storage import JsonlLog, MessageDb, WriteBehind, file_signature, write_atomic, write_json_atomic, CONVERSATION_PAGE_SIZE
+from core.config import ConfigFile, Setting, defaults
+from core.frame import MAGIC as FRAME_MAGIC, make_frame, pack as pack_frame, unpack as unpack_frame, render_armored, parse_armored, iter_armored, TOP_MARKING, BOTTOM_MARKING
+from core.encryption import get_ssn, generate_keypair, generate_keypairs, generate_keystream, encrypt, encrypt_into, decrypt_with_priv, decrypt_with_pub, encrypt_broadcast, decrypt_broadcast, sign, check_integrity
 
 ASCII = """
 
@@ -27,11 +40,15 @@ ASCII = """
 
 keypairs_file = "data/keypairs.json"
 messages_file = "data/messages.json"
+messages_archive_file = "data/messages.archive"
 contacts_file = "data/contacts.json"
 
 configuration_file = "data/conf.config"
 user_config_file = "data/user.config"
 
+base_table_file = "data/basepoint.table"
+keypairs_verified_file = "data/keypairs.verified"
+
 # ---- helpers ----
 
 timestamp = datetime.now().strftime("[%Y-%m-%d - %H:%M:%S]")
@@ -39,166 +56,79 @@ timestamp = datetime.now().strftime("[%Y-%m-%d - %H:%M:%S]")
 def random_num():
     return random.randint(0, 90000000)
 
+def default_username():
+    return f"user{random_num()}"
+
 # ---- default configurations ----
 
 
-DEFAULT_CONFIG = {
-    "storing_messages": True,
-    "number_of_saved_messages": 10,
-    "storing_keypairs": True,
-    "number_of_saved_keypairs": 10,
-    "storing_contacts": True,
-    "number_of_saved_contacts": 10
+# every setting with its type and default, see core/config.py
+CONFIG_SCHEMA = {
+    "storing_messages": Setting(bool, True),
+    "number_of_saved_messages": Setting(int, 10, minimum=0),
+    "storing_keypairs": Setting(bool, True),
+    "number_of_saved_keypairs": Setting(int, 10, minimum=0),
+    "storing_contacts": Setting(bool, True),
+    "number_of_saved_contacts": Setting(int, 10, minimum=0),
+    "verify_keypairs_on_startup": Setting(bool, False),
+    "storage_format": Setting(str, "json", ("json", "jsonl")),
+    "storage_fsync_every": Setting(int, 0, minimum=0),
+    # "" uses storage_format, "sqlite" is only available here
+    "message_storage_format": Setting(str, "", ("", "json", "jsonl", "sqlite")),
+    # messages the sqlite store keeps, 0 for all of them (number_of_saved_messages
+    # is only what's held in memory there)
+    "message_db_retention": Setting(int, 0, minimum=0),
+    "write_behind": Setting(bool, True),
+    # json/jsonl only, the sqlite table already holds the history
+    "archive_messages": Setting(bool, True),
+    # payload compression before encryption (see core/compression.py). off by
+    # default: end to end in bench_compression.py it didn't pay for itself
+    "message_compression": Setting(str, "none", ("none", "auto", "zlib", "lzma"))
 }
 
-DEFAULT_USER_CONFIG = {
-    "username": f"user{random_num()}",
-    "bio": f""
+USER_CONFIG_SCHEMA = {
+    "username": Setting(str, default_username),
+    "bio": Setting(str, f"")
 }
 
+DEFAULT_CONFIG = defaults(CONFIG_SCHEMA)
+DEFAULT_USER_CONFIG = defaults(USER_CONFIG_SCHEMA)
+
 
 
 
 # ---- parsers ----
 
-class ConfigurationParser:
+class ConfigurationParser(ConfigFile):
     def __init__(self, filepath):
-        self.filepath = filepath
-        self.config = {}
-        self.load()
-
-    def load(self):
-        # Check if file exists
-        if not os.path.exists(self.filepath):
-            print(f"{timestamp} Configuration file not found, creating one with defaults...")
-            os.makedirs(os.path.dirname(self.filepath), exist_ok=True)
-            self.config = DEFAULT_CONFIG.copy()
-            self.save()
-            return
-
-        # Read the file
-        with open(self.filepath, 'r') as f:
-            lines = f.readlines()
-
-        # If file is empty, treat as corrupted
-        if not lines:
-            print(f"{timestamp} Configuration file found but empty, filling with defaults...")
-            self.config = DEFAULT_CONFIG.copy()
-            self.save()
-            return
-
-        # Try parsing each line
-        for line in lines:
-            line = line.strip()
-            if not line or line.startswith("#"):
-                continue
-            if '=' in line:
-                key, value = line.split('=', 1)
-                key = key.strip()
-                value = value.strip()
-                try:
-                    self.config[key] = ast.literal_eval(value)
-                except Exception:
-                    print(f"{timestamp} Warning: Could not parse line: '{line}'. Using default if available.")
-                    # fallback to default if exists
-                    if key in DEFAULT_CONFIG:
-                        self.config[key] = DEFAULT_CONFIG[key]
-
-        # Make sure any missing defaults are added
-        for key, value in DEFAULT_CONFIG.items():
-            self.config.setdefault(key, value)
-
-
-    def save(self):
-        with open(self.filepath, 'w') as f:
-            for key, value in self.config.items():
-                f.write(f"{key} = {repr(value)}\n")
-
-    def get(self, key, default=None):
-        return self.config.get(key, default)
-
-    def set(self, key, value):
-        self.config[key] = value
-        self.save()
-
-    def delete(self, key):
-        if key in self.config:
-            del self.config[key]
-            self.save()
+        super().__init__(filepath, CONFIG_SCHEMA, "Configuration", on_warning=lambda message: print(f"{timestamp} {message}"))
 
-class UserConfigParser():
+class UserConfigParser(ConfigFile):
     def __init__(self, filepath):
-        self.filepath = filepath
-        self.config = {}
-        self.load()
-
-    def load(self):
-        # Check if file exists
-        if not os.path.exists(self.filepath):
-            print(f"{timestamp} User configuration file not found, creating one with defaults...")
-            os.makedirs(os.path.dirname(self.filepath), exist_ok=True)
-            self.config = DEFAULT_USER_CONFIG.copy()
-            self.save()
-            return
-
-        # Read the file
-        with open(self.filepath, 'r') as f:
-            lines = f.readlines()
-
-        # If file is empty, treat as corrupted
-        if not lines:
-            print(f"{timestamp} User configuration file found but empty, filling with defaults...")
-            self.config = DEFAULT_USER_CONFIG.copy()
-            self.save()
-            return
-
-        # Try parsing each line
-        for line in lines:
-            line = line.strip()
-            if not line or line.startswith("#"):
-                continue
-            if '=' in line:
-                key, value = line.split('=', 1)
-                key = key.strip()
-                value = value.strip()
-                try:
-                    self.config[key] = ast.literal_eval(value)
-                except Exception:
-                    print(f"{timestamp} Warning: Could not parse line: '{line}'. Using default if available.")
-                    # fallback to default if exists
-                    if key in DEFAULT_USER_CONFIG:
-                        self.config[key] = DEFAULT_USER_CONFIG[key]
-
-        # Make sure any missing defaults are added
-        for key, value in DEFAULT_USER_CONFIG.items():
-            self.config.setdefault(key, value)
-
-
-    def save(self):
-        with open(self.filepath, 'w') as f:
-            for key, value in self.config.items():
-                f.write(f"{key} = {repr(value)}\n")
-
-    def get(self, key, default=None):
-        return self.config.get(key, default)
-
-    def set(self, key, value):
-        self.config[key] = value
-        self.save()
-
-    def delete(self, key):
-        if key in self.config:
-            del self.config[key]
-            self.save()
+        super().__init__(filepath, USER_CONFIG_SCHEMA, "User configuration", on_warning=lambda message: print(f"{timestamp} {message}"))
 
 class KeypairParser:
-    def __init__(self, filepath, limit=10):
+    def __init__(self, filepath, limit=10, storage="json", fsync_every=0, writer=None):
         self.filepath = filepath
         self.limit = limit
-        self.keypairs = []
+        self.writer = writer    # a WriteBehind that takes the json writes off the caller's thread
+        # ring buffer: appending past the limit evicts the oldest in O(1)
+        self.keypairs = deque(maxlen=limit)
+        # "jsonl": append-only log, one record per line (see core/storage.py)
+        self.log = JsonlLog(filepath, fsync_every) if storage == "jsonl" else None
         self.load()
 
+    def record(self, record_dict):
+        # the compact in-memory form (core/records.py), json keeps the dict form
+        return compact(Keypair, record_dict)
+
     def load(self):
+        if self.log is not None:
+            if not self.log.exists():
+                print(f"{timestamp} No keypair log found, creating a new one...")
+            self.keypairs = deque(map(self.record, self.log.load(self.limit)), maxlen=self.limit)
+            self.compact_if_needed()
+            return
         if not os.path.exists(self.filepath):
             print(f"{timestamp} No keypair file found, creating a new one...")
             os.makedirs(os.path.dirname(self.filepath), exist_ok=True)
@@ -206,20 +136,53 @@ class KeypairParser:
             return
         try:
             with open(self.filepath, "r") as f:
-                self.keypairs = json.load(f)
+                self.keypairs = deque(map(self.record, json.load(f)), maxlen=self.limit)
         except (json.JSONDecodeError, FileNotFoundError):
             print(f"{timestamp} Keypair file corrupted or empty, resetting...")
-            self.keypairs = []
+            self.keypairs.clear()
             self.save()
 
     def save(self):
-        with open(self.filepath, "w") as f:
-            json.dump(self.keypairs[-self.limit:], f, indent=4)
+        if self.log is not None:
+            self.log.compact(as_dicts(self.keypairs))
+            return
+        if self.writer is not None:
+            self.writer.schedule(self.filepath, self.dump())
+            return
+        self.write()
+
+    def dump(self):
+        return json.dumps(as_dicts(self.keypairs), indent=4)
+
+    def write(self):
+        write_atomic(self.filepath, self.dump())
+
+    def compact_if_needed(self):
+        # the log is allowed to grow to twice the limit before it's rewritten
+        if self.log is not None and self.log.count > 2 * self.limit:
+            self.save()
+
+    def close(self):
+        if self.log is not None:
+            self.log.close()
 
     def append_keypair(self, keypair_dict):
         """Append a new keypair and trim the list if necessary."""
-        self.keypairs.append(keypair_dict)
-        self.save()
+        self.keypairs.append(self.record(keypair_dict))
+        if self.log is None:
+            self.save()
+        else:
+            self.log.append(keypair_dict)
+            self.compact_if_needed()
+
+    def extend_keypairs(self, keypair_dicts):
+        """Append many keypairs with a single write."""
+        self.keypairs.extend(map(self.record, keypair_dicts))
+        if self.log is None:
+            self.save()
+        else:
+            self.log.extend(keypair_dicts)
+            self.compact_if_needed()
 
     def delete_keypair(self, index):
         if 0 <= index < len(self.keypairs):
@@ -230,13 +193,35 @@ class KeypairParser:
         return self.keypairs
 
 class MessageParser:
-    def __init__(self, filepath, limit=10):
+    def __init__(self, filepath, limit=10, storage="json", fsync_every=0, writer=None, archive=None, retention=0):
         self.filepath = filepath
         self.limit = limit
-        self.messages = []
+        self.retention = retention or None  # rows the sqlite store keeps, None: all
+        self.writer = writer    # a WriteBehind that takes the json writes off the caller's thread
+        self.archive = archive  # a MessageArchive that keeps what ages out of the limit
+        # columnar ring buffer (core/records.py): appending past the limit
+        # evicts the oldest in O(1), see push()
+        self.messages = MessageRing(limit)
+        # "jsonl": append-only log, one record per line (see core/storage.py)
+        self.log = JsonlLog(filepath, fsync_every) if storage == "jsonl" else None
+        # "sqlite": indexed message table, for conversation() over long histories
+        self.db = None
+        if storage == "sqlite":
+            if not os.path.exists(filepath):
+                print(f"{timestamp} No message database found, creating a new one...")
+            self.db = MessageDb(filepath)
         self.load()
 
     def load(self):
+        if self.db is not None:
+            self.messages = MessageRing(self.limit, self.db.latest(self.limit))
+            return
+        if self.log is not None:
+            if not self.log.exists():
+                print(f"{timestamp} No message log found, creating a new one...")
+            self.messages = MessageRing(self.limit, self.log.load(self.limit))
+            self.compact_if_needed()
+            return
         if not os.path.exists(self.filepath):
             print(f"{timestamp} No message file found, creating a new one...")
             os.makedirs(os.path.dirname(self.filepath), exist_ok=True)
@@ -244,37 +229,143 @@ class MessageParser:
             return
         try:
             with open(self.filepath, "r") as f:
-                self.messages = json.load(f)
+                messages = json.load(f)
+            # a file written under a higher limit: the excess goes to the archive
+            self.push(messages)
+            if len(messages) > self.limit:
+                self.save()
         except (json.JSONDecodeError, FileNotFoundError):
             print(f"{timestamp} Message file corrupted or empty, resetting...")
-            self.messages = []
+            self.messages.clear()
             self.save()
 
     def save(self):
-        with open(self.filepath, "w") as f:
-            json.dump(self.messages[-self.limit:], f, indent=4)
+        if self.db is not None:
+            # every message is already in the table, saving only applies the retention
+            if self.retention is not None:
+                self.db.trim(self.retention)
+            return
+        if self.log is not None:
+            self.log.compact(as_dicts(self.messages))
+            return
+        if self.writer is not None:
+            self.writer.schedule(self.filepath, self.dump())
+            return
+        self.write()
+
+    def dump(self):
+        return json.dumps(as_dicts(self.messages), indent=4)
+
+    def write(self):
+        write_atomic(self.filepath, self.dump())
+
+    def compact_if_needed(self):
+        # the log is allowed to grow to twice the limit before it's rewritten
+        if self.log is not None and self.log.count > 2 * self.limit:
+            self.save()
+
+    def push(self, msg_dicts):
+        # appends to the ring, the messages it evicts go to the archive
+        overflow = len(self.messages) + len(msg_dicts) - self.limit
+        if overflow > 0 and self.archive is not None:
+            evicted = list(islice(self.messages, min(overflow, len(self.messages))))
+            evicted.extend(msg_dicts[:max(overflow - len(self.messages), 0)])
+            self.archive.append_many(as_dicts(evicted))
+        self.messages.extend(msg_dicts)
+
+    def close(self):
+        if self.log is not None:
+            self.log.close()
+        if self.db is not None:
+            self.db.close()
+        if self.archive is not None:
+            self.archive.close()
 
     def append_message(self, msg_dict):
         """Append a message (dict: {content, sender_pk, receiver_pk, timestamp})."""
-        self.messages.append(msg_dict)
-        self.save()
+        self.push([msg_dict])
+        if self.db is not None:
+            self.db.insert_many([msg_dict], keep=self.retention)
+        elif self.log is None:
+            self.save()
+        else:
+            self.log.append(msg_dict)
+            self.compact_if_needed()
+
+    def extend_messages(self, msg_dicts):
+        """Append many messages with a single write."""
+        self.push(msg_dicts)
+        if self.db is not None:
+            self.db.insert_many(msg_dicts, keep=self.retention)
+        elif self.log is None:
+            self.save()
+        else:
+            self.log.extend(msg_dicts)
+            self.compact_if_needed()
 
     def delete_message(self, index):
         if 0 <= index < len(self.messages):
+            if self.db is not None:
+                # the next older message in the table moves up into the ring
+                self.db.delete_latest(len(self.messages) - 1 - index)
+                self.messages = MessageRing(self.limit, self.db.latest(self.limit))
+                return
             del self.messages[index]
             self.save()
 
     def get_all(self):
         return self.messages
 
+    def archived(self, start=None, end=None, limit=None):
+        """Archived messages with start <= timestamp <= end, oldest first."""
+        if self.db is not None:
+            # the table is the whole history, there's no separate archive
+            return self.db.between(start, end, limit)
+        if self.archive is None:
+            return []
+        return self.archive.between(start, end, limit)
+
+    def conversation(self, public_key_a, public_key_b, after=None, cursor=None, page_size=CONVERSATION_PAGE_SIZE):
+        """One page of the messages between two keys and the cursor for the next page."""
+        if self.db is not None:
+            return self.db.conversation(public_key_a, public_key_b, after, cursor, page_size)
+
+        # json/jsonl: a scan of the list in memory, the cursor is a list position
+        pair = {(public_key_a, public_key_b), (public_key_b, public_key_a)}
+        start = 0 if cursor is None else cursor
+        page = []
+        for position, m in enumerate(islice(self.messages, start, None), start):
+            if (m.get("sender_public_key"), m.get("receiver_public_key")) not in pair:
+                continue
+            if after is not None and m.get("timestamp", "") <= after:
+                continue
+            if len(page) == page_size:
+                return page, position
+            page.append(m)
+        return page, None
+
 class ContactParser:
-    def __init__(self, filepath, limit=10):
+    def __init__(self, filepath, limit=10, storage="json", fsync_every=0, writer=None):
         self.filepath = filepath
         self.limit = limit
-        self.contacts = []
+        self.writer = writer    # a WriteBehind that takes the json writes off the caller's thread
+        # one entry per public key, with an ssn index (see core/contacts.py)
+        self.index = ContactIndex()
+        # "jsonl": append-only log, one record per line (see core/storage.py)
+        self.log = JsonlLog(filepath, fsync_every) if storage == "jsonl" else None
         self.load()
 
+    def record(self, record_dict):
+        # the compact in-memory form (core/records.py), json keeps the dict form
+        return compact(Contact, record_dict)
+
     def load(self):
+        if self.log is not None:
+            if not self.log.exists():
+                print(f"{timestamp} No contact log found, creating a new one...")
+            # an updated contact is logged again, the last line for a key wins
+            self.build_index(self.log.load())
+            return
         if not os.path.exists(self.filepath):
             print(f"{timestamp} No contact file found, creating a new one...")
             os.makedirs(os.path.dirname(self.filepath), exist_ok=True)
@@ -282,33 +373,342 @@ class ContactParser:
             return
         try:
             with open(self.filepath, "r") as f:
-                self.contacts = json.load(f)
+                self.build_index(json.load(f))
         except (json.JSONDecodeError, FileNotFoundError):
             print(f"{timestamp} Contact file corrupted or empty, resetting...")
-            self.contacts = []
+            self.index = ContactIndex()
+            self.save()
+
+    def build_index(self, contacts):
+        self.index = ContactIndex(map(self.record, contacts))
+        self.index.trim(self.limit)
+        if self.log is not None:
+            # repeated keys and contacts past the limit are normal in a log
+            self.compact_if_needed()
+        elif len(contacts) > len(self.index):
+            # files written before upserts can hold the same key many times
             self.save()
 
     def save(self):
-        with open(self.filepath, "w") as f:
-            json.dump(self.contacts[-self.limit:], f, indent=4)
+        if self.log is not None:
+            self.log.compact(as_dicts(self.index.all()))
+            return
+        if self.writer is not None:
+            self.writer.schedule(self.filepath, self.dump())
+            return
+        self.write()
+
+    def dump(self):
+        return json.dumps(as_dicts(self.index.all()), indent=4)
+
+    def write(self):
+        write_atomic(self.filepath, self.dump())
+
+    def compact_if_needed(self):
+        # the log is allowed to grow to twice the limit before it's rewritten
+        if self.log is not None and self.log.count > 2 * self.limit:
+            self.save()
+
+    def close(self):
+        if self.log is not None:
+            self.log.close()
+
+    def upsert(self, contact_dict):
+        # adds or updates in memory, returns the contact if anything changed
+        status = self.index.add(self.record(contact_dict))
+        if status == CONTACT_UNCHANGED:
+            return None
+        if status == CONTACT_ADDED:
+            for public_key in self.index.colliding(contact_dict["public_key"]):
+                print(f"{timestamp} Warning: SSN collision, {get_ssn(public_key)} is also the SSN of {public_key}")
+        self.index.trim(self.limit)
+        return contact_dict
 
     def append_contact(self, contact_dict):
-        """Append contact (dict: {name, public_key})."""
-        self.contacts.append(contact_dict)
-        self.save()
+        """Add a contact (dict: {name, public_key}), or update the one with the same key."""
+        self.extend_contacts([contact_dict])
+
+    def extend_contacts(self, contact_dicts):
+        """Add or update many contacts with a single write."""
+        changed = [c for c in contact_dicts if self.upsert(c) is not None]
+        if not changed:
+            return
+        if self.log is None:
+            self.save()
+        else:
+            self.log.extend(changed)
+            self.compact_if_needed()
 
     def delete_contact(self, index):
-        if 0 <= index < len(self.contacts):
-            del self.contacts[index]
+        keys = list(self.index.records)
+        if 0 <= index < len(keys):
+            removed = self.index.remove(keys[index])
+            keystream_cache.evict(removed.get("public_key"))
             self.save()
 
+    def get(self, public_key):
+        return self.index.get(public_key)
+
+    def find(self, ssn_prefix, limit=None):
+        """Contacts whose SSN starts with ssn_prefix."""
+        return self.index.find_prefix(ssn_prefix, limit)
+
+    def collisions(self):
+        return self.index.collisions()
+
     def get_all(self):
-        return self.contacts
+        return self.index.all()
+
+
+# "json" rewrites the whole file on every save, "jsonl" appends one line per
+# record to a .jsonl file next to it (see core/storage.py), "sqlite" keeps
+# messages in an indexed database (messages only)
+STORAGE_FORMATS = ("json", "jsonl")
+MESSAGE_STORAGE_FORMATS = STORAGE_FORMATS + ("sqlite",)
+
+STORAGE_EXTENSIONS = {
+    "jsonl": ".jsonl",
+    "sqlite": ".db"
+}
+
+def storage_path(filepath, storage):
+    if storage in STORAGE_EXTENSIONS:
+        return os.path.splitext(filepath)[0] + STORAGE_EXTENSIONS[storage]
+    return filepath
+
+
+def store_mtime(path):
+    # when the store at path was last written, None if there's none; sqlite
+    # writes land in the -wal file until a checkpoint
+    times = [os.stat(name).st_mtime_ns for name in (path, f"{path}-wal") if os.path.exists(name)]
+    return max(times) if times else None
+
+
+def read_store(path, storage):
+    if storage == "sqlite":
+        db = MessageDb(path)
+        try:
+            return db.latest(db.count())
+        finally:
+            db.close()
+    if storage == "jsonl":
+        return JsonlLog(path).load()
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def write_store(path, storage, records):
+    if storage == "sqlite":
+        # the stale table is replaced, not added to
+        for name in (path, f"{path}-wal", f"{path}-shm"):
+            if os.path.exists(name):
+                os.remove(name)
+        db = MessageDb(path)
+        db.insert_many(records)
+        db.close()
+    elif storage == "jsonl":
+        JsonlLog(path).compact(records)
+    else:
+        write_json_atomic(path, records)
+
+
+def import_store(filepath, storage, formats=STORAGE_FORMATS):
+    # a store opened in one format starts from whichever of its formats was
+    # written last: when another format's file is newer than this one's (or
+    # this one has none), its records replace this one's. the other files are
+    # left as they are, so switching back imports again if needed
+    path = storage_path(filepath, storage)
+    target_mtime = store_mtime(path)
+    newest = None
+    for source_storage in formats:
+        source = storage_path(filepath, source_storage)
+        mtime = store_mtime(source)
+        if source == path or mtime is None:
+            continue
+        if (target_mtime is None or mtime > target_mtime) and (newest is None or mtime > newest[0]):
+            newest = (mtime, source, source_storage)
+    if newest is None:
+        return
+
+    _, source, source_storage = newest
+    try:
+        records = read_store(source, source_storage)
+    except (json.JSONDecodeError, OSError, sqlite3.Error):
+        print(f"{timestamp} Could not read {source}, not importing it into {path}")
+        return
+    if not isinstance(records, list):
+        print(f"{timestamp} {source} doesn't hold a list of records, not importing it into {path}")
+        return
+
+    write_store(path, storage, records)
+    print(f"{timestamp} Imported {len(records)} records from {source} into {path}")
+
+
+def open_store(parser_class, filepath, limit_key, storage_key="storage_format", formats=STORAGE_FORMATS, **options):
+    cfg = context.config()
+    storage = cfg.get(storage_key) or cfg.get("storage_format")
+    if storage not in formats:
+        raise ValueError(f"unknown storage format '{storage}'")
+    import_store(filepath, storage, formats)
+    return parser_class(
+        storage_path(filepath, storage),
+        limit=cfg.get(limit_key),
+        storage=storage,
+        fsync_every=cfg.get("storage_fsync_every"),
+        writer=context.writer if cfg.get("write_behind") == True else None,
+        **options
+    )
+
+def open_keypairs():
+    return open_store(KeypairParser, keypairs_file, "number_of_saved_keypairs")
+
+def open_messages():
+    cfg = context.config()
+    storage = cfg.get("message_storage_format") or cfg.get("storage_format")
+    # the sqlite table keeps what ages out of the ring itself
+    archive = None
+    if cfg.get("archive_messages") == True and storage != "sqlite":
+        archive = MessageArchive(messages_archive_file)
+    return open_store(
+        MessageParser, messages_file, "number_of_saved_messages", "message_storage_format", MESSAGE_STORAGE_FORMATS,
+        archive=archive, retention=cfg.get("message_db_retention")
+    )
+
+def open_contacts():
+    return open_store(ContactParser, contacts_file, "number_of_saved_contacts")
+
+
+# ---- session context ----
+# one shared instance of every parser for the whole session. a store is read
+# from disk when it's first asked for and again only if its file changed
+# (mtime or size) since. code that writes through a shared parser calls
+# written() afterwards, so its own writes don't count as a change. json
+# stores write through self.writer in the background, a file with a write
+# pending is never reloaded (memory is newer than disk).
+#
+# the config files are kept for the whole session and refresh() themselves
+# (core/config.py); the stores are rebuilt when a setting they're built from
+# changes.
+
+class AppContext:
+    # the stores built from the configuration, rebuilt when it changes
+    CONFIGURED = ("keypairs", "messages", "contacts")
+    STORE_SETTINGS = (
+        "number_of_saved_messages", "number_of_saved_keypairs", "number_of_saved_contacts",
+        "storage_format", "storage_fsync_every", "message_storage_format", "message_db_retention",
+        "write_behind", "archive_messages"
+    )
+
+    def __init__(self):
+        self.entries = {}    # name -> [filepath, signature, parser]
+        self.configs = {}    # name -> ConfigFile
+        self.counts = {"reads": 0, "reuses": 0, "reloads": 0}
+        self.writer = WriteBehind(on_written=self.written_file, on_error=self.write_failed)
+
+    def _shared(self, name, filepath, build):
+        entry = self.entries.get(name)
+        if entry is not None and entry[0] == filepath:
+            if self.writer.owns(filepath) or entry[1] == file_signature(filepath):
+                self.counts["reuses"] += 1
+                return entry[2]
+            self.counts["reloads"] += 1
+
+        if entry is not None:
+            self._close(name)
+        parser = build()
+        self.entries[name] = [filepath, file_signature(filepath), parser]
+        self.counts["reads"] += 1
+        return parser
+
+    def _close(self, name):
+        if name in self.entries:
+            self.writer.flush()
+        entry = self.entries.pop(name, None)
+        if entry is not None and hasattr(entry[2], "close"):
+            entry[2].close()
+
+    def written(self, name):
+        # the shared parser wrote its own file, it's still current
+        entry = self.entries.get(name)
+        if entry is not None:
+            entry[1] = file_signature(entry[0])
+
+    def written_file(self, filepath):
+        # called by the writer thread after it wrote filepath
+        for entry in list(self.entries.values()):
+            if entry[0] == filepath:
+                entry[1] = file_signature(filepath)
+
+    def write_failed(self, filepath, error):
+        # called by the writer thread, the write stays pending and is retried
+        print(f"{timestamp} Could not write {filepath or 'pending files'}: {error}")
+
+    def _config(self, name, build):
+        cfg = self.configs.get(name)
+        if cfg is None:
+            cfg = self.configs[name] = build()
+            self.counts["reads"] += 1
+        elif cfg.refresh():
+            self.counts["reloads"] += 1
+        else:
+            self.counts["reuses"] += 1
+        return cfg
+
+    def config(self):
+        return self._config("config", self.open_config)
+
+    def open_config(self):
+        cfg = ConfigurationParser(configuration_file)
+        cfg.subscribe(self.config_changed)
+        return cfg
+
+    def user_config(self):
+        return self._config("user_config", lambda: UserConfigParser(user_config_file))
+
+    def config_changed(self, changed, cfg):
+        # limits and storage formats are fixed when a store is built
+        if any(key in changed for key in self.STORE_SETTINGS):
+            for name in self.CONFIGURED:
+                self._close(name)
+
+    def _store(self, name, filepath, storage_key, opener):
+        cfg = self.config()
+        storage = cfg.get(storage_key) or cfg.get("storage_format")
+        return self._shared(name, storage_path(filepath, storage), opener)
+
+    def keypairs(self):
+        return self._store("keypairs", keypairs_file, "storage_format", open_keypairs)
+
+    def messages(self):
+        return self._store("messages", messages_file, "message_storage_format", open_messages)
+
+    def contacts(self):
+        return self._store("contacts", contacts_file, "storage_format", open_contacts)
+
+    def stats(self):
+        return dict(self.counts)
+
+    def flush(self):
+        self.writer.flush()
+
+    def close(self):
+        self.flush()
+        for name in list(self.entries):
+            self._close(name)
+        for cfg in self.configs.values():
+            cfg.unwatch()
+
+
+context = AppContext()
+# nothing scheduled may be lost when the interpreter exits without main()'s cleanup
+atexit.register(context.flush)
+
+
 # ---- loaders ----
 
 def load_client_config():
     print(f"{timestamp} Initialising configuration parser...")
-    cfg = ConfigurationParser(configuration_file)
+    cfg = context.config()
 
     print(f"{timestamp} Loading configuration...")
     print("\n")
@@ -319,7 +719,7 @@ def load_client_config():
     if storing_keypairs == True:
         print(f"{timestamp} Storing keypairs is turned on")
         print(f"{timestamp} Initialising Keypair parser")
-        kpk = KeypairParser(keypairs_file)
+        kpk = context.keypairs()
         print(f"{timestamp} Keypair parser intitialised")
         number_of_stored_keypairs = cfg.get("number_of_saved_keypairs")
         print(f"{timestamp} Storing the last {number_of_stored_keypairs} used keypairs.")
@@ -331,7 +731,7 @@ def load_client_config():
     if storing_messages == True:
         print(f"{timestamp} Storing messages is turned on")
         print(f"{timestamp} Initialising Message parser")
-        msg = MessageParser(messages_file)
+        msg = context.messages()
         print(f"{timestamp} Message parser intitialised")
         number_of_stored_messages = cfg.get("number_of_saved_messages")
         print(f"{timestamp} Storing the last {number_of_stored_messages} sent messages.")
@@ -343,7 +743,7 @@ def load_client_config():
     if storing_contacts == True:
         print(f"{timestamp} Storing contacts is turned on")
         print(f"{timestamp} Initialising Contact parser")
-        ctb = ContactParser(contacts_file)
+        ctb = context.contacts()
         print(f"{timestamp} Contact parser intitialised")
         number_of_stored_contacts = cfg.get("number_of_saved_contacts")
         print(f"{timestamp} Storing the last {number_of_stored_contacts} contacts.")
@@ -352,11 +752,15 @@ def load_client_config():
         print(f"{timestamp} Storing contacts is turned off")
         print("\n")
 
+    if cfg.get("verify_keypairs_on_startup") == True:
+        verify_store()
+        print("\n")
+
 
 
 def load_user_config():
     print(f"{timestamp} Initialising user configuration parser...")
-    ucfg = UserConfigParser(user_config_file)
+    ucfg = context.user_config()
 
     print(f"{timestamp} Loading user configuration...")
     print(f"{timestamp} Loading username...")
@@ -371,7 +775,7 @@ def load_user_config():
 
 
 def cli():
-    ucfg = UserConfigParser(user_config_file)
+    ucfg = context.user_config()
     client_username = ucfg.get("username")
 
     user_input = input(f"${client_username}: ")
@@ -382,7 +786,14 @@ def cli():
         "econf": "edit client configuration",
         "euconf": "edit user configuration",
         "dcrypt": "decrypts a message",
-        "tmsg": "makes a test message"
+        "tmsg": "makes a test message",
+        "bpair": "generates many keypairs at once",
+        "vstore": "re-validates every stored keypair",
+        "cstore": "compacts the stored keypairs, messages and contacts",
+        "cmsg": "shows the stored messages between two keys",
+        "fcon": "finds contacts by SSN prefix",
+        "iostat": "shows the file reads the session context saved",
+        "amsg": "shows archived messages from a time range"
     }
 
     if user_input == "tmsg":
@@ -399,6 +810,56 @@ def cli():
             print(f"    valid status: {valid_status}")
             print("\n")
 
+        cli()
+    elif user_input == "bpair":
+        count = input("Number of keypairs: ")
+        if count.isdigit() and int(count) > 0:
+            print(f"{timestamp} Generating {count} keypairs..")
+            start = time.perf_counter()
+            keypairs = new_keypairs(int(count))
+            elapsed = time.perf_counter() - start
+            print(f"{timestamp} Generated {len(keypairs)} keypairs in {elapsed:.2f}s")
+        else:
+            print(f"\ninvalid number: '{count}'")
+
+        cli()
+    elif user_input == "vstore":
+        verify_store()
+        cli()
+    elif user_input == "cstore":
+        compact_stores()
+        cli()
+    elif user_input == "cmsg":
+        public_key_a = input("First public key: ").strip()
+        public_key_b = input("Second public key: ").strip()
+        after = input("Only after (YYYY-mm-dd HH:MM:SS, blank for all): ").strip()
+        show_conversation(public_key_a, public_key_b, after or None)
+        cli()
+    elif user_input == "fcon":
+        prefix = input("SSN prefix: ").strip()
+        for contact in context.contacts().find(prefix, limit=20):
+            print(f"{contact['name']} -> {contact['public_key']}")
+        cli()
+    elif user_input == "dcrypt":
+        target = read_pasted(input("Message, file, directory or glob: ").strip())
+        receiver_public_key = input("Receiver public key (blank for the latest keypair): ").strip()
+        if not receiver_public_key:
+            keypairs = context.keypairs().get_all()
+            receiver_public_key = keypairs[-1]["public_key"] if keypairs else ""
+        if receiver_public_key:
+            dcrypt(target, receiver_public_key)
+        else:
+            print("\nno receiver public key given and no stored keypairs")
+        cli()
+    elif user_input == "amsg":
+        start = input("From (YYYY-mm-dd HH:MM:SS, blank for the oldest): ").strip()
+        end = input("To (YYYY-mm-dd HH:MM:SS, blank for the newest): ").strip()
+        for m in context.messages().archived(start or None, end or None, limit=100):
+            print(f"[{m['timestamp']}] {get_ssn(m['sender_public_key'])}: {m['content']}")
+        cli()
+    elif user_input == "iostat":
+        counts = context.stats()
+        print(f"\n{counts['reads']} store reads, {counts['reloads']} of them after a change on disk, {counts['reuses']} reads avoided\n")
         cli()
     elif user_input == "help":
         print(cli_commands)
@@ -418,7 +879,7 @@ def cli():
 def new_keypair():
     seed, public_key, private_key, valid_status = generate_keypair()
     
-    cfg = ConfigurationParser(configuration_file)
+    cfg = context.config()
     storing_keypairs = cfg.get("storing_keypairs")
 
     if storing_keypairs == True:
@@ -428,9 +889,20 @@ def new_keypair():
     return seed, public_key, private_key, valid_status
             
 
-def save_keypair(seed, public_key, private_key, valid_status):
-    kpk = KeypairParser(keypairs_file)
+def new_keypairs(count, workers=None):
+    keypairs = generate_keypairs(count, workers=workers)
 
+    cfg = context.config()
+    storing_keypairs = cfg.get("storing_keypairs")
+
+    if storing_keypairs == True:
+        save_keypairs(keypairs)
+        print(f"{len(keypairs)} keypairs saved")
+
+    return keypairs
+
+
+def keypair_record(seed, public_key, private_key, valid_status):
     # convert bytes to hex string if necessary
     if isinstance(seed, bytes):
         seed = seed.hex()
@@ -439,55 +911,163 @@ def save_keypair(seed, public_key, private_key, valid_status):
     if isinstance(private_key, bytes):
         private_key = private_key.hex()
 
-    keypair_data = {
+    return {
         "seed": seed,
         "public_key": public_key,
         "private_key": private_key,
         "valid": bool(valid_status)  # make sure it's bool (boolymon)
     }
 
-    kpk.append_keypair(keypair_data)
+
+def save_keypair(seed, public_key, private_key, valid_status):
+    kpk = context.keypairs()
+
+    kpk.append_keypair(keypair_record(seed, public_key, private_key, valid_status))
+    context.written("keypairs")
     print("[+] Keypair saved successfully.")
 
 
+def save_keypairs(keypairs):
+    kpk = context.keypairs()
 
-def save_contact(public_key):
-    ssn = get_ssn(public_key)
-    ctb = ContactParser(contacts_file)
-    
-    new_contact = {
-        "name": ssn,
+    kpk.extend_keypairs([keypair_record(*keypair) for keypair in keypairs])
+    context.written("keypairs")
+    print("[+] Keypairs saved successfully.")
+
+
+
+def compact_stores():
+    # rewrites every store with only the records within its limit
+    for name in AppContext.CONFIGURED:
+        getattr(context, name)().save()
+        context.written(name)
+    print(f"{timestamp} Stores compacted")
+
+
+def keypair_content_hash(keypair_dict):
+    return hashlib.sha256(f"{keypair_dict.get('seed')}:{keypair_dict.get('public_key')}".encode()).hexdigest()
+
+
+def verify_store(workers=None):
+    # re-derive every stored public key from its seed; entries whose content
+    # hash was already checked on an earlier run are skipped
+
+    kpk = context.keypairs()
+    keypairs = kpk.get_all()
+
+    try:
+        with open(keypairs_verified_file, "r") as f:
+            verified = json.load(f)
+    except (json.JSONDecodeError, FileNotFoundError):
+        verified = {}
+
+    hashes = [keypair_content_hash(k) for k in keypairs]
+    results = {}
+    pending = []
+    for index, (keypair, content_hash) in enumerate(zip(keypairs, hashes)):
+        if content_hash in verified:
+            results[index] = verified[content_hash]
+            continue
+        try:
+            pending.append((index, bytes.fromhex(keypair["seed"]), bytes.fromhex(keypair["public_key"])))
+        except (KeyError, TypeError, ValueError):
+            results[index] = False
+
+    start = time.perf_counter()
+    checked = verify_keypairs([(seed, pub) for _, seed, pub in pending], workers=workers)
+    for (index, _, _), valid in zip(pending, checked):
+        results[index] = valid
+    elapsed = time.perf_counter() - start
+
+    changed = False
+    mismatches = 0
+    for index, keypair in enumerate(keypairs):
+        valid = results[index]
+        if not valid:
+            mismatches += 1
+            print(f"{timestamp} Keypair mismatch: #{index} ssn {get_ssn(str(keypair.get('public_key')))}")
+        if keypair.get("valid") != valid:
+            keypair["valid"] = valid
+            changed = True
+
+    if changed:
+        kpk.save()
+        context.written("keypairs")
+
+    write_json_atomic(keypairs_verified_file, {h: results[i] for i, h in enumerate(hashes)}, indent=None)
+
+    print(f"{timestamp} Verified {len(pending)} keypairs in {elapsed:.2f}s, skipped {len(keypairs) - len(pending)} unchanged, {mismatches} mismatches")
+    return mismatches
+
+
+def contact_record(public_key):
+    return {
+        "name": get_ssn(public_key),
         "public_key": public_key
     }
 
-    ctb.append_contact(new_contact)
 
-def see_all_contacts():
-    for c in contacts.get_all():
-        print(f"{c['name']} -> {c['public_key']}")
+def save_contact(public_key):
+    ctb = context.contacts()
 
+    ctb.append_contact(contact_record(public_key))
+    context.written("contacts")
 
 
+def save_contacts(public_keys):
+    ctb = context.contacts()
+
+    ctb.extend_contacts([contact_record(public_key) for public_key in public_keys])
+    context.written("contacts")
+
+def see_all_contacts():
+    for c in context.contacts().get_all():
+        print(f"{c['name']} -> {c['public_key']}")
 
-def save_message(message_sender_public_key, message_receiver_public_key, message):
 
-    msg = MessageParser(messages_file)
 
-    message_obj = {
+
+def message_record(message_sender_public_key, message_receiver_public_key, message):
+    return {
         "content": message,
         "sender_public_key": message_sender_public_key,
         "receiver_public_key": message_receiver_public_key,
         "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     }
 
-    msg.append_message(message_obj)
+
+def save_message(message_sender_public_key, message_receiver_public_key, message):
+
+    msg = context.messages()
+
+    msg.append_message(message_record(message_sender_public_key, message_receiver_public_key, message))
+    context.written("messages")
+
+
+def save_messages(message_sender_public_key, message_receiver_public_keys, message):
+    msg = context.messages()
+
+    msg.extend_messages([message_record(message_sender_public_key, pk, message) for pk in message_receiver_public_keys])
+    context.written("messages")
 
 
 def get_all_messages():
-    for m in msg.get_all():
+    for m in context.messages().get_all():
         print(f"[{m['timestamp']}] {m['content']}")
 
 
+def show_conversation(public_key_a, public_key_b, after=None):
+    # prints the conversation a page at a time
+    msg = context.messages()
+    cursor = None
+    while True:
+        page, cursor = msg.conversation(public_key_a, public_key_b, after=after, cursor=cursor)
+        for m in page:
+            print(f"[{m['timestamp']}] {get_ssn(m['sender_public_key'])}: {m['content']}")
+        if cursor is None or input("-- more (enter), q to stop -- ").strip() == "q":
+            break
+
+
 
 def random_content(word_count=30):
     syllables = ["ka", "ri", "do", "ma", "se", "to", "lu", "ven", "chi", "gra", "lo", "fa"]
@@ -496,6 +1076,157 @@ def random_content(word_count=30):
 
 
 
+# ---- dcrypt ----
+
+# batches smaller than this aren't worth starting a process pool for
+DCRYPT_POOL_MIN = 64
+
+
+def read_pasted(first_line):
+    # input() stops at the first newline: when a pasted armored message
+    # starts, the rest of it is read up to its last field. a blank line ends
+    # it early once a field after END was read, two end it before END (the
+    # message itself has single blank lines around the ciphertext)
+    if first_line != TOP_MARKING.strip():
+        return first_line
+    lines = [first_line]
+    ended = fields = False
+    while True:
+        try:
+            line = input().strip()
+        except EOFError:
+            break
+        if line == BOTTOM_MARKING.strip():
+            ended = True
+        elif not line:
+            if fields or (not ended and not lines[-1] and len(lines) > 2):
+                break
+        elif ended:
+            fields = True
+        lines.append(line)
+        if line.startswith("Content signature: "):
+            break
+    return "\n".join(lines)
+
+
+def message_files(target):
+    # a file, every file in a directory, or a glob pattern; [] if target is none of those
+    if os.path.isdir(target):
+        return sorted(os.path.join(target, name) for name in os.listdir(target) if os.path.isfile(os.path.join(target, name)))
+    if os.path.isfile(target):
+        return [target]
+    return sorted(path for path in glob.glob(target) if os.path.isfile(path))
+
+
+def frame_record(packed_frame):
+    # a binary frame as the same kind of record parse_armored() gives
+    frame = unpack_frame(packed_frame)
+    return {
+        "ciphertext": bytes(frame.ciphertext).hex(),
+        "recipients": [(public_key, bytes(wrapped_key).hex()) for public_key, wrapped_key in frame.recipients],
+        "ssn": frame.ssn
+    }
+
+
+def read_messages(source, text=None):
+    # [(source, record), ...] for one file, or for text pasted directly
+    if text is None:
+        with open(source, "rb") as f:
+            if f.read(len(FRAME_MAGIC)) == FRAME_MAGIC:
+                try:
+                    return [(source, frame_record(FRAME_MAGIC + f.read()))]
+                except ValueError:
+                    return [(source, None)]
+            f.seek(0)
+            return [(source, record) for record in iter_armored(f)]
+
+    records = parse_armored(text)
+    if not records:
+        # a bare ciphertext hex string
+        records = [{"ciphertext": "".join(text.split()), "recipients": []}]
+    return [(source, record) for record in records]
+
+
+def decrypt_record(job):
+    # (source, record, receiver public key) -> (source, status, plaintext, ciphertext size)
+    source, record, receiver_public_key = job
+    if record is None:
+        return source, "damaged frame", None, 0
+    if record.get("truncated"):
+        return source, "truncated message", None, 0
+
+    try:
+        ciphertext = bytes.fromhex(record["ciphertext"])
+    except ValueError:
+        return source, "invalid hex", None, 0
+    if not ciphertext:
+        return source, "empty ciphertext", None, 0
+
+    if record["recipients"]:
+        wrapped = dict(record["recipients"]).get(receiver_public_key)
+        if wrapped is None:
+            return source, "not a recipient", None, len(ciphertext)
+        try:
+            plaintext = decrypt_broadcast(ciphertext, bytes.fromhex(wrapped), receiver_public_key)
+        except ValueError:
+            return source, "invalid hex", None, len(ciphertext)
+    else:
+        plaintext = decrypt_with_pub(ciphertext.hex(), receiver_public_key)
+
+    if isinstance(plaintext, bytes):
+        return source, "invalid utf-8", None, len(ciphertext)
+    return source, "ok", plaintext, len(ciphertext)
+
+
+def decrypt_records(jobs, workers=None):
+    # ordered results; big batches are spread over a process pool
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1 or len(jobs) < DCRYPT_POOL_MIN:
+        return [decrypt_record(job) for job in jobs]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(decrypt_record, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+
+
+def dcrypt(target, receiver_public_key, workers=None):
+    files = message_files(target)
+    if files:
+        messages = []
+        for path in files:
+            try:
+                messages.extend(read_messages(path))
+            except OSError as e:
+                print(f"{timestamp} Could not read {path}: {e}")
+    else:
+        messages = read_messages("<input>", target)
+
+    jobs = [(source, record, receiver_public_key) for source, record in messages]
+
+    start = time.perf_counter()
+    results = decrypt_records(jobs, workers)
+    elapsed = time.perf_counter() - start
+
+    failures = {}
+    total_bytes = 0
+    for source, status, plaintext, size in results:
+        total_bytes += size
+        if status == "ok":
+            print(f"[{source}] {plaintext}")
+        else:
+            failures[status] = failures.get(status, 0) + 1
+            print(f"[{source}] failed: {status}")
+
+    decrypted = len(results) - sum(failures.values())
+    rate = len(results) / elapsed if elapsed > 0 else 0
+    print(f"\n{timestamp} {decrypted}/{len(results)} messages decrypted in {elapsed:.2f}s ({rate:.0f} msg/s, {total_bytes / 1024:.1f} KB)")
+    for status, count in failures.items():
+        print(f"{timestamp}     {count} {status}")
+
+    return results
+
+
+
 # ---- tmsg ----
 
 def test_message():
@@ -529,7 +1260,7 @@ def test_message():
     print(f"    Receiver: {public_key_B}")
     print(f"    Content: {random_words}")
 
-    encrypted_message = shape(public_key_A, public_key_B, random_words)
+    encrypted_message = shape(public_key_A, public_key_B, random_words, seed_A)
 
     print("Decrypting message with sender public key:")
     print(f"    Message receiver public key: {public_key_B}")
@@ -550,28 +1281,40 @@ def test_message():
 
 # --- output section ---
 
-def shape(message_sender_public_key, message_receiver_public_key, message):
-    top_marking = "\n========== BEGIN ANI MESSAGE ==========\n\n"
-    bottom_marking = "\n\n  ==========  END MESSAGE  =========="
+def find_seed(public_key):
+    # seed of a stored keypair, None if the public key isn't ours
+    kpk = context.keypairs()
+    for keypair in kpk.get_all():
+        if keypair.get("public_key") == public_key:
+            return keypair.get("seed")
+    return None
 
-    encrypted_message = encrypt(message_sender_public_key, message_receiver_public_key, message)
-    timestamp = time.strftime("%d:%m:%Y %H:%M:%S")
-    message_timestamp = f"\n\nSender's clock timezone: {timestamp}"
-    
-    integrity_of_message = check_integrity(message)
-    integrity = f"\nMessage integrity: {integrity_of_message}"
 
-    message_sender = message_sender_public_key
-    ssn = f"\nSender SSN: {get_ssn(message_sender_public_key)}"
+def configured_compression(compression):
+    # None: the message_compression setting
+    if compression is None:
+        return context.config().get("message_compression")
+    return compression
 
-    message_signature, content_signature = sign(message_sender_public_key, message_receiver_public_key, message)
-    signature1 = f"\nMessage signature: {message_signature}"
-    signature2 = f"\nContent signature: {content_signature}\n"
 
-    signature2_qr = generate_qr_ascii(content_signature, return_string=True)
-    output_message = f"{top_marking}{encrypted_message}{bottom_marking}{message_timestamp}{integrity}{ssn}{signature1}{signature2}{signature2_qr}"
-    
-    cfg = ConfigurationParser(configuration_file)
+def frame_message(message_sender_public_key, message_receiver_public_key, message, sender_seed=None, compression=None):
+    # compresses, encrypts, signs and stores a message, returns its Frame
+    # compression: "none", "auto", "zlib" or "lzma", None for the configured one
+
+    compression = configured_compression(compression)
+    if sender_seed is None:
+        sender_seed = find_seed(message_sender_public_key)
+        if sender_seed is None:
+            raise ValueError("No stored seed for the sender public key, can't sign the message.")
+
+    payload, compression_method = compress_payload(message.encode('utf-8'), compression)
+    ciphertext = bytearray(len(payload))
+    encrypt_into(ciphertext, payload, message_receiver_public_key)
+
+    message_signature, content_signature = sign(message_sender_public_key, message_receiver_public_key, message, sender_seed)
+    frame = make_frame(get_ssn(message_sender_public_key), message_signature, content_signature, ciphertext, flags=compression_method)
+
+    cfg = context.config()
     storing_messages = cfg.get("storing_messages")
     storing_contacts = cfg.get("storing_contacts")
 
@@ -581,10 +1324,63 @@ def shape(message_sender_public_key, message_receiver_public_key, message):
     if storing_messages == True:
         save_message(message_sender_public_key, message_receiver_public_key, message)
 
-    
-    print(output_message)
+    return frame
+
+
+def shape_frame(message_sender_public_key, message_receiver_public_key, message, sender_seed=None, compression=None):
+    # frame_message(), packed into the binary frame
+    return pack_frame(frame_message(message_sender_public_key, message_receiver_public_key, message, sender_seed, compression))
+
+
+def broadcast(message_sender_public_key, message_receiver_public_keys, message, sender_seed=None, armored=False, compression=None):
+    # one message to many receivers: the body is compressed, encrypted and
+    # signed once, each receiver only costs a wrapped content key, and the
+    # stores are written once for the whole batch. returns the packed frame
+
+    compression = configured_compression(compression)
+    if sender_seed is None:
+        sender_seed = find_seed(message_sender_public_key)
+        if sender_seed is None:
+            raise ValueError("No stored seed for the sender public key, can't sign the message.")
+
+    message_receiver_public_keys = list(dict.fromkeys(message_receiver_public_keys))
+    ciphertext, compression_method, wrapped_keys = encrypt_broadcast(message_receiver_public_keys, message, compression)
+
+    # the receiver key isn't part of the signature, so one signature covers everyone
+    message_signature, content_signature = sign(message_sender_public_key, None, message, sender_seed)
+    frame = make_frame(get_ssn(message_sender_public_key), message_signature, content_signature, ciphertext, flags=compression_method, recipients=wrapped_keys)
+
+    cfg = context.config()
+
+    if cfg.get("storing_contacts") == True:
+        save_contacts(message_receiver_public_keys)
+
+    if cfg.get("storing_messages") == True:
+        save_messages(message_sender_public_key, message_receiver_public_keys, message)
+
+    if armored:
+        print(render_armored(frame, check_integrity(message, message_signature, message_sender_public_key)))
+
+    return pack_frame(frame)
+
+
+def open_broadcast(packed_frame, receiver_public_key):
+    # decrypts a broadcast frame for one of its receivers, None if they aren't on it
+    frame = unpack_frame(packed_frame)
+    for public_key, wrapped_key in frame.recipients:
+        if public_key == receiver_public_key:
+            return decrypt_broadcast(frame.ciphertext, wrapped_key, receiver_public_key)
+    return None
+
+
+def shape(message_sender_public_key, message_receiver_public_key, message, sender_seed=None, armored=True, compression=None):
+    frame = frame_message(message_sender_public_key, message_receiver_public_key, message, sender_seed, compression)
+
+    if armored:
+        integrity_of_message = check_integrity(message, bytes(frame.message_signature).hex(), message_sender_public_key)
+        print(render_armored(frame, integrity_of_message))
 
-    return encrypted_message
+    return bytes(frame.ciphertext).hex()
 
 
 
@@ -593,12 +1389,15 @@ def shape(message_sender_public_key, message_receiver_public_key, message):
 
 def main():
     print(ASCII)
+    set_base_table_file(base_table_file)
     load_client_config()
     load_user_config()
     try:
         cli()
     except KeyboardInterrupt:
         print(f"\n{timestamp} closing antidote")
+    finally:
+        context.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,151 @@
+import os
+import json
+import mmap
+import struct
+from bisect import bisect_left, bisect_right
+
+# Message archive: the history that aged out of the hot message list.
+#
+#   <name>        segment file, the records as compact JSON, back to back
+#   <name>.idx    offset index, one fixed-width entry per record:
+#                   offset     8   where the record starts in the segment
+#                   length     4
+#                   timestamp 19   "%Y-%m-%d %H:%M:%S", as message_record() writes it
+#
+# Both files are only ever appended to and are read through mmap, so record
+# n is one index entry plus one slice, a time range is a bisect over the
+# index, and no other record is parsed. Records are appended in the order
+# they aged out, which is time order as long as the clock doesn't go back.
+
+_ENTRY = struct.Struct("<QI19s")
+ENTRY_SIZE = _ENTRY.size
+
+TIMESTAMP_SIZE = 19
+
+
+def _timestamp_key(timestamp):
+    # index key of a timestamp string, padded/cut to the fixed width
+    return (timestamp or "").encode("ascii", "replace")[:TIMESTAMP_SIZE].ljust(TIMESTAMP_SIZE, b"\0")
+
+
+class _Timestamps:
+    # the timestamp column of a mapped index, as a sequence for bisect
+    def __init__(self, index, count):
+        self.index = index
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, n):
+        start = n * ENTRY_SIZE + 12
+        return self.index[start:start + TIMESTAMP_SIZE]
+
+
+class MessageArchive:
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.index_path = f"{filepath}.idx"
+        self.segment = None     # mapped segment file
+        self.index = None       # mapped index file
+        self.count = 0
+        self.size = 0           # bytes of the segment that entries point into
+        self.recover()
+
+    def recover(self):
+        # drops what an interrupted append left behind: a partial index entry,
+        # entries pointing past the segment, segment bytes without an entry
+        segment_size = os.path.getsize(self.filepath) if os.path.exists(self.filepath) else 0
+        index_size = os.path.getsize(self.index_path) if os.path.exists(self.index_path) else 0
+
+        count = index_size // ENTRY_SIZE
+        size = 0
+        if count:
+            with open(self.index_path, "rb") as f:
+                while count:
+                    f.seek((count - 1) * ENTRY_SIZE)
+                    offset, length, _ = _ENTRY.unpack(f.read(ENTRY_SIZE))
+                    if offset + length <= segment_size:
+                        size = offset + length
+                        break
+                    count -= 1
+
+        if count * ENTRY_SIZE != index_size:
+            with open(self.index_path, "r+b") as f:
+                f.truncate(count * ENTRY_SIZE)
+        if size != segment_size:
+            with open(self.filepath, "r+b") as f:
+                f.truncate(size)
+        self.count = count
+        self.size = size
+
+    def __len__(self):
+        return self.count
+
+    def append_many(self, records):
+        if not records:
+            return
+        directory = os.path.dirname(self.filepath)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        data = bytearray()
+        entries = bytearray()
+        offset = self.size
+        for record in records:
+            encoded = json.dumps(record, separators=(",", ":")).encode("utf-8")
+            entries += _ENTRY.pack(offset, len(encoded), _timestamp_key(record.get("timestamp")))
+            data += encoded
+            offset += len(encoded)
+
+        # segment first: an index entry never points at bytes that aren't written
+        with open(self.filepath, "ab") as f:
+            f.write(data)
+        with open(self.index_path, "ab") as f:
+            f.write(entries)
+        self.count += len(records)
+        self.size = offset
+
+    def _map(self):
+        # (re)maps both files when they grew past the current mappings
+        if self.index is None or len(self.index) < self.count * ENTRY_SIZE:
+            self.close()
+            with open(self.index_path, "rb") as f:
+                self.index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            with open(self.filepath, "rb") as f:
+                self.segment = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def get(self, n):
+        # record n, oldest first; negative n counts from the newest
+        if n < 0:
+            n += self.count
+        if not 0 <= n < self.count:
+            raise IndexError("archive index out of range")
+        self._map()
+        offset, length, _ = _ENTRY.unpack_from(self.index, n * ENTRY_SIZE)
+        return json.loads(self.segment[offset:offset + length])
+
+    def span(self, start=None, end=None):
+        # (first, stop) positions of the records with start <= timestamp <= end
+        if not self.count:
+            return 0, 0
+        self._map()
+        timestamps = _Timestamps(self.index, self.count)
+        first = 0 if start is None else bisect_left(timestamps, _timestamp_key(start))
+        stop = self.count if end is None else bisect_right(timestamps, _timestamp_key(end))
+        return first, max(first, stop)
+
+    def between(self, start=None, end=None, limit=None):
+        # records with start <= timestamp <= end, oldest first
+        first, stop = self.span(start, end)
+        if limit is not None:
+            stop = min(stop, first + limit)
+        return [self.get(n) for n in range(first, stop)]
+
+    def close(self):
+        if self.index is not None:
+            self.index.close()
+            self.index = None
+        if self.segment is not None:
+            self.segment.close()
+            self.segment = None
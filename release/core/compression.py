@@ -0,0 +1,76 @@
+import lzma
+import zlib
+
+# Payload compression, applied before encryption.
+#
+# A compressed payload starts with MARKER and a method byte. 0xFF never
+# appears in UTF-8, so it can't be the first byte of an uncompressed (legacy)
+# message and decrypt_with_pub() can tell the two apart without a header.
+
+MARKER = 0xFF
+
+METHOD_NONE = 0
+METHOD_ZLIB = 1
+METHOD_LZMA = 2
+
+METHODS = {
+    "none": METHOD_NONE,
+    "zlib": METHOD_ZLIB,
+    "lzma": METHOD_LZMA
+}
+
+# below this the method byte costs more than compression wins
+ZLIB_MIN_SIZE = 64
+# from here lzma at a low preset compresses faster than zlib at level 6
+LZMA_MIN_SIZE = 1024 * 1024
+
+ZLIB_LEVEL = 6
+_LZMA_FILTERS = [{"id": lzma.FILTER_LZMA2, "preset": 1}]
+
+
+def choose_method(size):
+    if size < ZLIB_MIN_SIZE:
+        return METHOD_NONE
+    if size < LZMA_MIN_SIZE:
+        return METHOD_ZLIB
+    return METHOD_LZMA
+
+
+def compress_payload(data, method="auto"):
+    # returns (payload, method id); payloads that wouldn't shrink stay uncompressed
+    if method is None:
+        return data, METHOD_NONE
+    if method == "auto":
+        method_id = choose_method(len(data))
+    elif method in METHODS:
+        method_id = METHODS[method]
+    else:
+        raise ValueError(f"unknown compression method '{method}'")
+
+    if method_id == METHOD_ZLIB:
+        compressed = zlib.compress(data, ZLIB_LEVEL)
+    elif method_id == METHOD_LZMA:
+        compressed = lzma.compress(data, format=lzma.FORMAT_RAW, filters=_LZMA_FILTERS)
+    else:
+        return data, METHOD_NONE
+
+    if len(compressed) + 2 >= len(data):
+        return data, METHOD_NONE
+    return bytes((MARKER, method_id)) + compressed, method_id
+
+
+def decompress_payload(payload):
+    # inverse of compress_payload(), uncompressed payloads pass through
+    # raises ValueError if a compressed payload is damaged
+    if len(payload) < 2 or payload[0] != MARKER:
+        return payload
+
+    method_id = payload[1]
+    try:
+        if method_id == METHOD_ZLIB:
+            return zlib.decompress(payload[2:])
+        if method_id == METHOD_LZMA:
+            return lzma.decompress(payload[2:], format=lzma.FORMAT_RAW, filters=_LZMA_FILTERS)
+    except (zlib.error, lzma.LZMAError):
+        raise ValueError("compressed payload is damaged")
+    raise ValueError(f"unknown compression method {method_id}")
@@ -0,0 +1,263 @@
+import os
+import ast
+import sys
+import marshal
+import hashlib
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+
+from .storage import write_atomic, file_signature
+
+# One engine for the "key = python literal" config files.
+#
+# A schema declares every known key with its type and default (and
+# optionally the values it may take, or the smallest one). Loading validates against it: a value
+# of the wrong type falls back to the default with a warning, unknown keys
+# are kept as they are.
+#
+# Parsing is skipped when the text file hasn't changed: every load writes a
+# binary snapshot (<file>.snapshot) holding the parsed values and the text
+# file's mtime and size, and the next load uses the snapshot if they still
+# match. The snapshot is only a cache, deleting it is always safe.
+#
+# set()/delete() inside transaction() write the file once, at the end.
+# Subscribers are called with the changed keys whenever the values change,
+# by this process or - seen by refresh() - by someone editing the file.
+
+# a default can be a function, called whenever the default is needed (for
+# values that differ per install, like a random username)
+Setting = namedtuple("Setting", ["type", "default", "choices", "minimum"], defaults=[None, None])
+
+_SNAPSHOT_MAGIC = b"ANICF1"
+
+
+def default(setting):
+    return setting.default() if callable(setting.default) else setting.default
+
+
+def defaults(schema):
+    return {key: default(setting) for key, setting in schema.items()}
+
+
+def _hashed_default(setting):
+    # a default function is hashed by its name, not by a value it returns
+    if callable(setting.default):
+        return f"{setting.default.__module__}.{setting.default.__qualname__}"
+    return setting.default
+
+
+def schema_hash(schema):
+    # snapshots written under another schema (or python) aren't used
+    text = repr(sorted((key, setting.type.__name__, _hashed_default(setting), setting.choices, setting.minimum) for key, setting in schema.items()))
+    return hashlib.sha256(f"{sys.version_info[:2]}{text}".encode()).digest()[:8]
+
+
+class ConfigFile:
+    def __init__(self, filepath, schema, name="Configuration", on_warning=None):
+        self.filepath = filepath
+        self.snapshot_path = f"{filepath}.snapshot"
+        self.schema = schema
+        self.name = name
+        self.on_warning = on_warning or (lambda message: None)
+        self.config = {}
+        self.signature = None       # (mtime, size) of the file the values came from
+        self.subscribers = []
+        self.depth = 0              # open transactions
+        self.backup = None
+        self.watcher = None
+        self.load()
+
+    # ---- validation ----
+
+    def check(self, key, value):
+        # the reason value isn't valid for key, None if it is
+        setting = self.schema.get(key)
+        if setting is None:
+            return None
+        # bool is an int, but a bool setting shouldn't take 1 and a count shouldn't take True
+        if not isinstance(value, setting.type) or isinstance(value, bool) != (setting.type is bool):
+            return f"'{key}' has to be of type {setting.type.__name__}"
+        if setting.choices is not None and value not in setting.choices:
+            return f"'{key}' has to be one of {', '.join(map(repr, setting.choices))}"
+        if setting.minimum is not None and value < setting.minimum:
+            return f"'{key}' has to be at least {setting.minimum}"
+        return None
+
+    # ---- loading ----
+
+    def load(self):
+        if not os.path.exists(self.filepath):
+            self.on_warning(f"{self.name} file not found, creating one with defaults...")
+            self.config = defaults(self.schema)
+            self.save()
+            return
+
+        signature = file_signature(self.filepath)
+        config = self._read_snapshot(signature)
+        if config is None:
+            with open(self.filepath, "r") as f:
+                lines = f.readlines()
+            if not lines:
+                self.on_warning(f"{self.name} file found but empty, filling with defaults...")
+                self.config = defaults(self.schema)
+                self.save()
+                return
+            config = self.parse(lines)
+            self._write_snapshot(signature, config)
+
+        # keys the schema gained since the file was written
+        for key, setting in self.schema.items():
+            if key not in config:
+                config[key] = default(setting)
+        self.config = config
+        self.signature = signature
+
+    def parse(self, lines):
+        config = {}
+        for line in lines:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if "=" not in line:
+                continue
+            key, value = line.split("=", 1)
+            key = key.strip()
+            value = value.strip()
+            try:
+                value = ast.literal_eval(value)
+            except Exception:
+                self.on_warning(f"Warning: Could not parse line: '{line}'. Using default if available.")
+                if key in self.schema:
+                    config[key] = default(self.schema[key])
+                continue
+
+            problem = self.check(key, value)
+            if problem is not None:
+                self.on_warning(f"Warning: {problem}, using the default.")
+                value = default(self.schema[key])
+            config[key] = value
+        return config
+
+    def _read_snapshot(self, signature):
+        try:
+            with open(self.snapshot_path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        header = _SNAPSHOT_MAGIC + schema_hash(self.schema)
+        if not data.startswith(header):
+            return None
+        try:
+            snapshot_signature, config = marshal.loads(data[len(header):])
+        except (EOFError, ValueError, TypeError):
+            return None
+        if tuple(snapshot_signature) != signature or not isinstance(config, dict):
+            return None
+        return config
+
+    def _write_snapshot(self, signature, config):
+        try:
+            write_atomic(self.snapshot_path, _SNAPSHOT_MAGIC + schema_hash(self.schema) + marshal.dumps((signature, config)))
+        except (OSError, ValueError):
+            # not writable, or a value marshal can't hold: just parse next time
+            pass
+
+    def refresh(self):
+        # reloads if the file changed on disk since it was read or written
+        # here, subscribers hear about the changed keys. returns True if it did
+        if file_signature(self.filepath) == self.signature:
+            return False
+        before = self.config
+        self.load()
+        self._notify(before)
+        return True
+
+    def watch(self, interval=1.0):
+        # refresh() every interval seconds on a background thread, for
+        # long-running processes that only learn about changes by subscribing
+        if self.watcher is not None:
+            return
+        stop = threading.Event()
+
+        def run():
+            while not stop.wait(interval):
+                self.refresh()
+
+        self.watcher = stop
+        threading.Thread(target=run, name=f"{self.name} watcher", daemon=True).start()
+
+    def unwatch(self):
+        if self.watcher is not None:
+            self.watcher.set()
+            self.watcher = None
+
+    # ---- writing ----
+
+    def save(self):
+        write_atomic(self.filepath, "".join(f"{key} = {repr(value)}\n" for key, value in self.config.items()))
+        self.signature = file_signature(self.filepath)
+        self._write_snapshot(self.signature, self.config)
+
+    @contextmanager
+    def transaction(self):
+        # set()/delete() inside write the file once, when the outermost
+        # transaction ends; an exception rolls all of them back
+        outer = self.depth == 0
+        if outer:
+            self.backup = dict(self.config)
+        self.depth += 1
+        try:
+            yield self
+        except BaseException:
+            self.depth -= 1
+            if outer:
+                self.config = self.backup
+            raise
+        self.depth -= 1
+        if outer:
+            self._commit(self.backup)
+
+    def _commit(self, before):
+        if before != self.config:
+            self.save()
+            self._notify(before)
+
+    def get(self, key, default=None):
+        return self.config.get(key, default)
+
+    def set(self, key, value):
+        problem = self.check(key, value)
+        if problem is not None:
+            raise ValueError(problem)
+        before = dict(self.config) if self.depth == 0 else None
+        self.config[key] = value
+        if before is not None:
+            self._commit(before)
+
+    def delete(self, key):
+        if key not in self.config:
+            return
+        before = dict(self.config) if self.depth == 0 else None
+        del self.config[key]
+        if before is not None:
+            self._commit(before)
+
+    # ---- change notification ----
+
+    def subscribe(self, callback):
+        # callback(changed, config): changed maps every changed key to its new
+        # value (None if it was deleted)
+        self.subscribers.append(callback)
+        return callback
+
+    def unsubscribe(self, callback):
+        if callback in self.subscribers:
+            self.subscribers.remove(callback)
+
+    def _notify(self, before):
+        changed = {key: self.config.get(key) for key in before.keys() | self.config.keys() if before.get(key) != self.config.get(key)}
+        if not changed:
+            return
+        for callback in list(self.subscribers):
+            callback(changed, self)
@@ -0,0 +1,125 @@
+from bisect import bisect_left, insort
+from itertools import islice
+
+from .encryption import get_ssn
+from .records import key_table, raw_key, hex_key
+
+# In-memory index of the contact book.
+#
+#   records    public key -> contact, least recently added or updated first
+#   ssns       sorted list of (ssn, public key), prefix lookups are a bisect
+#   by_ssn     ssn -> public keys with that ssn, more than one is a collision
+#
+# keys are held as the shared raw keys of key_table (see core/records.py),
+# retained while they're in the index; the methods take and return hex keys.
+#
+# add() is an upsert: a key that is already stored is updated and never
+# duplicated. an update moves the contact to the newest end, so trim() drops
+# the least recently used.
+
+CONTACT_ADDED = "added"
+CONTACT_UPDATED = "updated"
+CONTACT_UNCHANGED = "unchanged"
+
+
+def _entry(ssn, key):
+    # ssns entry; the flag keeps raw and string keys apart when ssns are equal
+    return ssn, isinstance(key, str), key
+
+
+class ContactIndex:
+    def __init__(self, contacts=()):
+        self.records = {}
+        self.by_ssn = {}
+        self.ssns = []
+
+        # bulk build: one sort instead of an insort per contact
+        for contact in contacts:
+            public_key = contact.get("public_key")
+            if public_key is None:
+                continue
+            key = key_table.intern(public_key)
+            if self.records.pop(key, None) is None:
+                key_table.retain(key)
+                self.by_ssn.setdefault(get_ssn(public_key), []).append(key)
+            self.records[key] = contact
+        self.ssns = sorted(_entry(get_ssn(hex_key(key)), key) for key in self.records)
+
+    def __del__(self):
+        for key in self.records:
+            key_table.release(key)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __contains__(self, public_key):
+        return raw_key(public_key) in self.records
+
+    def get(self, public_key):
+        return self.records.get(raw_key(public_key))
+
+    def all(self):
+        return list(self.records.values())
+
+    def add(self, contact):
+        # returns CONTACT_ADDED, CONTACT_UPDATED or CONTACT_UNCHANGED
+        public_key = contact["public_key"]
+        key = key_table.intern(public_key)
+        current = self.records.get(key)
+        if current is not None:
+            if current == contact:
+                return CONTACT_UNCHANGED
+            del self.records[key]
+            self.records[key] = contact
+            return CONTACT_UPDATED
+
+        ssn = get_ssn(public_key)
+        key_table.retain(key)
+        self.records[key] = contact
+        self.by_ssn.setdefault(ssn, []).append(key)
+        insort(self.ssns, _entry(ssn, key))
+        return CONTACT_ADDED
+
+    def remove(self, public_key):
+        return self._remove(raw_key(public_key))
+
+    def _remove(self, key):
+        contact = self.records.pop(key, None)
+        if contact is None:
+            return None
+
+        ssn = get_ssn(hex_key(key))
+        keys = self.by_ssn[ssn]
+        keys.remove(key)
+        if not keys:
+            del self.by_ssn[ssn]
+        del self.ssns[bisect_left(self.ssns, _entry(ssn, key))]
+        key_table.release(key)
+        return contact
+
+    def trim(self, limit):
+        # drops the oldest contacts beyond limit, returns them
+        oldest = list(islice(self.records, max(len(self.records) - limit, 0)))
+        return [self._remove(key) for key in oldest]
+
+    def colliding(self, public_key):
+        # other stored keys with the same ssn as public_key
+        key = raw_key(public_key)
+        return [hex_key(other) for other in self.by_ssn.get(get_ssn(public_key), ()) if other != key]
+
+    def collisions(self):
+        # ssn -> keys, for every ssn shared by distinct keys
+        return {ssn: [hex_key(key) for key in keys] for ssn, keys in self.by_ssn.items() if len(keys) > 1}
+
+    def find_prefix(self, prefix, limit=None):
+        # contacts whose ssn starts with prefix, in ssn order
+        prefix = prefix.lower()
+        index = bisect_left(self.ssns, (prefix,))
+        found = []
+        while index < len(self.ssns) and (limit is None or len(found) < limit):
+            ssn, _, key = self.ssns[index]
+            if not ssn.startswith(prefix):
+                break
+            found.append(self.records[key])
+            index += 1
+        return found
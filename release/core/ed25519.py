@@ -1,5 +1,8 @@
 import os
 import hashlib
+import tempfile
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
 
 # Field prime
 p = 2**255 - 19
@@ -50,41 +53,92 @@ if Bx is None:
 
 B = (Bx % p, By % p)
 
-# point addition (Edwards coordinates), points are tuples (x,y)
+# points are kept in extended twisted Edwards coordinates (X:Y:Z:T) with
+# x = X/Z, y = Y/Z and x*y = T/Z, so adding and doubling need no inversion.
+# the only inversion happens when a point gets encoded.
+
+d2 = (2 * d) % p
+
+# identity point
+O = (0, 1, 1, 0)
+
+def to_extended(P):
+    # lift an affine (x, y) tuple; extended points are passed through
+    if len(P) == 4:
+        return P
+    x, y = P
+    return (x % p, y % p, 1, (x * y) % p)
+
+def to_affine(P):
+    if len(P) == 2:
+        return P
+    X, Y, Z, T = P
+    zinv = inv(Z)
+    return ((X * zinv) % p, (Y * zinv) % p)
+
+# point addition (extended coordinates, a = -1), "add-2008-hwcd-3"
 
 def ed_add(P, Q):
-    (x1, y1), (x2, y2) = P, Q
-    x1x2 = (x1 * x2) % p
-    y1y2 = (y1 * y2) % p
-    xnum = (x1 * y2 + x2 * y1) % p
-    xden = (1 + d * x1x2 * y1y2) % p
-    ynum = (y1y2 - a * x1x2) % p
-    yden = (1 - d * x1x2 * y1y2) % p
-    x3 = (xnum * inv(xden)) % p
-    y3 = (ynum * inv(yden)) % p
-
-    return (x3, y3)
+    return _add(to_extended(P), to_extended(Q))
+
+def _add(P, Q):
+    X1, Y1, Z1, T1 = P
+    X2, Y2, Z2, T2 = Q
+    A = ((Y1 - X1) * (Y2 - X2)) % p
+    B_ = ((Y1 + X1) * (Y2 + X2)) % p
+    C = (T1 * d2 * T2) % p
+    D = (Z1 * 2 * Z2) % p
+    E = B_ - A
+    F = D - C
+    G = D + C
+    H = B_ + A
+
+    return ((E * F) % p, (G * H) % p, (F * G) % p, (E * H) % p)
+
+# dedicated doubling (extended coordinates, a = -1), "dbl-2008-hwcd"
 
 def ed_double(P):
-    return ed_add(P, P)
+    return _double(to_extended(P))
+
+def _double(P):
+    X1, Y1, Z1, _ = P
+    A = (X1 * X1) % p
+    B_ = (Y1 * Y1) % p
+    C = (2 * Z1 * Z1) % p
+    H = A + B_
+    E = (H - (X1 + Y1) * (X1 + Y1)) % p
+    G = A - B_
+    F = C + G
+
+    return ((E * F) % p, (G * H) % p, (F * G) % p, (E * H) % p)
+
+def ed_neg(P):
+    X, Y, Z, T = to_extended(P)
+    return ((-X) % p, Y, Z, (-T) % p)
+
+def point_equal(P, Q):
+    # compare without normalising: x1/z1 == x2/z2 and y1/z1 == y2/z2
+    X1, Y1, Z1, _ = to_extended(P)
+    X2, Y2, Z2, _ = to_extended(Q)
+    return (X1 * Z2 - X2 * Z1) % p == 0 and (Y1 * Z2 - Y2 * Z1) % p == 0
 
 # scalar multiplication (double-and-add)
 
 def scalarmult(P, e):
-    # e is Python int
-    Q = (0, 1)  # identity point
-    R = P
+    # e is Python int, returns an extended point
+    Q = O
+    R = to_extended(P)
     while e > 0:
         if e & 1:
-            Q = ed_add(Q, R)
-        R = ed_double(R)
+            Q = _add(Q, R)
+        R = _double(R)
         e >>= 1
     return Q
 
 # compress point: encode y (little-endian 32 bytes) and sign bit of x in msb
 
 def encodepoint(P):
-    x, y = P
+    x, y = to_affine(P)
     y_bytes = int.to_bytes(y, 32, "little")
     x_lsb = x & 1
 
@@ -96,6 +150,354 @@ def encodepoint(P):
 
     return y_bytes
 
+# decompress point: recover x from y and the sign bit, the inverse of encodepoint
+# decoded points are cached by their 32-byte encoding, so repeat contacts skip the square root
+
+DECODE_CACHE_SIZE = 1024
+
+@lru_cache(maxsize=DECODE_CACHE_SIZE)
+def _decodepoint(s):
+    y = int.from_bytes(s, "little")
+    sign = y >> 255
+    y &= (1 << 255) - 1
+    if y >= p:
+        raise ValueError("point encoding is not canonical")
+
+    # x^2 = (y^2 - 1) / (d*y^2 + 1)
+    yy = (y * y) % p
+    x = mod_sqrt(((yy - 1) * inv(d * yy + 1)) % p)
+    if x is None:
+        raise ValueError("point is not on the curve")
+    if x == 0 and sign:
+        raise ValueError("point encoding is not canonical")
+    if (x & 1) != sign:
+        x = p - x
+
+    return (x, y, 1, (x * y) % p)
+
+def decodepoint(s):
+    # takes the 32 raw bytes (or a 64 char hex string) of an encoded point, returns an extended point
+    if isinstance(s, str):
+        s = bytes.fromhex(s)
+    s = bytes(s)
+    if len(s) != 32:
+        raise ValueError("point encoding has to be 32 bytes")
+    return _decodepoint(s)
+
+def decodepoint_cache_info():
+    # named tuple with hits, misses, maxsize and currsize
+    return _decodepoint.cache_info()
+
+def decodepoint_cache_clear():
+    _decodepoint.cache_clear()
+
+# group order of B
+L = 2**252 + 27742317777372353535851937790883648493
+
+# invert many values with a single pow() (Montgomery's trick)
+
+def batch_inv(values):
+    values = list(values)
+    prefix = []
+    acc = 1
+    for v in values:
+        prefix.append(acc)
+        acc = (acc * v) % p
+
+    acc_inv = inv(acc)
+    out = [0] * len(values)
+    for i in range(len(values) - 1, -1, -1):
+        out[i] = (prefix[i] * acc_inv) % p
+        acc_inv = (acc_inv * values[i]) % p
+    return out
+
+def batch_to_affine(points):
+    points = [to_extended(P) for P in points]
+    zinvs = batch_inv(P[2] for P in points)
+    return [((X * zi) % p, (Y * zi) % p) for (X, Y, _, _), zi in zip(points, zinvs)]
+
+# ---- fixed-base table for B ----
+# row i holds (j+1) * 16^i * B for j = 0..7 in "precomputed" form
+# (y+x, y-x, 2*d*x*y), so a scalar splits into 64 signed radix-16 digits
+# and scalarmult_base() needs 64 mixed additions and no doublings.
+
+BASE_TABLE_ROWS = 64
+BASE_TABLE_COLS = 8
+
+_BASE_TABLE_MAGIC = b"ANIBT1"
+
+_base_table = None
+_base_table_file = None
+
+def set_base_table_file(path):
+    # cache the table on disk at path (None turns the disk cache off)
+    global _base_table_file
+    _base_table_file = path
+
+def _build_base_table():
+    points = []
+    row_base = to_extended(B)
+    for _ in range(BASE_TABLE_ROWS):
+        P = row_base
+        for _ in range(BASE_TABLE_COLS):
+            points.append(P)
+            P = _add(P, row_base)
+        for _ in range(4):
+            row_base = _double(row_base)
+
+    flat = [((y + x) % p, (y - x) % p, (d2 * x * y) % p) for x, y in batch_to_affine(points)]
+    return [flat[i * BASE_TABLE_COLS:(i + 1) * BASE_TABLE_COLS] for i in range(BASE_TABLE_ROWS)]
+
+def _encode_base_table(table):
+    payload = b"".join(int.to_bytes(v, 32, "little") for row in table for entry in row for v in entry)
+    return _BASE_TABLE_MAGIC + hashlib.sha256(payload).digest() + payload
+
+def _decode_base_table(blob):
+    header = len(_BASE_TABLE_MAGIC) + 32
+    payload = blob[header:]
+    if blob[:len(_BASE_TABLE_MAGIC)] != _BASE_TABLE_MAGIC:
+        return None
+    if len(payload) != BASE_TABLE_ROWS * BASE_TABLE_COLS * 3 * 32:
+        return None
+    if hashlib.sha256(payload).digest() != blob[len(_BASE_TABLE_MAGIC):header]:
+        return None
+
+    values = [int.from_bytes(payload[i:i + 32], "little") for i in range(0, len(payload), 32)]
+    flat = [tuple(values[i:i + 3]) for i in range(0, len(values), 3)]
+    table = [flat[i * BASE_TABLE_COLS:(i + 1) * BASE_TABLE_COLS] for i in range(BASE_TABLE_ROWS)]
+
+    # the first entry has to be B itself, otherwise the file is for another curve/base
+    x, y = to_affine(B)
+    if table[0][0] != ((y + x) % p, (y - x) % p, (d2 * x * y) % p):
+        return None
+    return table
+
+def _load_base_table(path):
+    try:
+        with open(path, "rb") as f:
+            return _decode_base_table(f.read())
+    except OSError:
+        return None
+
+def _save_base_table(path, table):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = None
+    try:
+        # a temp file of its own: pool workers may all be saving the table at once
+        with tempfile.NamedTemporaryFile(dir=directory or ".", prefix=f"{os.path.basename(path)}.", suffix=".tmp", delete=False) as f:
+            tmp_path = f.name
+            f.write(_encode_base_table(table))
+        os.replace(tmp_path, path)
+    except OSError:
+        # the cache is optional, the table is already in memory
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def base_table():
+    # built (or loaded) once per process, on first use
+    global _base_table
+    if _base_table is None:
+        table = _load_base_table(_base_table_file) if _base_table_file else None
+        if table is None:
+            table = _build_base_table()
+            if _base_table_file:
+                _save_base_table(_base_table_file, table)
+        _base_table = table
+    return _base_table
+
+def _radix16(e):
+    # signed digits in [-8, 8), e = sum(digits[i] * 16^i), e < 2^253
+    digits = [(e >> (4 * i)) & 15 for i in range(BASE_TABLE_ROWS)]
+    carry = 0
+    for i in range(BASE_TABLE_ROWS - 1):
+        digits[i] += carry
+        carry = (digits[i] + 8) >> 4
+        digits[i] -= carry << 4
+    digits[-1] += carry
+    return digits
+
+def _madd(P, entry):
+    # P (extended) + a precomputed table entry (Z = 1)
+    X1, Y1, Z1, T1 = P
+    ypx, ymx, xy2d = entry
+    A = ((Y1 - X1) * ymx) % p
+    B_ = ((Y1 + X1) * ypx) % p
+    C = (T1 * xy2d) % p
+    D = 2 * Z1
+    E = B_ - A
+    F = D - C
+    G = D + C
+    H = B_ + A
+
+    return ((E * F) % p, (G * H) % p, (F * G) % p, (E * H) % p)
+
+def scalarmult_base(e):
+    # same result as scalarmult(B, e), returns an extended point
+    table = base_table()
+    Q = O
+    for i, digit in enumerate(_radix16(e % L)):
+        if digit > 0:
+            Q = _madd(Q, table[i][digit - 1])
+        elif digit < 0:
+            ypx, ymx, xy2d = table[i][-digit - 1]
+            Q = _madd(Q, (ymx, ypx, (-xy2d) % p))
+    return Q
+
+# ---- variable-base scalar multiplication ----
+# width-w NAF: every non-zero digit is odd and |digit| < 2^(w-1), and any w
+# consecutive digits hold at most one non-zero, so only odd multiples of
+# the point are precomputed and about 1/(w+1) of the steps are additions.
+
+WNAF_WIDTH = 5
+
+def wnaf(e, w=WNAF_WIDTH):
+    # least significant digit first
+    digits = []
+    while e > 0:
+        if e & 1:
+            digit = e & ((1 << w) - 1)
+            if digit >= 1 << (w - 1):
+                digit -= 1 << w
+            e -= digit
+        else:
+            digit = 0
+        digits.append(digit)
+        e >>= 1
+    return digits
+
+def _odd_multiples(P, w):
+    # P, 3P, 5P, ..., (2^(w-1) - 1)P
+    P = to_extended(P)
+    P2 = _double(P)
+    multiples = [P]
+    for _ in range((1 << (w - 2)) - 1):
+        multiples.append(_add(multiples[-1], P2))
+    return multiples
+
+def multi_scalarmult(terms, w=WNAF_WIDTH):
+    # sum of e * P over terms [(e, P), ...] with one shared chain of doublings (Straus)
+    expansions = []
+    for e, P in terms:
+        if e < 0:
+            e, P = -e, ed_neg(P)
+        if e:
+            multiples = _odd_multiples(P, w)
+            # index by digit directly, negative digits pick the negated multiples
+            lookup = {}
+            for k, M in enumerate(multiples):
+                lookup[2 * k + 1] = M
+                lookup[-(2 * k + 1)] = ed_neg(M)
+            expansions.append((wnaf(e, w), lookup))
+
+    Q = O
+    top = max((len(digits) for digits, _ in expansions), default=0)
+    for i in range(top - 1, -1, -1):
+        Q = _double(Q)
+        for digits, lookup in expansions:
+            if i < len(digits) and digits[i]:
+                Q = _add(Q, lookup[digits[i]])
+    return Q
+
+def scalarmult_var(P, e, w=WNAF_WIDTH):
+    # same result as scalarmult(P, e) for any point P
+    return multi_scalarmult([(e, P)], w)
+
+def double_scalarmult(a, P, b, Q, w=WNAF_WIDTH):
+    # a*P + b*Q, sharing the doublings of both multiplications
+    return multi_scalarmult([(a, P), (b, Q)], w)
+
+# ---- signatures ----
+# Ed25519 as in RFC 8032, over this module's base point B. verification is
+# cofactored ([8]S*B == [8]R + [8]k*A) so single and batch checks always agree.
+
+SIGNATURE_SIZE = 64
+
+def _hash_scalar(*parts):
+    return int.from_bytes(hashlib.sha512(b"".join(parts)).digest(), "little") % L
+
+def ed_sign(seed, message):
+    # seed is the 32 byte private seed, message is bytes
+    h = hashlib.sha512(seed).digest()
+    a = clamp_scalar(h[:32])
+    public_key = encodepoint(scalarmult_base(a))
+
+    r = _hash_scalar(h[32:], message)
+    R = encodepoint(scalarmult_base(r))
+    S = (r + _hash_scalar(R, public_key, message) * a) % L
+
+    return R + int.to_bytes(S, 32, "little")
+
+def _signature_parts(public_key, message, signature):
+    # (A, R, S, k) for a signature, raises ValueError if it can't be valid
+    public_key, signature = bytes(public_key), bytes(signature)
+    if len(signature) != SIGNATURE_SIZE:
+        raise ValueError("signature has to be 64 bytes")
+
+    S = int.from_bytes(signature[32:], "little")
+    if S >= L:
+        raise ValueError("signature scalar is not reduced")
+
+    A = decodepoint(public_key)
+    R = decodepoint(signature[:32])
+    k = _hash_scalar(signature[:32], public_key, message)
+    return A, R, S, k
+
+def _is_identity_times_8(P):
+    for _ in range(3):
+        P = _double(P)
+    return point_equal(P, O)
+
+def ed_verify(public_key, message, signature):
+    try:
+        A, R, S, k = _signature_parts(public_key, message, signature)
+    except ValueError:
+        return False
+
+    # S*B - k*A - R
+    P = _add(scalarmult_base(S), ed_neg(_add(scalarmult_var(A, k), R)))
+    return _is_identity_times_8(P)
+
+def ed_verify_batch(items):
+    # items are (public_key, message, signature) triples, returns one bool per item
+    # all signatures are checked with one randomised multi-scalar multiplication:
+    #   [8]((sum z_i*S_i)*B - sum z_i*R_i - sum (z_i*k_i)*A_i) == O
+    # terms for the same public key are merged, and if the batch fails every
+    # item is checked on its own to find the bad ones
+
+    items = list(items)
+    results = [False] * len(items)
+    parsed = []
+    for index, (public_key, message, signature) in enumerate(items):
+        try:
+            parsed.append((index, _signature_parts(public_key, message, signature)))
+        except ValueError:
+            pass
+
+    if not parsed:
+        return results
+
+    base_scalar = 0
+    key_scalars = {}
+    terms = []
+    for _, (A, R, S, k) in parsed:
+        z = int.from_bytes(os.urandom(16), "little") | 1
+        base_scalar += z * S
+        terms.append((L - z, R))
+        key_scalars[A] = (key_scalars.get(A, 0) + z * k) % L
+
+    terms.extend((L - scalar, A) for A, scalar in key_scalars.items())
+    P = _add(scalarmult_base(base_scalar % L), multi_scalarmult(terms))
+
+    if _is_identity_times_8(P):
+        for index, _ in parsed:
+            results[index] = True
+    else:
+        for index, _ in parsed:
+            results[index] = ed_verify(*items[index])
+    return results
+
 # clamp the 32-byte scalar as RFC8032 says
 
 def clamp_scalar(h_bytes32):
@@ -119,7 +521,7 @@ def generate_keypair():
     a = clamp_scalar(h[:32])
 
     # A = a * B  (scalar multiply)
-    A = scalarmult(B, a)
+    A = scalarmult_base(a)
 
     # public key = encodepoint(A)
     public_key = encodepoint(A)
@@ -141,7 +543,7 @@ def verify_keypair(keypair):    # takes in a tuple (seed, public_key) or a 64 by
     h = hashlib.sha512(seed).digest()
     a = clamp_scalar(h[:32])
 
-    A = scalarmult(B, a)
+    A = scalarmult_base(a)
     derived_pub = encodepoint(A)
 
     return derived_pub == pub
@@ -158,3 +560,64 @@ def keygen():
     return sk_seed, public_key, private_key, valid_status
 
 
+
+# ---- batch keypair generation ----
+
+def _derive_points(seeds):
+    # public points for many seeds, normalised together with one inversion
+    points = [scalarmult_base(clamp_scalar(hashlib.sha512(seed).digest()[:32])) for seed in seeds]
+    return batch_to_affine(points)
+
+def _keypair_batch(count):
+    seeds = [os.urandom(32) for _ in range(count)]
+
+    # valid is True by construction: every public key here was just derived
+    # from its seed, re-deriving it would only double the cost of the batch.
+    # verify_keypairs() is the check for keypairs that were stored or received
+    return [(seed, encodepoint(A), True) for seed, A in zip(seeds, _derive_points(seeds))]
+
+def _verify_batch(keypairs):
+    seeds = [seed for seed, _ in keypairs]
+    return [encodepoint(A) == pub for (_, pub), A in zip(keypairs, _derive_points(seeds))]
+
+def _chunks(items, chunk_size):
+    return [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+
+def _run_batches(func, batches, workers):
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=set_base_table_file, initargs=(_base_table_file,)) as pool:
+        for batch in pool.map(func, batches):
+            results.extend(batch)
+    return results
+
+def generate_keypairs(n, workers=None, chunk_size=256):
+    # returns [(seed, public_key, valid), ...] as raw bytes, valid is always
+    # True (see _keypair_batch)
+    # batches bigger than chunk_size are split across a process pool
+
+    if n <= 0:
+        return []
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    if workers <= 1 or n <= chunk_size:
+        return _keypair_batch(n)
+
+    chunks = [chunk_size] * (n // chunk_size)
+    if n % chunk_size:
+        chunks.append(n % chunk_size)
+
+    return _run_batches(_keypair_batch, chunks, workers)
+
+def verify_keypairs(keypairs, workers=None, chunk_size=256):
+    # batch version of verify_keypair() for [(seed, public_key), ...] raw bytes
+    # returns one bool per keypair, in order
+
+    keypairs = list(keypairs)
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    if workers <= 1 or len(keypairs) <= chunk_size:
+        return _verify_batch(keypairs)
+
+    return _run_batches(_verify_batch, _chunks(keypairs, chunk_size), workers)
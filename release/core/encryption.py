@@ -1,8 +1,10 @@
 import os
 import time
-import random
 import hashlib
-from .ed25519 import keygen
+from .keystream import keystream_for
+from .helpers import xor_into
+from .compression import compress_payload, decompress_payload
+from .ed25519 import keygen, generate_keypairs as generate_raw_keypairs, ed_sign, ed_verify, ed_verify_batch
 
 
 # --- encryption section ---
@@ -14,18 +16,34 @@ def generate_keypair():
     seed, public_key, private_key, valid_status = keygen()
     return seed, public_key, private_key, valid_status
 
+def generate_keypairs(n, workers=None):
+    # same shape as generate_keypair(), n times
+    keypairs = []
+    for seed, pk, valid_status in generate_raw_keypairs(n, workers=workers):
+        keypairs.append((seed, pk.hex(), (seed + pk).hex(), valid_status))
+    return keypairs
+
 # --- encryption section ---
 
 
+STREAM_CHUNK_SIZE = 64 * 1024
+
 def generate_keystream(key, length):
-    seed = int(hashlib.sha256(key.encode()).hexdigest(), 16)
-    rng = random.Random(seed)
-    return [rng.randint(0, 255) for _ in range(length)]
-
-def encrypt(message_sender_public_key, message_receiver_public_key, message_content):
-    msg_bytes = message_content.encode('utf-8')
-    keystream = generate_keystream(message_receiver_public_key, len(msg_bytes))
-    encrypted_bytes = bytes([b ^ k for b, k in zip(msg_bytes, keystream)])
+    # same bytes as [rng.randint(0, 255) for _ in range(length)], see core/keystream.py
+    return keystream_for(key).read(length)
+
+def encrypt_into(dst, src, message_receiver_public_key):
+    # encrypts the bytes in src into the caller's buffer dst (which may be src), returns the length
+    return xor_into(dst, src, generate_keystream(message_receiver_public_key, len(src)))
+
+def decrypt_into(dst, src, receiver_public_key):
+    return xor_into(dst, src, generate_keystream(receiver_public_key, len(src)))
+
+def encrypt(message_sender_public_key, message_receiver_public_key, message_content, compression=None):
+    # compression: None keeps the legacy format, "auto"/"zlib"/"lzma" compress first (see core/compression.py)
+    payload, _ = compress_payload(message_content.encode('utf-8'), compression)
+    encrypted_bytes = bytearray(payload)
+    encrypt_into(encrypted_bytes, encrypted_bytes, message_receiver_public_key)
     return encrypted_bytes.hex() # safe for printing/storage
 
     # add encrypt with private key; linked into pub so client side part works
@@ -41,8 +59,16 @@ def decrypt_with_pub(encrypted_hex, receiver_public_key):
     except ValueError:
         raise ValueError("Encrypted text is not valid hex.")
 
-    keystream = generate_keystream(receiver_public_key, len(encrypted_bytes))
-    decrypted_bytes = bytes([b ^ k for b, k in zip(encrypted_bytes, keystream)])
+    decrypted_bytes = bytearray(encrypted_bytes)
+    decrypt_into(decrypted_bytes, decrypted_bytes, receiver_public_key)
+    return _decode_payload(bytes(decrypted_bytes))
+
+def _decode_payload(decrypted_bytes):
+    try:
+        decrypted_bytes = decompress_payload(decrypted_bytes)
+    except ValueError:
+        # wrong key or damaged message, same as a failed decode below
+        return decrypted_bytes
     try:
         return decrypted_bytes.decode('utf-8')
     except UnicodeDecodeError:
@@ -50,28 +76,137 @@ def decrypt_with_pub(encrypted_hex, receiver_public_key):
         return decrypted_bytes
 
 
+# --- broadcast section ---
+# the body is encrypted once under a random content key, and each receiver
+# only gets that key, wrapped with their own keystream
+
+
+CONTENT_KEY_SIZE = 32
+
+def wrap_content_key(content_key, message_receiver_public_key):
+    wrapped = bytearray(CONTENT_KEY_SIZE)
+    encrypt_into(wrapped, content_key, message_receiver_public_key)
+    return bytes(wrapped)
+
+def unwrap_content_key(wrapped_key, receiver_public_key):
+    content_key = bytearray(CONTENT_KEY_SIZE)
+    decrypt_into(content_key, wrapped_key, receiver_public_key)
+    return bytes(content_key)
+
+def encrypt_broadcast(message_receiver_public_keys, message_content, compression=None):
+    # returns (ciphertext, compression method, [(receiver public key, wrapped key), ...])
+    content_key = os.urandom(CONTENT_KEY_SIZE)
+
+    payload, compression_method = compress_payload(message_content.encode('utf-8'), compression)
+    ciphertext = bytearray(payload)
+    xor_into(ciphertext, ciphertext, keystream_for(content_key.hex(), cached=False).read(len(ciphertext)))
+
+    wrapped_keys = [(pk, wrap_content_key(content_key, pk)) for pk in message_receiver_public_keys]
+    return bytes(ciphertext), compression_method, wrapped_keys
+
+def decrypt_broadcast(ciphertext, wrapped_key, receiver_public_key):
+    # same return convention as decrypt_with_pub()
+    content_key = unwrap_content_key(wrapped_key, receiver_public_key)
+
+    decrypted_bytes = bytearray(ciphertext)
+    xor_into(decrypted_bytes, decrypted_bytes, keystream_for(content_key.hex(), cached=False).read(len(decrypted_bytes)))
+    return _decode_payload(bytes(decrypted_bytes))
+
+
+# --- streaming section ---
+# same keystream as encrypt()/decrypt_with_pub(), but raw bytes in and out,
+# one fixed-size chunk at a time, so memory doesn't grow with the payload
+
+
+def _xor_chunk(view, keystream):
+    # xor view in place with the next len(view) keystream bytes
+    xor_into(view, view, keystream.read(len(view)))
+
+def _xor_stream(src, dst, key, chunk_size):
+    keystream = keystream_for(key)
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    total = 0
+
+    while True:
+        if hasattr(src, "readinto"):
+            n = src.readinto(buffer)
+        else:
+            data = src.read(chunk_size)
+            n = len(data)
+            view[:n] = data
+        if not n:
+            break
+
+        _xor_chunk(view[:n], keystream)
+        dst.write(view[:n])
+        total += n
+
+    return total
+
+def _xor_iter(chunks, key):
+    keystream = keystream_for(key)
+    for chunk in chunks:
+        buffer = bytearray(chunk)
+        _xor_chunk(memoryview(buffer), keystream)
+        yield bytes(buffer)
+
+def encrypt_stream(src, dst, message_receiver_public_key, chunk_size=STREAM_CHUNK_SIZE):
+    # src/dst are binary file objects, returns the number of bytes written
+    return _xor_stream(src, dst, message_receiver_public_key, chunk_size)
+
+def decrypt_stream(src, dst, receiver_public_key, chunk_size=STREAM_CHUNK_SIZE):
+    return _xor_stream(src, dst, receiver_public_key, chunk_size)
+
+def encrypt_iter(chunks, message_receiver_public_key):
+    # generator variant: yields one encrypted chunk per input chunk
+    return _xor_iter(chunks, message_receiver_public_key)
+
+def decrypt_iter(chunks, receiver_public_key):
+    return _xor_iter(chunks, receiver_public_key)
+
+
 # --- signature section ---
 
 
-def sign(message_sender_public_key, message_receiver_public_key, message):
-    sender_public_key_cut_size = 8
-    receiver_public_key_cut_size = 8
-    
-    part1_key_sig = ''
-    part2_key_sig = ''
+def _raw_key(key):
+    # keys are stored as hex strings, the curve code wants raw bytes
+    if isinstance(key, str):
+        return bytes.fromhex(key)
+    return bytes(key)
 
-    for _ in range(sender_public_key_cut_size):
-        index = ord(os.urandom(1)) % len(message_sender_public_key)
-        part1_key_sig += message_sender_public_key[index]
+def sign(message_sender_public_key, message_receiver_public_key, message, sender_seed):
+    # message signature: Ed25519 signature of the content with the sender's seed
+    # content signature: SHA-256 of the content
+    message_bytes = message.encode('utf-8')
 
-    for _ in range(receiver_public_key_cut_size):
-        index = ord(os.urandom(1)) % len(message_receiver_public_key)
-        part2_key_sig += message_receiver_public_key[index]
+    seed = _raw_key(sender_seed)
+    if len(seed) == 64:  # private key (seed + public key)
+        seed = seed[:32]
 
-    hashed_signature = hashlib.sha256((part1_key_sig + part2_key_sig).encode('utf-8')).hexdigest()
-    content_signature = hashlib.sha256(message.encode('utf-8')).hexdigest()
+    hashed_signature = ed_sign(seed, message_bytes).hex()
+    content_signature = hashlib.sha256(message_bytes).hexdigest()
 
     return hashed_signature, content_signature
 
-def check_integrity(message):
-    return True
+def check_integrity(message, message_signature, message_sender_public_key):
+    # True if message_signature was made for message by the owner of message_sender_public_key
+    try:
+        return ed_verify(_raw_key(message_sender_public_key), message.encode('utf-8'), _raw_key(message_signature))
+    except ValueError:
+        return False
+
+def check_integrity_batch(messages):
+    # messages are (message, message_signature, message_sender_public_key) triples,
+    # checked together; returns one bool per message
+    items = []
+    invalid = set()
+    for index, (message, message_signature, message_sender_public_key) in enumerate(messages):
+        try:
+            items.append((_raw_key(message_sender_public_key), message.encode('utf-8'), _raw_key(message_signature)))
+        except ValueError:
+            invalid.add(index)
+            items.append((b"", b"", b""))
+
+    results = ed_verify_batch(items)
+    return [valid and index not in invalid for index, valid in enumerate(results)]
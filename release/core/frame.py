@@ -0,0 +1,293 @@
+import io
+import time
+import codecs
+import struct
+from collections import namedtuple
+
+from .qrcode import generate_qr_ascii
+
+# Binary message frame, little-endian:
+#
+#   magic "ANI\x01"      4
+#   version              1
+#   flags                1   compression method in the low two bits
+#   timestamp            8   unix seconds on the sender's clock
+#   sender ssn          12   ascii, first 12 hex chars of the sender public key
+#   signature length     2   \
+#   content sig length   2    > lengths of the variable fields that follow
+#   ciphertext length    4   /
+#   message signature, content signature, ciphertext
+#
+# Broadcast frames (FLAG_BROADCAST) start the ciphertext field with a
+# recipient table: a 2 byte count, then per recipient the 32 byte public key
+# and the 32 byte wrapped content key.
+#
+# The armored text shape() prints is render_armored() of a frame.
+
+MAGIC = b"ANI\x01"
+VERSION = 1
+
+# flags: the low two bits hold the compression method of the encrypted payload
+FLAG_COMPRESSION_MASK = 0x03
+FLAG_BROADCAST = 0x04
+
+KEY_SIZE = 32
+_RECIPIENT_COUNT = struct.Struct("<H")
+
+_HEADER = struct.Struct("<4sBBQ12sHHI")
+HEADER_SIZE = _HEADER.size
+
+SSN_SIZE = 12
+
+TOP_MARKING = "\n========== BEGIN ANI MESSAGE ==========\n\n"
+BOTTOM_MARKING = "\n\n  ==========  END MESSAGE  =========="
+
+ARMOR_TIME_FORMAT = "%d:%m:%Y %H:%M:%S"
+
+# recipients is empty for normal messages, [(public key hex, wrapped key), ...] for broadcasts
+Frame = namedtuple("Frame", ["version", "flags", "timestamp", "ssn", "message_signature", "content_signature", "ciphertext", "recipients"], defaults=[()])
+
+
+def make_frame(ssn, message_signature, content_signature, ciphertext, timestamp=None, flags=0, recipients=()):
+    # signatures may be given as hex strings (what sign() returns) or raw bytes
+    if isinstance(message_signature, str):
+        message_signature = bytes.fromhex(message_signature)
+    if isinstance(content_signature, str):
+        content_signature = bytes.fromhex(content_signature)
+    if timestamp is None:
+        timestamp = int(time.time())
+
+    if recipients:
+        flags |= FLAG_BROADCAST
+    return Frame(VERSION, flags, timestamp, ssn, message_signature, content_signature, ciphertext, recipients)
+
+
+def _recipient_table(recipients):
+    table = bytearray(_RECIPIENT_COUNT.size + 2 * KEY_SIZE * len(recipients))
+    _RECIPIENT_COUNT.pack_into(table, 0, len(recipients))
+
+    offset = _RECIPIENT_COUNT.size
+    for public_key, wrapped_key in recipients:
+        public_key = bytes.fromhex(public_key) if isinstance(public_key, str) else public_key
+        if len(public_key) != KEY_SIZE or len(wrapped_key) != KEY_SIZE:
+            raise ValueError(f"recipient keys have to be {KEY_SIZE} bytes")
+        table[offset:offset + KEY_SIZE] = public_key
+        table[offset + KEY_SIZE:offset + 2 * KEY_SIZE] = wrapped_key
+        offset += 2 * KEY_SIZE
+    return table
+
+
+def pack(frame):
+    ssn = frame.ssn.encode("ascii") if isinstance(frame.ssn, str) else bytes(frame.ssn)
+    if len(ssn) != SSN_SIZE:
+        raise ValueError(f"sender ssn has to be {SSN_SIZE} characters")
+
+    fields = (frame.message_signature, frame.content_signature, frame.ciphertext)
+    if frame.flags & FLAG_BROADCAST:
+        fields = fields[:2] + (_recipient_table(frame.recipients), frame.ciphertext)
+    lengths = [len(memoryview(field)) for field in fields]
+
+    # one allocation, every field copied straight into place
+    out = bytearray(HEADER_SIZE + sum(lengths))
+    _HEADER.pack_into(out, 0, MAGIC, frame.version, frame.flags, frame.timestamp, ssn, lengths[0], lengths[1], sum(lengths[2:]))
+
+    offset = HEADER_SIZE
+    for field, length in zip(fields, lengths):
+        out[offset:offset + length] = field
+        offset += length
+    return bytes(out)
+
+
+def unpack(buffer):
+    # the signature and ciphertext fields are memoryviews into buffer, nothing is copied
+    view = memoryview(buffer)
+    if len(view) < HEADER_SIZE:
+        raise ValueError("frame is shorter than its header")
+
+    magic, version, flags, timestamp, ssn, sig_len, csig_len, ct_len = _HEADER.unpack_from(view, 0)
+    if magic != MAGIC:
+        raise ValueError("not an ANI message frame")
+    if version != VERSION:
+        raise ValueError(f"unsupported frame version {version}")
+    if len(view) != HEADER_SIZE + sig_len + csig_len + ct_len:
+        raise ValueError("frame length doesn't match its header")
+
+    offset = HEADER_SIZE
+    fields = []
+    for length in (sig_len, csig_len, ct_len):
+        fields.append(view[offset:offset + length])
+        offset += length
+
+    message_signature, content_signature, ciphertext = fields
+    recipients = []
+    if flags & FLAG_BROADCAST:
+        if len(ciphertext) < _RECIPIENT_COUNT.size:
+            raise ValueError("broadcast frame is missing its recipient table")
+        (count,) = _RECIPIENT_COUNT.unpack_from(ciphertext, 0)
+        offset = _RECIPIENT_COUNT.size
+        if len(ciphertext) < offset + 2 * KEY_SIZE * count:
+            raise ValueError("broadcast recipient table is truncated")
+        for _ in range(count):
+            recipients.append((ciphertext[offset:offset + KEY_SIZE].hex(), ciphertext[offset + KEY_SIZE:offset + 2 * KEY_SIZE]))
+            offset += 2 * KEY_SIZE
+        ciphertext = ciphertext[offset:]
+
+    return Frame(version, flags, timestamp, ssn.decode("ascii"), message_signature, content_signature, ciphertext, recipients)
+
+
+def render_armored(frame, integrity, qr=True):
+    # the human readable form, exactly what shape() always printed
+    timestamp = time.strftime(ARMOR_TIME_FORMAT, time.localtime(frame.timestamp))
+    content_signature = bytes(frame.content_signature).hex()
+    recipients = "".join(f"\nRecipient: {public_key} {bytes(wrapped_key).hex()}" for public_key, wrapped_key in frame.recipients)
+
+    armored = (
+        f"{TOP_MARKING}{bytes(frame.ciphertext).hex()}{BOTTOM_MARKING}"
+        f"\n\nSender's clock timezone: {timestamp}"
+        f"\nMessage integrity: {integrity}"
+        f"\nSender SSN: {frame.ssn}{recipients}"
+        f"\nMessage signature: {bytes(frame.message_signature).hex()}"
+        f"\nContent signature: {content_signature}\n"
+    )
+    if qr:
+        armored += generate_qr_ascii(content_signature, return_string=True)
+    return armored
+
+
+# ---- armored text parsing ----
+# reads armored messages from a stream a chunk at a time and yields each one
+# as soon as its last field is read. the QR art after a message is skipped by
+# searching for the next "=" (the art never contains one), so it's never
+# split into lines, and memory stays bounded by the largest single message.
+
+ARMOR_CHUNK_SIZE = 64 * 1024
+
+_ARMOR_FIELDS = {
+    "Sender's clock timezone": "timestamp",
+    "Message integrity": "integrity",
+    "Sender SSN": "ssn",
+    "Message signature": "message_signature",
+    "Content signature": "content_signature"
+}
+
+# the field that ends a message, everything after it up to the next BEGIN is QR art
+_LAST_FIELD = "content_signature"
+
+_BEGIN = TOP_MARKING.strip()
+_END = BOTTOM_MARKING.strip()
+
+
+def _chunks(stream, chunk_size):
+    # text chunks from a text or binary stream
+    decoder = None
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        if isinstance(chunk, bytes):
+            if decoder is None:
+                decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+            chunk = decoder.decode(chunk)
+        yield chunk
+    if decoder is not None:
+        tail = decoder.decode(b"", final=True)
+        if tail:
+            yield tail
+
+
+class _ArmorParser:
+    def __init__(self):
+        self.record = None
+        self.body = None        # ciphertext lines while inside BEGIN ... END
+        self.skipping = False   # inside the QR art after a message
+
+    def line(self, line):
+        # feeds one line, returns a finished record or None
+        line = line.strip()
+        if line == _BEGIN:
+            finished = self.finish()
+            self.record = {"ciphertext": "", "recipients": []}
+            self.body = []
+            return finished
+
+        record = self.record
+        if record is None:
+            return None
+
+        if self.body is not None:
+            if line == _END:
+                record["ciphertext"] = "".join(self.body)
+                self.body = None
+            else:
+                self.body.append(line)
+        elif line.startswith("Recipient: "):
+            public_key, _, wrapped_key = line[len("Recipient: "):].partition(" ")
+            record["recipients"].append((public_key, wrapped_key))
+        elif ": " in line:
+            name, _, value = line.partition(": ")
+            field = _ARMOR_FIELDS.get(name)
+            if field is not None:
+                record[field] = value
+                if field == _LAST_FIELD:
+                    self.skipping = True
+                    return self.finish()
+        return None
+
+    def finish(self):
+        record = self.record
+        if record is not None and self.body is not None:
+            # cut off before its END marker
+            record["ciphertext"] = "".join(self.body)
+            record["truncated"] = True
+        self.record = None
+        self.body = None
+        return record
+
+
+def iter_armored(stream, chunk_size=ARMOR_CHUNK_SIZE):
+    # yields every armored message in stream as a dict of its hex/text fields
+    # (ciphertext, timestamp, integrity, ssn, signatures, recipients)
+    parser = _ArmorParser()
+    partial = []    # pieces of a line that spans chunks
+
+    for chunk in _chunks(stream, chunk_size):
+        pos = 0
+        while True:
+            if parser.skipping:
+                start = chunk.find("=", pos)
+                if start < 0:
+                    pos = len(chunk)
+                    break
+                parser.skipping = False
+                pos = start
+
+            end = chunk.find("\n", pos)
+            if end < 0:
+                break
+
+            line = chunk[pos:end]
+            if partial:
+                partial.append(line)
+                line = "".join(partial)
+                partial = []
+            pos = end + 1
+
+            record = parser.line(line)
+            if record is not None:
+                yield record
+
+        if pos < len(chunk):
+            partial.append(chunk[pos:])
+
+    if partial:
+        record = parser.line("".join(partial))
+        if record is not None:
+            yield record
+    record = parser.finish()
+    if record is not None:
+        yield record
+
+
+def parse_armored(text):
+    # every armored message in text, as a list
+    return list(iter_armored(io.StringIO(text)))
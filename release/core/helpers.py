@@ -0,0 +1,53 @@
+# numpy is optional, the pure python path gives the same bytes
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# ---- xor ----
+
+# bytes per wide-int step, bounds the temporaries of one step
+XOR_BLOCK_SIZE = 64 * 1024
+
+# below this numpy's call overhead costs more than it saves
+NUMPY_MIN_SIZE = 4096
+
+
+def _byte_view(buffer):
+    view = memoryview(buffer)
+    if view.format != "B" or view.ndim != 1:
+        view = view.cast("B")
+    return view
+
+def xor_into(dst, src, keystream):
+    # dst[:n] = src[:n] ^ keystream[:n] with n = len(src), returns n
+    # all three are buffers (bytes, bytearray, memoryview, ...), dst has to be
+    # writable and may be src itself for an in place xor
+
+    src = _byte_view(src)
+    keystream = _byte_view(keystream)
+    dst = _byte_view(dst)
+    n = len(src)
+
+    if len(keystream) < n:
+        raise ValueError("keystream is shorter than the data")
+    if len(dst) < n:
+        raise ValueError("destination buffer is too small")
+    if dst.readonly:
+        raise ValueError("destination buffer is read-only")
+
+    if numpy is not None and n >= NUMPY_MIN_SIZE:
+        numpy.bitwise_xor(
+            numpy.frombuffer(src, dtype=numpy.uint8, count=n),
+            numpy.frombuffer(keystream, dtype=numpy.uint8, count=n),
+            out=numpy.frombuffer(dst, dtype=numpy.uint8, count=n)
+        )
+        return n
+
+    # one big-int xor per block instead of one python step per byte
+    for start in range(0, n, XOR_BLOCK_SIZE):
+        end = min(start + XOR_BLOCK_SIZE, n)
+        block = int.from_bytes(src[start:end], "little") ^ int.from_bytes(keystream[start:end], "little")
+        dst[start:end] = block.to_bytes(end - start, "little")
+    return n
@@ -0,0 +1,169 @@
+import random
+import hashlib
+from array import array
+from collections import OrderedDict
+
+# Legacy keystream, fast.
+#
+# Messages were encrypted with [rng.randint(0, 255) for _ in range(n)] over a
+# random.Random seeded from the receiver key. randint(0, 255) draws
+# getrandbits(9), which takes the top 9 bits of one 32-bit Mersenne Twister
+# word and retries while the value is >= 256. So the keystream is: every MT
+# word whose top bit is 0, mapped to bits 23..30 of that word.
+#
+# getrandbits(32 * n) hands out n words in one call (little-endian), and the
+# shifting, masking and filtering below all run at C speed on bytes objects.
+
+# per byte lookup tables for bytes.translate
+_SHL1 = bytes((b << 1) & 0xFF for b in range(256))     # top byte -> bits 1..7 of the value
+_SHR7 = bytes(b >> 7 for b in range(256))              # next byte -> bit 0 of the value, top byte -> rejected flag
+
+# extra words drawn per refill, so a refill rarely comes up short
+_SLACK_WORDS = 64
+
+
+def seed_from_key(key):
+    return int(hashlib.sha256(key.encode()).hexdigest(), 16)
+
+
+def _draw(rng, words):
+    # keystream bytes produced by the next `words` MT outputs
+    raw = rng.getrandbits(32 * words).to_bytes(4 * words, "little")
+    top = raw[3::4]
+
+    high = int.from_bytes(top.translate(_SHL1), "little")
+    low = int.from_bytes(raw[2::4].translate(_SHR7), "little")
+
+    # one UTF-16 code unit per word: the value in the low byte and 1 in the
+    # high byte if randint rejects the word. encoding to latin-1 with
+    # "ignore" then drops exactly the rejected words (code points > 255)
+    units = bytearray(2 * words)
+    units[0::2] = (high | low).to_bytes(words, "little")
+    units[1::2] = top.translate(_SHR7)
+
+    return units.decode("utf-16-le").encode("latin-1", "ignore")
+
+
+class Keystream:
+    """Byte-for-byte the randint(0, 255) sequence of rng, read in bulk."""
+
+    def __init__(self, rng, pending=b"", state=None):
+        self.rng = rng
+        self.pending = pending    # bytes already drawn from rng but not handed out yet
+        self.state = state        # packed MT state to resume from when rng is None
+
+    def read(self, n):
+        if n <= len(self.pending):
+            data = self.pending[:n]
+            self.pending = self.pending[n:]
+            return data
+
+        if self.rng is None:
+            self.rng = _unpack_state(self.state)
+            self.state = None
+
+        parts = [self.pending]
+        have = len(self.pending)
+        while have < n:
+            # about half the words are accepted
+            chunk = _draw(self.rng, 2 * (n - have) + _SLACK_WORDS)
+            parts.append(chunk)
+            have += len(chunk)
+
+        data = b"".join(parts)
+        self.pending = data[n:]
+        return data[:n]
+
+
+# ---- per-receiver contexts ----
+# every message to the same receiver starts from the same keystream, so the
+# cache keeps, per key, the first prefix_size bytes plus the MT state right
+# after them. short messages are served from the prefix without hashing or
+# seeding anything, longer ones resume the generator from the stored state.
+
+def _pack_state(rng):
+    # getstate() is (version, 624 words + position, gauss_next): 2.5 KB packed instead of ~20 KB of ints
+    version, internal, gauss_next = rng.getstate()
+    return version, array("I", internal), gauss_next
+
+def _unpack_state(state):
+    version, internal, gauss_next = state
+    rng = random.Random()
+    rng.setstate((version, tuple(internal), gauss_next))
+    return rng
+
+
+class KeystreamCache:
+    """Bounded LRU of keystream starting points, keyed by receiver key."""
+
+    def __init__(self, max_entries=64, max_bytes=1 << 20, prefix_size=4096):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.prefix_size = prefix_size
+
+        self.entries = OrderedDict()    # key -> (prefix, packed state, size)
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def keystream(self, key):
+        if self.max_entries <= 0:
+            return Keystream(random.Random(seed_from_key(key)))
+
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            entry = self._build(key)
+            if entry[2] <= self.max_bytes:
+                self.entries[key] = entry
+                self.size += entry[2]
+                self._shrink()
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+
+        prefix, state, _ = entry
+        return Keystream(None, prefix, state)
+
+    def _build(self, key):
+        stream = Keystream(random.Random(seed_from_key(key)))
+        prefix = stream.read(self.prefix_size) + stream.pending
+        state = _pack_state(stream.rng)
+        size = len(prefix) + state[1].itemsize * len(state[1])
+        return prefix, state, size
+
+    def _shrink(self):
+        while self.entries and (len(self.entries) > self.max_entries or self.size > self.max_bytes):
+            _, (_, _, size) = self.entries.popitem(last=False)
+            self.size -= size
+            self.evictions += 1
+
+    def evict(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[2]
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+        self.size = 0
+
+    def stats(self):
+        return {
+            "entries": len(self.entries),
+            "bytes": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
+
+
+keystream_cache = KeystreamCache()
+
+
+def keystream_for(key, cached=True):
+    # cached=False for one-off keys (like broadcast content keys) that would only churn the cache
+    if not cached:
+        return Keystream(random.Random(seed_from_key(key)))
+    return keystream_cache.keystream(key)
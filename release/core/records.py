@@ -0,0 +1,397 @@
+from array import array
+
+from .encryption import get_ssn
+
+# Compact in-memory records for the stores.
+#
+# JSON stays the format on disk and the interface: every record answers
+# record["field"], record.get("field") and to_dict() like the dict it was
+# loaded from. Inside, public keys are 32 raw bytes shared through
+# key_table, timestamps are packed into an int, and fields that can be
+# derived (a contact's default name, a private key that's seed + public key)
+# aren't stored at all. A dict that doesn't fit a record's shape is kept as
+# it is.
+
+
+# ---- key table ----
+
+KEY_SIZE = 32
+
+# the table is pruned whenever it doubled since the last prune
+PRUNE_MIN_KEYS = 1024
+
+
+def raw_key(public_key):
+    # 32 bytes for a lowercase hex key, anything else is returned unchanged
+    if isinstance(public_key, str) and len(public_key) == 2 * KEY_SIZE:
+        try:
+            raw = bytes.fromhex(public_key)
+        except ValueError:
+            return public_key
+        if raw.hex() == public_key:
+            return raw
+    return public_key
+
+
+def hex_key(key):
+    return key.hex() if isinstance(key, bytes) else key
+
+
+class KeyTable:
+    # one object per distinct public key, shared by every record holding it.
+    # whatever keeps a key (a record, a ring column, the contact index) counts
+    # itself in with retain() and out with release(); prune() drops the keys
+    # nobody holds
+    def __init__(self):
+        self.keys = {}
+        self.refs = {}      # key -> holders
+        self.pruned_size = PRUNE_MIN_KEYS
+
+    def __len__(self):
+        return len(self.keys)
+
+    def intern(self, public_key):
+        # the shared key, without holding it
+        key = raw_key(public_key)
+        shared = self.keys.get(key)
+        if shared is None:
+            if len(self.keys) >= 2 * self.pruned_size:
+                self.prune()
+            self.keys[key] = shared = key
+            self.refs[key] = 0
+        return shared
+
+    def retain(self, public_key):
+        shared = self.intern(public_key)
+        self.refs[shared] += 1
+        return shared
+
+    def release(self, key):
+        refs = self.refs.get(key)
+        if refs:
+            self.refs[key] = refs - 1
+
+    def prune(self):
+        unused = [key for key, refs in self.refs.items() if not refs]
+        for key in unused:
+            del self.keys[key]
+            del self.refs[key]
+        self.pruned_size = max(len(self.keys), PRUNE_MIN_KEYS)
+        return len(unused)
+
+
+key_table = KeyTable()
+
+
+# ---- timestamps ----
+# "%Y-%m-%d %H:%M:%S" <-> the int YYYYMMDDHHMMSS, None if it doesn't round-trip
+
+def pack_timestamp(timestamp):
+    if not isinstance(timestamp, str) or len(timestamp) != 19:
+        return None
+    digits = timestamp[0:4] + timestamp[5:7] + timestamp[8:10] + timestamp[11:13] + timestamp[14:16] + timestamp[17:19]
+    if not digits.isdigit():
+        return None
+    stamp = int(digits)
+    if unpack_timestamp(stamp) != timestamp:
+        return None
+    return stamp
+
+
+def unpack_timestamp(stamp):
+    date, time = divmod(stamp, 1000000)
+    return f"{date // 10000:04d}-{date // 100 % 100:02d}-{date % 100:02d} {time // 10000:02d}:{time // 100 % 100:02d}:{time % 100:02d}"
+
+
+# ---- records ----
+
+class Record:
+    __slots__ = ()
+    FIELDS = ()
+
+    def __getitem__(self, field):
+        if field not in self.FIELDS:
+            raise KeyError(field)
+        return getattr(self, field)
+
+    def __setitem__(self, field, value):
+        if field not in self.FIELDS:
+            raise KeyError(field)
+        setattr(self, field, value)
+
+    def __contains__(self, field):
+        return field in self.FIELDS
+
+    def get(self, field, default=None):
+        return getattr(self, field) if field in self.FIELDS else default
+
+    def keys(self):
+        return self.FIELDS
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def __eq__(self, other):
+        if isinstance(other, (Record, dict)):
+            return self.to_dict() == (other.to_dict() if isinstance(other, Record) else other)
+        return NotImplemented
+
+    # mutable and equal to dicts, so unhashable like them
+    __hash__ = None
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+def as_dict(record):
+    return record.to_dict() if isinstance(record, Record) else record
+
+
+def as_dicts(records):
+    return [as_dict(record) for record in records]
+
+
+class Message(Record):
+    __slots__ = ("content", "sender", "receiver", "stamp")
+    FIELDS = ("content", "sender_public_key", "receiver_public_key", "timestamp")
+
+    def __init__(self, content, sender, receiver, stamp):
+        self.content = content
+        self.sender = key_table.retain(sender)      # shared keys
+        self.receiver = key_table.retain(receiver)
+        self.stamp = stamp                          # packed timestamp
+
+    def __del__(self):
+        key_table.release(self.sender)
+        key_table.release(self.receiver)
+
+    @classmethod
+    def from_dict(cls, record):
+        # None if record doesn't have exactly the message_record() shape
+        if isinstance(record, cls):
+            return record
+        if len(record) != len(cls.FIELDS) or not all(field in record for field in cls.FIELDS):
+            return None
+        stamp = pack_timestamp(record["timestamp"])
+        if stamp is None or not isinstance(record["content"], str):
+            return None
+        return cls(record["content"], record["sender_public_key"], record["receiver_public_key"], stamp)
+
+    @property
+    def sender_public_key(self):
+        return hex_key(self.sender)
+
+    @sender_public_key.setter
+    def sender_public_key(self, public_key):
+        key_table.release(self.sender)
+        self.sender = key_table.retain(public_key)
+
+    @property
+    def receiver_public_key(self):
+        return hex_key(self.receiver)
+
+    @receiver_public_key.setter
+    def receiver_public_key(self, public_key):
+        key_table.release(self.receiver)
+        self.receiver = key_table.retain(public_key)
+
+    @property
+    def timestamp(self):
+        return unpack_timestamp(self.stamp)
+
+    @timestamp.setter
+    def timestamp(self, timestamp):
+        stamp = pack_timestamp(timestamp)
+        if stamp is None:
+            raise ValueError(f"timestamp '{timestamp}' isn't in the %Y-%m-%d %H:%M:%S format")
+        self.stamp = stamp
+
+
+class Contact(Record):
+    __slots__ = ("key", "label")
+    FIELDS = ("name", "public_key")
+
+    def __init__(self, key, label=None):
+        self.key = key_table.retain(key)
+        self.label = label      # None: the name is the key's ssn
+
+    def __del__(self):
+        key_table.release(self.key)
+
+    @classmethod
+    def from_dict(cls, record):
+        if isinstance(record, cls):
+            return record
+        if len(record) != len(cls.FIELDS) or not all(field in record for field in cls.FIELDS):
+            return None
+        if not isinstance(record["public_key"], str):
+            return None
+        name = record["name"]
+        return cls(record["public_key"], None if name == get_ssn(record["public_key"]) else name)
+
+    @property
+    def name(self):
+        return get_ssn(self.public_key) if self.label is None else self.label
+
+    @name.setter
+    def name(self, name):
+        self.label = None if name == get_ssn(self.public_key) else name
+
+    @property
+    def public_key(self):
+        return hex_key(self.key)
+
+    @public_key.setter
+    def public_key(self, public_key):
+        key_table.release(self.key)
+        self.key = key_table.retain(public_key)
+
+
+class Keypair(Record):
+    __slots__ = ("seed_key", "key", "private", "valid")
+    FIELDS = ("seed", "public_key", "private_key", "valid")
+
+    def __init__(self, seed_key, key, private, valid):
+        self.seed_key = seed_key
+        self.key = key_table.retain(key)
+        self.private = private  # None: the private key is seed + public key
+        self.valid = valid
+
+    def __del__(self):
+        key_table.release(self.key)
+
+    @classmethod
+    def from_dict(cls, record):
+        if isinstance(record, cls):
+            return record
+        if len(record) != len(cls.FIELDS) or not all(field in record for field in cls.FIELDS):
+            return None
+        seed, public_key, private_key = record["seed"], record["public_key"], record["private_key"]
+        if not all(isinstance(value, str) for value in (seed, public_key, private_key)):
+            return None
+        return cls(
+            raw_key(seed),
+            public_key,
+            None if private_key == seed + public_key else private_key,
+            record["valid"]
+        )
+
+    @property
+    def seed(self):
+        return hex_key(self.seed_key)
+
+    @seed.setter
+    def seed(self, seed):
+        self.seed_key = raw_key(seed)
+
+    @property
+    def public_key(self):
+        return hex_key(self.key)
+
+    @public_key.setter
+    def public_key(self, public_key):
+        key_table.release(self.key)
+        self.key = key_table.retain(public_key)
+
+    @property
+    def private_key(self):
+        return self.seed + self.public_key if self.private is None else self.private
+
+    @private_key.setter
+    def private_key(self, private_key):
+        self.private = None if private_key == self.seed + self.public_key else private_key
+
+
+def compact(record_class, record):
+    # the record_class form of a dict, or the dict itself if it doesn't fit
+    return record_class.from_dict(record) or record
+
+
+# ---- message history ----
+# a ring of messages stored by column: content, sender and receiver (shared
+# keys, retained while they're in a column) and the packed timestamps in an array. a message costs four slots of
+# its columns plus its content; Message objects are only built when read.
+# appending past the capacity overwrites the oldest in O(1).
+
+_RAW = -1   # stamp of a dict that's kept as it is (in the content column)
+
+
+class MessageRing:
+    def __init__(self, capacity, messages=()):
+        self.capacity = capacity
+        self.content = []
+        self.sender = []
+        self.receiver = []
+        self.stamp = array("q")
+        self.head = 0       # column position of the oldest message
+        self.extend(messages)
+
+    def __len__(self):
+        return len(self.content)
+
+    def _position(self, n):
+        size = len(self.content)
+        if n < 0:
+            n += size
+        if not 0 <= n < size:
+            raise IndexError("message index out of range")
+        return (self.head + n) % size
+
+    def _record(self, position):
+        if self.stamp[position] == _RAW:
+            return self.content[position]
+        return Message(self.content[position], self.sender[position], self.receiver[position], self.stamp[position])
+
+    def __getitem__(self, n):
+        return self._record(self._position(n))
+
+    def __iter__(self):
+        size = len(self.content)
+        for n in range(size):
+            yield self._record((self.head + n) % size)
+
+    def append(self, record):
+        if self.capacity <= 0:
+            return
+        message = Message.from_dict(record)
+        if message is None:
+            fields = (record, None, None, _RAW)
+        else:
+            fields = (message.content, key_table.retain(message.sender), key_table.retain(message.receiver), message.stamp)
+
+        if len(self.content) < self.capacity:
+            for column, value in zip((self.content, self.sender, self.receiver, self.stamp), fields):
+                column.append(value)
+            return
+        position = self.head
+        self._release(position)
+        self.content[position], self.sender[position], self.receiver[position], self.stamp[position] = fields
+        self.head = (position + 1) % self.capacity
+
+    def _release(self, position):
+        if self.stamp[position] != _RAW:
+            key_table.release(self.sender[position])
+            key_table.release(self.receiver[position])
+
+    def extend(self, records):
+        for record in records:
+            self.append(record)
+
+    def __del__(self):
+        for position in range(len(self.content)):
+            self._release(position)
+
+    def clear(self):
+        self.__del__()
+        self.content = []
+        self.sender = []
+        self.receiver = []
+        self.stamp = array("q")
+        self.head = 0
+
+    def __delitem__(self, n):
+        self._position(n)
+        messages = list(self)
+        del messages[n]
+        self.clear()
+        self.extend(messages)
@@ -0,0 +1,346 @@
+import os
+import json
+import sqlite3
+import tempfile
+import threading
+from collections import deque
+
+
+# ---- atomic writes ----
+# the new content goes to a temp file next to the target, which then replaces
+# it in one rename: a crash leaves either the old file or the new one. every
+# write gets its own temp file, so concurrent writers of one file don't clash
+
+def write_atomic(filepath, data):
+    # data is text, or bytes for a binary file
+    directory = os.path.dirname(filepath)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=directory or ".", prefix=f"{os.path.basename(filepath)}.", suffix=".tmp", delete=False) as f:
+        try:
+            f.write(data if isinstance(data, bytes) else data.encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+        except BaseException:
+            f.close()
+            os.remove(f.name)
+            raise
+    try:
+        os.replace(f.name, filepath)
+    except BaseException:
+        os.remove(f.name)
+        raise
+
+
+def file_signature(filepath):
+    # (mtime, size), None if there's no file; a changed signature means the file changed
+    try:
+        stat = os.stat(filepath)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def write_json_atomic(filepath, data, indent=4):
+    write_atomic(filepath, json.dumps(data, indent=indent))
+
+
+# ---- write-behind ----
+# stores hand their writes to a WriteBehind instead of doing them on the
+# caller's thread. a background thread runs them once WRITE_BEHIND_DELAY has
+# passed since the first pending write, or as soon as WRITE_BEHIND_MAX_PENDING
+# writes are waiting. only the latest write per file is kept, so a burst of
+# saves to one file is written once. flush() writes everything now and is
+# what shutdown has to call.
+#
+# the content is serialized by the caller when it schedules the write, the
+# thread only writes bytes out: it never reads a store while it's changing.
+# a write that fails stays pending and is retried with the next one.
+
+WRITE_BEHIND_DELAY = 0.5
+WRITE_BEHIND_MAX_PENDING = 32
+
+
+class WriteBehind:
+    def __init__(self, delay=WRITE_BEHIND_DELAY, max_pending=WRITE_BEHIND_MAX_PENDING, on_written=None, on_error=None):
+        self.delay = delay
+        self.max_pending = max_pending
+        self.on_written = on_written    # called with the filepath after each write
+        self.on_error = on_error or (lambda filepath, error: print(f"write-behind: writing {filepath} failed: {error!r}"))
+        self.pending = {}               # filepath -> content, in schedule order
+        self.inflight = set()
+        self.scheduled = 0              # writes asked for since the last flush
+        self.writes = 0                 # writes actually done
+        self.last_error = None
+        self.lock = threading.Lock()        # guards the fields above
+        self.flush_lock = threading.Lock()  # one flush at a time
+        self.dirty = threading.Event()
+        self.full = threading.Event()
+        self.thread = None
+
+    def schedule(self, filepath, data):
+        # data is the whole new content of filepath, text or bytes
+        with self.lock:
+            self.pending[filepath] = data
+            self.scheduled += 1
+            if self.scheduled >= self.max_pending:
+                self.full.set()
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+                self.thread.start()
+        self.dirty.set()
+
+    def owns(self, filepath):
+        # True while filepath has a write waiting or running, its file on disk
+        # is older than the store in memory
+        with self.lock:
+            return filepath in self.pending or filepath in self.inflight
+
+    def _run(self):
+        while True:
+            self.dirty.wait()
+            self.full.wait(self.delay)
+            try:
+                self._flush(raise_errors=False)
+            except Exception as e:
+                # the thread has to survive anything, or nothing is written again
+                self.on_error(None, e)
+
+    def flush(self):
+        # writes everything pending on the caller's thread, raises the first
+        # error (the failed write stays pending)
+        self._flush(raise_errors=True)
+
+    def _flush(self, raise_errors):
+        with self.flush_lock:
+            with self.lock:
+                pending, self.pending = self.pending, {}
+                self.inflight.update(pending)
+                self.scheduled = 0
+                self.dirty.clear()
+                self.full.clear()
+
+            error = None
+            for filepath, data in pending.items():
+                try:
+                    write_atomic(filepath, data)
+                except Exception as e:
+                    error = error or e
+                    with self.lock:
+                        self.pending.setdefault(filepath, data)
+                    if not raise_errors:
+                        self.on_error(filepath, e)
+                else:
+                    self.writes += 1
+                    if self.on_written is not None:
+                        self.on_written(filepath)
+                finally:
+                    with self.lock:
+                        self.inflight.discard(filepath)
+
+            self.last_error = error
+            if error is not None and raise_errors:
+                raise error
+
+
+# ---- append-only jsonl log ----
+# one JSON record per line. appending writes a single line, so it costs the
+# same however long the history is. retention is applied by compact(), which
+# rewrites the file with only the records to keep (temp file + os.replace, so
+# a crash leaves either the old or the new file, never half of one).
+
+class JsonlLog:
+    def __init__(self, filepath, fsync_every=0):
+        self.filepath = filepath
+        self.fsync_every = fsync_every    # 0: leave syncing to the OS, n: fsync after every n appends
+        self.count = 0                    # records in the file, known after load()
+        self.unsynced = 0
+        self.handle = None
+
+    def exists(self):
+        return os.path.exists(self.filepath)
+
+    def _open(self):
+        if self.handle is None:
+            directory = os.path.dirname(self.filepath)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.handle = open(self.filepath, "a", encoding="utf-8")
+        return self.handle
+
+    def __iter__(self):
+        # streams the records, a torn or corrupted line is skipped
+        if not self.exists():
+            return
+        with open(self.filepath, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+    def load(self, limit=None):
+        # the last `limit` records (all of them if limit is None)
+        self.count = 0
+        records = deque(maxlen=limit)
+        for record in self:
+            records.append(record)
+            self.count += 1
+        return list(records)
+
+    def append(self, record):
+        self.extend([record])
+
+    def extend(self, records):
+        handle = self._open()
+        lines = [json.dumps(record, separators=(",", ":")) + "\n" for record in records]
+        handle.write("".join(lines))
+        handle.flush()
+
+        self.count += len(lines)
+        self.unsynced += len(lines)
+        if self.fsync_every and self.unsynced >= self.fsync_every:
+            self.sync()
+
+    def sync(self):
+        if self.handle is not None and self.unsynced:
+            self.handle.flush()
+            os.fsync(self.handle.fileno())
+        self.unsynced = 0
+
+    def compact(self, records):
+        # replaces the whole log with records
+        self.close()
+        write_atomic(self.filepath, "".join(json.dumps(record, separators=(",", ":")) + "\n" for record in records))
+        self.count = len(records)
+
+    def close(self):
+        if self.handle is not None:
+            self.sync()
+            self.handle.close()
+            self.handle = None
+
+
+# ---- sqlite message store ----
+# the message history in a table indexed by sender, receiver and timestamp,
+# so a conversation between two keys is an index lookup instead of a scan.
+# timestamps are the "%Y-%m-%d %H:%M:%S" strings message_record() writes,
+# they sort the same as text and as time.
+
+MESSAGE_COLUMNS = ("content", "sender_public_key", "receiver_public_key", "timestamp")
+
+_MESSAGE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    content TEXT,
+    sender_public_key TEXT,
+    receiver_public_key TEXT,
+    timestamp TEXT
+);
+CREATE INDEX IF NOT EXISTS messages_pair ON messages (sender_public_key, receiver_public_key, timestamp, id);
+CREATE INDEX IF NOT EXISTS messages_receiver ON messages (receiver_public_key, timestamp, id);
+CREATE INDEX IF NOT EXISTS messages_timestamp ON messages (timestamp, id);
+"""
+
+_SELECT = f"SELECT id, {', '.join(MESSAGE_COLUMNS)} FROM messages"
+_INSERT = f"INSERT INTO messages ({', '.join(MESSAGE_COLUMNS)}) VALUES ({', '.join('?' * len(MESSAGE_COLUMNS))})"
+
+CONVERSATION_PAGE_SIZE = 50
+
+
+def _message(row):
+    return dict(zip(MESSAGE_COLUMNS, row[1:]))
+
+
+class MessageDb:
+    def __init__(self, filepath):
+        self.filepath = filepath
+        directory = os.path.dirname(filepath)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(filepath)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_MESSAGE_SCHEMA)
+
+    def _rows(self, records):
+        return [tuple(record.get(column) for column in MESSAGE_COLUMNS) for record in records]
+
+    def count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+
+    def latest(self, limit):
+        # the newest `limit` messages, oldest first
+        rows = self.conn.execute(f"{_SELECT} ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+        return [_message(row) for row in reversed(rows)]
+
+    def insert_many(self, records, keep=None):
+        # one transaction for the whole batch; keep trims to the newest `keep` rows
+        with self.conn:
+            self.conn.executemany(_INSERT, self._rows(records))
+            if keep is not None:
+                self._trim(keep)
+
+    def trim(self, keep):
+        # drops all but the newest `keep` rows
+        with self.conn:
+            self._trim(keep)
+
+    def delete_latest(self, n):
+        # deletes the message n places before the newest (0: the newest)
+        with self.conn:
+            self.conn.execute("DELETE FROM messages WHERE id = (SELECT id FROM messages ORDER BY id DESC LIMIT 1 OFFSET ?)", (n,))
+
+    def between(self, start=None, end=None, limit=None):
+        # messages with start <= timestamp <= end, oldest first
+        query = f"{_SELECT} WHERE 1"
+        params = []
+        if start is not None:
+            query += " AND timestamp >= ?"
+            params.append(start)
+        if end is not None:
+            query += " AND timestamp <= ?"
+            params.append(end)
+        query += " ORDER BY timestamp, id LIMIT ?"
+        params.append(-1 if limit is None else limit)
+        return [_message(row) for row in self.conn.execute(query, params).fetchall()]
+
+    def _trim(self, keep):
+        self.conn.execute(
+            "DELETE FROM messages WHERE id <= (SELECT id FROM messages ORDER BY id DESC LIMIT 1 OFFSET ?)",
+            (keep,)
+        )
+
+    def conversation(self, public_key_a, public_key_b, after=None, cursor=None, page_size=CONVERSATION_PAGE_SIZE):
+        # one page of the messages between two keys, in time order, and the
+        # cursor for the next page (None on the last one)
+        # after: only messages newer than this timestamp string
+        # cursor: what the previous call returned, resumes right after it
+        query = (
+            f"{_SELECT} WHERE ((sender_public_key = ? AND receiver_public_key = ?)"
+            " OR (sender_public_key = ? AND receiver_public_key = ?))"
+        )
+        params = [public_key_a, public_key_b, public_key_b, public_key_a]
+        if cursor is not None:
+            query += " AND (timestamp, id) > (?, ?)"
+            params.extend(cursor)
+        elif after is not None:
+            query += " AND timestamp > ?"
+            params.append(after)
+        query += " ORDER BY timestamp, id LIMIT ?"
+        params.append(page_size + 1)
+
+        rows = self.conn.execute(query, params).fetchall()
+        next_cursor = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            next_cursor = (rows[-1][4], rows[-1][0])
+        return [_message(row) for row in rows], next_cursor
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
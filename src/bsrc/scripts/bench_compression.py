@@ -0,0 +1,50 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+import contextlib
+
+# run from anywhere: python src/bsrc/scripts/bench_compression.py
+RELEASE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "release")
+sys.path.insert(0, RELEASE)
+
+# app.py works on data/ relative to the working directory, keep the real one untouched
+workdir = tempfile.mkdtemp()
+shutil.copytree(os.path.join(RELEASE, "data"), os.path.join(workdir, "data"))
+os.chdir(workdir)
+
+with contextlib.redirect_stdout(open(os.devnull, "w")):
+    import app
+    seed_A, public_key_A, _, _ = app.generate_keypair()
+    seed_B, public_key_B, _, _ = app.generate_keypair()
+
+ROUNDS = 20
+
+def bench(message, compression):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        for _ in range(ROUNDS):
+            encrypted_hex = app.shape(public_key_A, public_key_B, message, seed_A, compression=compression)
+    elapsed = (time.perf_counter() - start) / ROUNDS
+
+    assert app.decrypt_with_pub(encrypted_hex, public_key_B) == message
+    return elapsed, len(encrypted_hex) // 2
+
+messages = {
+    "short": "see you at 8",
+    "random_content": app.random_content(),
+    "4 KB text": " ".join(app.random_content() for _ in range(20))[:4096],
+    "64 KB text": " ".join(app.random_content() for _ in range(300))[:65536]
+}
+
+print(f"end-to-end shape(), {ROUNDS} rounds\n")
+print(f"{'message':<16}{'bytes':>8}{'plain ms':>11}{'auto ms':>10}{'cipher':>9}{'auto':>8}")
+for name, message in messages.items():
+    plain_time, plain_size = bench(message, "none")
+    auto_time, auto_size = bench(message, "auto")
+    print(f"{name:<16}{len(message.encode()):>8}{plain_time * 1000:>11.3f}{auto_time * 1000:>10.3f}{plain_size:>9}{auto_size:>8}")
+
+# pending write-behind writes go to data/ in workdir
+app.context.close()
+shutil.rmtree(workdir)
@@ -0,0 +1,44 @@
+import os
+import sys
+import time
+
+# run from anywhere: python src/bsrc/scripts/bench_ed25519.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "release"))
+
+from core.ed25519 import B, scalarmult, scalarmult_var, double_scalarmult, ed_add, point_equal, encodepoint
+
+ROUNDS = 50
+
+def random_scalar():
+    return int.from_bytes(os.urandom(32), "little")
+
+def bench(name, func, args_list):
+    start = time.perf_counter()
+    for args in args_list:
+        func(*args)
+    elapsed = (time.perf_counter() - start) / len(args_list)
+    print(f"{name:<32} {elapsed * 1000:8.3f} ms")
+    return elapsed
+
+# a point that is not B, like a contact's public key
+P = scalarmult(B, random_scalar())
+Q = scalarmult(B, random_scalar())
+
+single_args = [(P, random_scalar()) for _ in range(ROUNDS)]
+double_args = [(random_scalar(), P, random_scalar(), Q) for _ in range(ROUNDS)]
+
+# results have to match before timings mean anything
+for point, e in single_args[:5]:
+    assert encodepoint(scalarmult(point, e)) == encodepoint(scalarmult_var(point, e))
+for a, P1, b, Q1 in double_args[:5]:
+    assert point_equal(double_scalarmult(a, P1, b, Q1), ed_add(scalarmult(P1, a), scalarmult(Q1, b)))
+
+print(f"variable-base scalar multiplication, {ROUNDS} rounds\n")
+
+base = bench("scalarmult (double-and-add)", scalarmult, single_args)
+fast = bench("scalarmult_var (wNAF)", scalarmult_var, single_args)
+print(f"{'speedup':<32} {base / fast:8.2f}x\n")
+
+base = bench("aP + bQ (two scalarmult)", lambda a, P1, b, Q1: ed_add(scalarmult(P1, a), scalarmult(Q1, b)), double_args)
+fast = bench("aP + bQ (double_scalarmult)", double_scalarmult, double_args)
+print(f"{'speedup':<32} {base / fast:8.2f}x")
@@ -0,0 +1,69 @@
+import os
+import sys
+import time
+import random
+import hashlib
+
+# run from anywhere: python src/bsrc/scripts/bench_keystream.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "release"))
+
+from core.keystream import Keystream, keystream_for, keystream_cache, seed_from_key
+from core.encryption import generate_keystream, encrypt, decrypt_with_pub
+
+# the original generator, every message on disk was encrypted with this
+def legacy_keystream(key, length):
+    seed = int(hashlib.sha256(key.encode()).hexdigest(), 16)
+    rng = random.Random(seed)
+    return [rng.randint(0, 255) for _ in range(length)]
+
+def legacy_encrypt(key, message):
+    msg_bytes = message.encode('utf-8')
+    keystream = legacy_keystream(key, len(msg_bytes))
+    return bytes([b ^ k for b, k in zip(msg_bytes, keystream)]).hex()
+
+def random_key():
+    return os.urandom(32).hex()
+
+# --- equivalence ---
+
+for length in (0, 1, 2, 63, 64, 65, 1000, 4097, 100000):
+    key = random_key()
+    assert generate_keystream(key, length) == bytes(legacy_keystream(key, length)), length
+
+# reading in uneven pieces has to continue the same sequence
+key = random_key()
+stream = keystream_for(key)
+pieces = b"".join(stream.read(n) for n in (1, 7, 0, 300, 5, 4096, 33))
+assert pieces == bytes(legacy_keystream(key, len(pieces)))
+
+for _ in range(20):
+    key = random_key()
+    message = os.urandom(random.randint(0, 3000)).hex()
+    assert encrypt(None, key, message) == legacy_encrypt(key, message)
+    assert decrypt_with_pub(legacy_encrypt(key, message), key) == message
+
+print("keystream matches the legacy randint sequence\n")
+
+# --- benchmark ---
+
+def bench(name, func, length, rounds):
+    key = random_key()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func(key, length)
+    elapsed = (time.perf_counter() - start) / rounds
+    print(f"{name:<10} {length:>9} bytes {elapsed * 1000:10.3f} ms")
+    return elapsed
+
+def bulk_keystream(key, length):
+    # the engine on its own, no per-receiver cache
+    return Keystream(random.Random(seed_from_key(key))).read(length)
+
+for length, rounds in ((64, 2000), (4096, 200), (1 << 20, 3)):
+    base = bench("legacy", legacy_keystream, length, rounds)
+    fast = bench("bulk", bulk_keystream, length, rounds)
+    # same receiver every round, like repeat messages to one contact
+    cached = bench("cached", generate_keystream, length, rounds)
+    print(f"{'speedup':<10} {base / fast:>25.1f}x bulk, {base / cached:.1f}x cached\n")
+
+print(keystream_cache.stats())
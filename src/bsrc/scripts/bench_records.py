@@ -0,0 +1,65 @@
+import os
+import sys
+import json
+import random
+import tracemalloc
+from collections import deque
+
+# run from anywhere: python src/bsrc/scripts/bench_records.py
+RELEASE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "release")
+sys.path.insert(0, RELEASE)
+
+from core.records import Keypair, Contact, MessageRing, compact, key_table
+from core.contacts import ContactIndex
+
+COUNT = 20000
+KEYS = 50   # distinct contacts the history is spread over
+
+def traced(build):
+    # bytes still allocated by what build() returns
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return after - before
+
+random.seed(1)
+keys = [os.urandom(32).hex() for _ in range(KEYS)]
+
+def message_dicts(content):
+    return [{
+        "content": content(i),
+        "sender_public_key": random.choice(keys),
+        "receiver_public_key": random.choice(keys),
+        "timestamp": f"2026-10-{1 + i // 3600 % 28:02d} {i // 60 % 24:02d}:{i // 3 % 60:02d}:{i % 60:02d}"
+    } for i in range(COUNT)]
+
+def report(name, records, as_dicts, as_records):
+    # both sides are built from json.loads(), the way the stores load them
+    data = json.dumps(records)
+    plain = traced(lambda: as_dicts(json.loads(data)))
+    packed = traced(lambda: as_records(json.loads(data)))
+    print(f"{name:<28}{plain / COUNT:>10.0f}{packed / COUNT:>10.0f}{plain / packed:>9.1f}x")
+
+print(f"tracemalloc, bytes per stored record, {COUNT} records\n")
+print(f"{'':<28}{'dicts':>10}{'records':>10}{'cut':>10}")
+
+short = message_dicts(lambda i: f"see you at {i % 12}")
+report("message, short content", short, lambda r: deque(r, maxlen=COUNT), lambda r: MessageRing(COUNT, r))
+
+words = "kari chilo toluri rilu kalugra dovengra lulo kafari falulo magrarilu luka loven".split()
+long = message_dicts(lambda i: " ".join(random.choice(words) for _ in range(30)))
+report("message, 30 word content", long, lambda r: deque(r, maxlen=COUNT), lambda r: MessageRing(COUNT, r))
+
+contacts = [{"name": key[:12], "public_key": key} for key in (os.urandom(32).hex() for _ in range(COUNT))]
+report("contact (with index)", contacts, ContactIndex, lambda r: ContactIndex(compact(Contact, c) for c in r))
+
+keypairs = []
+for _ in range(COUNT):
+    seed, public_key = os.urandom(32).hex(), os.urandom(32).hex()
+    keypairs.append({"seed": seed, "public_key": public_key, "private_key": seed + public_key, "valid": True})
+report("keypair", keypairs, lambda r: deque(r, maxlen=COUNT), lambda r: deque((compact(Keypair, k) for k in r), maxlen=COUNT))
+
+print(f"\nkey table: {len(key_table)} keys")
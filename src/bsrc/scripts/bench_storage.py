@@ -0,0 +1,46 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+import contextlib
+
+# run from anywhere: python src/bsrc/scripts/bench_storage.py
+RELEASE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "release")
+sys.path.insert(0, RELEASE)
+
+# app.py works on data/ relative to the working directory, keep the real one untouched
+workdir = tempfile.mkdtemp()
+shutil.copytree(os.path.join(RELEASE, "data"), os.path.join(workdir, "data"))
+os.chdir(workdir)
+
+with contextlib.redirect_stdout(open(os.devnull, "w")):
+    import app
+
+APPENDS = 200
+
+def record(i):
+    return app.message_record("a" * 64, "b" * 64, f"message number {i} " * 8)
+
+def bench(storage, limit):
+    path = app.storage_path(os.path.join("data", f"bench_{limit}.json"), storage)
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        parser = app.MessageParser(path, limit=limit, storage=storage)
+        parser.extend_messages([record(i) for i in range(limit)])
+
+        start = time.perf_counter()
+        for i in range(APPENDS):
+            parser.append_message(record(i))
+        elapsed = (time.perf_counter() - start) / APPENDS
+        parser.close()
+
+    assert len(app.MessageParser(path, limit=limit, storage=storage).get_all()) == limit
+    os.remove(path)
+    return elapsed
+
+print(f"append_message(), {APPENDS} appends onto a full store\n")
+print(f"{'limit':>8}{'json ms':>11}{'jsonl ms':>11}")
+for limit in (10, 100, 1000, 5000):
+    print(f"{limit:>8}{bench('json', limit) * 1000:>11.3f}{bench('jsonl', limit) * 1000:>11.3f}")
+
+shutil.rmtree(workdir)
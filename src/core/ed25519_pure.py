@@ -50,30 +50,75 @@ if Bx is None:
 
 B = (Bx % p, By % p)
 
-# point addition (Edwards coordinates), points are tuples (x,y)
+# points are kept in extended twisted Edwards coordinates (X:Y:Z:T) with
+# x = X/Z, y = Y/Z and x*y = T/Z, so adding and doubling need no inversion.
+# the only inversion happens when a point gets encoded.
+
+d2 = (2 * d) % p
+
+# identity point
+O = (0, 1, 1, 0)
+
+def to_extended(P):
+    # lift an affine (x, y) tuple; extended points are passed through
+    if len(P) == 4:
+        return P
+    x, y = P
+    return (x % p, y % p, 1, (x * y) % p)
+
+def to_affine(P):
+    if len(P) == 2:
+        return P
+    X, Y, Z, T = P
+    zinv = inv(Z)
+    return ((X * zinv) % p, (Y * zinv) % p)
+
+# point addition (extended coordinates, a = -1), "add-2008-hwcd-3"
 
 def ed_add(P, Q):
-    (x1, y1), (x2, y2) = P, Q
-    x1x2 = (x1 * x2) % p
-    y1y2 = (y1 * y2) % p
-    xnum = (x1 * y2 + x2 * y1) % p
-    xden = (1 + d * x1x2 * y1y2) % p
-    ynum = (y1y2 - a * x1x2) % p
-    yden = (1 - d * x1x2 * y1y2) % p
-    x3 = (xnum * inv(xden)) % p
-    y3 = (ynum * inv(yden)) % p
-
-    return (x3, y3)
+    X1, Y1, Z1, T1 = to_extended(P)
+    X2, Y2, Z2, T2 = to_extended(Q)
+    A = ((Y1 - X1) * (Y2 - X2)) % p
+    B_ = ((Y1 + X1) * (Y2 + X2)) % p
+    C = (T1 * d2 * T2) % p
+    D = (Z1 * 2 * Z2) % p
+    E = B_ - A
+    F = D - C
+    G = D + C
+    H = B_ + A
+
+    return ((E * F) % p, (G * H) % p, (F * G) % p, (E * H) % p)
+
+# dedicated doubling (extended coordinates, a = -1), "dbl-2008-hwcd"
 
 def ed_double(P):
-    return ed_add(P, P)
+    X1, Y1, Z1, _ = to_extended(P)
+    A = (X1 * X1) % p
+    B_ = (Y1 * Y1) % p
+    C = (2 * Z1 * Z1) % p
+    H = A + B_
+    E = (H - (X1 + Y1) * (X1 + Y1)) % p
+    G = A - B_
+    F = C + G
+
+    return ((E * F) % p, (G * H) % p, (F * G) % p, (E * H) % p)
+
+def ed_neg(P):
+    X, Y, Z, T = to_extended(P)
+    return ((-X) % p, Y, Z, (-T) % p)
+
+def point_equal(P, Q):
+    # compare without normalising: x1/z1 == x2/z2 and y1/z1 == y2/z2
+    X1, Y1, Z1, _ = to_extended(P)
+    X2, Y2, Z2, _ = to_extended(Q)
+    return (X1 * Z2 - X2 * Z1) % p == 0 and (Y1 * Z2 - Y2 * Z1) % p == 0
 
 # scalar multiplication (double-and-add)
 
 def scalarmult(P, e):
-    # e is Python int
-    Q = (0, 1)  # identity point
-    R = P
+    # e is Python int, returns an extended point
+    Q = O
+    R = to_extended(P)
     while e > 0:
         if e & 1:
             Q = ed_add(Q, R)
@@ -84,7 +129,7 @@ def scalarmult(P, e):
 # compress point: encode y (little-endian 32 bytes) and sign bit of x in msb
 
 def encodepoint(P):
-    x, y = P
+    x, y = to_affine(P)
     y_bytes = int.to_bytes(y, 32, "little")
     x_lsb = x & 1
 
@@ -0,0 +1,22 @@
+import os
+import sys
+
+import pytest
+
+# the code lives in release/ and imports itself as "core", like app.py does
+RELEASE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "release")
+sys.path.insert(0, os.path.abspath(RELEASE))
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    # app.py keeps its stores under data/ in the working directory
+    monkeypatch.chdir(tmp_path)
+    import app
+    # the session cache would otherwise hold parsers from the previous test
+    app.context.close()
+    monkeypatch.setattr(app, "context", app.AppContext())
+    yield app
+    # pending write-behind paths are relative, flush them before the
+    # working directory is restored
+    app.context.close()
@@ -0,0 +1,328 @@
+import os
+import sys
+import json
+import time
+import subprocess
+
+from core.frame import unpack, render_armored, parse_armored, TOP_MARKING, BOTTOM_MARKING
+from core.archive import MessageArchive
+from core.encryption import decrypt_with_pub, check_integrity
+
+from .conftest import RELEASE
+
+
+def test_shape_frame_round_trip(app):
+    seed, public_key, _, _ = app.new_keypair()
+    _, receiver, _, _ = app.new_keypair()
+
+    frame = unpack(app.shape_frame(public_key, receiver, "hello there", seed))
+    assert frame.ssn == app.get_ssn(public_key)
+    assert decrypt_with_pub(bytes(frame.ciphertext).hex(), receiver) == "hello there"
+    assert check_integrity("hello there", bytes(frame.message_signature).hex(), public_key)
+
+    # shape() returns the same ciphertext hex, the seed is found in the keypair store
+    assert app.shape(public_key, receiver, "hello there", armored=False) == bytes(frame.ciphertext).hex()
+
+
+def test_frame_message_and_armored_shape(app, capsys):
+    seed, public_key, _, _ = app.new_keypair()
+    _, receiver, _, _ = app.new_keypair()
+
+    frame = app.frame_message(public_key, receiver, "hello there", seed)
+    assert unpack(app.pack_frame(frame)).ciphertext == frame.ciphertext
+    assert decrypt_with_pub(bytes(frame.ciphertext).hex(), receiver) == "hello there"
+
+    # the armored text shape() prints carries the same ciphertext
+    hexed = app.shape(public_key, receiver, "hello there", seed)
+    record, = parse_armored(capsys.readouterr().out)
+    assert record["ciphertext"] == hexed
+
+
+def test_compressed_frame_round_trip(app):
+    seed, public_key, _, _ = app.new_keypair()
+    message = "kari chilo toluri " * 100
+
+    frame = unpack(app.shape_frame(public_key, public_key, message, seed, compression="zlib"))
+    assert frame.flags & 0x03
+    assert len(frame.ciphertext) < len(message)
+    assert decrypt_with_pub(bytes(frame.ciphertext).hex(), public_key) == message
+
+
+def test_broadcast_frame(app):
+    seed, public_key, _, _ = app.new_keypair()
+    receivers = [app.new_keypair()[1] for _ in range(3)]
+    packed = app.broadcast(public_key, receivers + receivers[:1], "to everyone", seed)
+
+    assert len(unpack(packed).recipients) == 3
+    for receiver in receivers:
+        assert app.open_broadcast(packed, receiver) == "to everyone"
+    assert app.open_broadcast(packed, public_key) is None
+
+
+def write_messages(app, tmp_path):
+    # an armored file holding two messages, a binary frame, a damaged frame
+    seed, sender, _, _ = app.new_keypair()
+    _, receiver, _, _ = app.new_keypair()
+    inbox = tmp_path / "inbox"
+    inbox.mkdir()
+
+    armored = [render_armored(unpack(app.shape_frame(sender, receiver, f"armored {n}", seed)), True) for n in range(2)]
+    (inbox / "a.txt").write_text("".join(armored))
+    (inbox / "b.ani").write_bytes(app.shape_frame(sender, receiver, "binary", seed))
+    (inbox / "c.ani").write_bytes(app.shape_frame(sender, receiver, "cut", seed)[:-3])
+    return receiver, inbox, armored
+
+
+def test_dcrypt_directory(app, tmp_path):
+    receiver, inbox, _ = write_messages(app, tmp_path)
+    results = app.dcrypt(str(inbox), receiver)
+    assert [(os.path.basename(source), status, plaintext) for source, status, plaintext, _ in results] == [
+        ("a.txt", "ok", "armored 0"),
+        ("a.txt", "ok", "armored 1"),
+        ("b.ani", "ok", "binary"),
+        ("c.ani", "damaged frame", None)
+    ]
+    assert [result[2] for result in app.dcrypt(str(inbox / "*.ani"), receiver)] == ["binary", None]
+
+
+def test_dcrypt_pasted_text(app, tmp_path):
+    receiver, _, armored = write_messages(app, tmp_path)
+    assert [result[2] for result in app.dcrypt(armored[1], receiver)] == ["armored 1"]
+
+    # a bare ciphertext hex string
+    assert app.dcrypt(app.encrypt("", receiver, "bare"), receiver)[0][1:3] == ("ok", "bare")
+    assert app.dcrypt("not hex at all", receiver)[0][1] == "invalid hex"
+
+
+def test_dcrypt_reports_truncated_and_empty_messages(app, tmp_path):
+    receiver, _, armored = write_messages(app, tmp_path)
+    cut = armored[0][:armored[0].index(BOTTOM_MARKING)]
+    assert app.dcrypt(cut, receiver)[0][1] == "truncated message"
+
+    empty = armored[0].split(TOP_MARKING)[0] + TOP_MARKING + BOTTOM_MARKING + "\n"
+    assert app.dcrypt(empty, receiver)[0][1] == "empty ciphertext"
+
+
+def test_read_pasted(app, monkeypatch):
+    seed, receiver, _, _ = app.new_keypair()
+    armored = render_armored(unpack(app.shape_frame(receiver, receiver, "pasted", seed)), True, qr=False)
+    lines = armored.strip("\n").split("\n")
+    # the prompt gets the first line, input() the rest, then whatever follows the paste
+    rest = iter(lines[1:] + ["", "receiver key"])
+    monkeypatch.setattr("builtins.input", lambda *prompt: next(rest))
+
+    text = app.read_pasted(lines[0])
+    assert [result[2] for result in app.dcrypt(text, receiver)] == ["pasted"]
+    # the last field ends the paste, the next prompt's answer is left alone
+    assert list(rest) == ["", "receiver key"]
+    assert app.read_pasted("plain text") == "plain text"
+
+
+def test_dcrypt_pool_keeps_the_order(app, tmp_path, monkeypatch):
+    receiver, inbox, _ = write_messages(app, tmp_path)
+    monkeypatch.setattr(app, "DCRYPT_POOL_MIN", 1)
+    results = app.dcrypt(str(inbox), receiver, workers=2)
+    assert [result[2] for result in results] == ["armored 0", "armored 1", "binary", None]
+
+
+def test_context_reuses_until_the_file_changes(app):
+    context = app.context
+    messages = context.messages()
+    assert context.messages() is messages
+
+    # our own write keeps the cached parser current
+    app.save_message("aa" * 32, "bb" * 32, "hello")
+    assert context.messages() is messages
+    context.flush()
+    assert context.messages() is messages
+
+    # another process rewrites the file: new size, new mtime
+    with open(app.messages_file, "w") as f:
+        json.dump([{"content": "elsewhere"}], f)
+    reloaded = context.messages()
+    assert reloaded is not messages
+    assert [m["content"] for m in reloaded.get_all()] == ["elsewhere"]
+
+    # same size, later mtime
+    stat = os.stat(app.messages_file)
+    os.utime(app.messages_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert context.messages() is not reloaded
+    assert context.stats()["reloads"] == 2
+
+
+def test_context_config_change_drops_the_stores(app):
+    context = app.context
+    messages = context.messages()
+    config = context.config()
+
+    # an edit that leaves the store settings as they are
+    with open(app.configuration_file, "a") as f:
+        f.write("\n")
+    assert context.config() is config
+    assert context.messages() is messages
+
+    with open(app.configuration_file, "a") as f:
+        f.write("number_of_saved_messages = 3\n")
+    assert context.config().get("number_of_saved_messages") == 3
+    assert context.messages() is not messages
+    assert context.messages().limit == 3
+
+
+def contents(messages):
+    return [m["content"] for m in messages]
+
+
+def test_message_ring_evicts_to_the_archive(app, tmp_path):
+    archive = MessageArchive(str(tmp_path / "messages.archive"))
+    parser = app.MessageParser(str(tmp_path / "messages.json"), limit=3, archive=archive)
+    parser.append_message({"content": "0"})
+    parser.append_message({"content": "1"})
+    parser.extend_messages([{"content": str(n)} for n in range(2, 7)])
+
+    assert contents(parser.get_all()) == ["4", "5", "6"]
+    assert contents(archive.between()) == ["0", "1", "2", "3"]
+
+    parser.delete_message(1)
+    assert contents(parser.get_all()) == ["4", "6"]
+    parser.append_message({"content": "7"})
+    assert contents(parser.get_all()) == ["4", "6", "7"]
+    assert len(archive) == 4
+    archive.close()
+
+
+def test_message_ring_loads_a_longer_file(app, tmp_path):
+    path = tmp_path / "messages.json"
+    path.write_text(json.dumps([{"content": str(n)} for n in range(5)]))
+    archive = MessageArchive(str(tmp_path / "messages.archive"))
+
+    parser = app.MessageParser(str(path), limit=2, archive=archive)
+    assert contents(parser.get_all()) == ["3", "4"]
+    assert contents(archive.between()) == ["0", "1", "2"]
+    assert contents(json.loads(path.read_text())) == ["3", "4"]
+    archive.close()
+
+
+def test_sqlite_store_keeps_its_own_retention(app, tmp_path):
+    path = str(tmp_path / "messages.db")
+    parser = app.MessageParser(path, limit=3, storage="sqlite", retention=5)
+    parser.extend_messages([app.message_record("aa" * 32, "bb" * 32, str(n)) for n in range(8)])
+    assert contents(parser.get_all()) == ["5", "6", "7"]
+    assert parser.db.count() == 5
+
+    # the next older row moves up into the ring
+    parser.delete_message(1)
+    assert contents(parser.get_all()) == ["4", "5", "7"]
+    assert parser.db.count() == 4
+    parser.close()
+
+    unlimited = app.MessageParser(str(tmp_path / "all.db"), limit=3, storage="sqlite")
+    unlimited.extend_messages([app.message_record("aa" * 32, "bb" * 32, str(n)) for n in range(8)])
+    assert unlimited.db.count() == 8
+    unlimited.close()
+
+
+def test_contact_log_is_not_compacted_on_load(app, tmp_path):
+    path = tmp_path / "contacts.jsonl"
+    lines = [json.dumps({"name": f"c{n}", "public_key": f"{n:02x}" * 32}) for n in range(5)]
+    path.write_text("\n".join(lines) + "\n")
+
+    parser = app.ContactParser(str(path), limit=3, storage="jsonl")
+    assert [contact["name"] for contact in parser.get_all()] == ["c2", "c3", "c4"]
+    parser.close()
+    assert path.read_text().count("\n") == 5
+
+
+def test_compression_is_off_by_default(app):
+    seed, public_key, _, _ = app.new_keypair()
+    message = "kari chilo toluri " * 100
+    frame = unpack(app.shape_frame(public_key, public_key, message, seed))
+    assert not frame.flags & 0x03
+    assert len(frame.ciphertext) == len(message)
+
+
+def test_switching_format_imports_the_json_store(app):
+    for n in range(3):
+        app.save_message("aa" * 32, "bb" * 32, f"kept {n}")
+    app.context.flush()
+
+    app.context.config().set("message_storage_format", "sqlite")
+    assert contents(app.context.messages().get_all()) == ["kept 0", "kept 1", "kept 2"]
+    assert os.path.exists(app.messages_file)
+
+
+def switch(app, storage, *messages):
+    app.context.config().set("message_storage_format", storage)
+    for message in messages:
+        app.save_message("aa" * 32, "bb" * 32, message)
+    app.context.flush()
+    # file times have to tell the stores apart
+    time.sleep(0.01)
+    return contents(app.context.messages().get_all())
+
+
+def test_switching_format_imports_the_last_active_store(app):
+    app.context.config().set("number_of_saved_messages", 100)
+    assert switch(app, "json", "json 0") == ["json 0"]
+    assert switch(app, "jsonl", "jsonl 0") == ["json 0", "jsonl 0"]
+    # the .json file is stale now, the log was written last
+    assert switch(app, "sqlite", "db 0") == ["json 0", "jsonl 0", "db 0"]
+    assert switch(app, "jsonl", "jsonl 1") == ["json 0", "jsonl 0", "db 0", "jsonl 1"]
+    assert switch(app, "json") == ["json 0", "jsonl 0", "db 0", "jsonl 1"]
+    assert switch(app, "sqlite") == ["json 0", "jsonl 0", "db 0", "jsonl 1"]
+    assert app.context.messages().db.count() == 4
+
+    # reopening the active format imports nothing
+    app.context.close()
+    app.context = app.AppContext()
+    assert contents(app.context.messages().get_all()) == ["json 0", "jsonl 0", "db 0", "jsonl 1"]
+
+
+def test_import_store_keeps_a_newer_target(app, tmp_path, capsys):
+    path = str(tmp_path / "store.json")
+    app.write_store(app.storage_path(path, "jsonl"), "jsonl", [{"n": 0}])
+    time.sleep(0.01)
+    app.write_store(path, "json", [{"n": 1}])
+
+    app.import_store(path, "json")
+    assert app.read_store(path, "json") == [{"n": 1}]
+    app.import_store(path, "jsonl")
+    assert app.read_store(app.storage_path(path, "jsonl"), "jsonl") == [{"n": 1}]
+    assert "Imported 1 records" in capsys.readouterr().out
+
+
+def test_user_config_schema_hash_is_stable_across_starts(tmp_path):
+    # the username default is random, the schema hash of a fresh start mustn't be
+    code = "import app; from core.config import schema_hash; print(schema_hash(app.USER_CONFIG_SCHEMA).hex())"
+    env = dict(os.environ, PYTHONPATH=RELEASE)
+    hashes = {subprocess.run([sys.executable, "-c", code], cwd=tmp_path, env=env, capture_output=True, text=True, check=True).stdout for _ in range(2)}
+    assert len(hashes) == 1
+
+
+def test_compression_setting(app):
+    seed, public_key, _, _ = app.new_keypair()
+    message = "kari chilo toluri " * 100
+    app.context.config().set("message_compression", "zlib")
+
+    frame = unpack(app.shape_frame(public_key, public_key, message, seed))
+    assert frame.flags & 0x03
+    assert decrypt_with_pub(bytes(frame.ciphertext).hex(), public_key) == message
+    assert unpack(app.broadcast(public_key, [public_key], message, seed)).flags & 0x03
+
+    # an explicit argument wins over the setting
+    assert not unpack(app.shape_frame(public_key, public_key, message, seed, compression="none")).flags & 0x03
+
+
+def test_sqlite_store_has_no_separate_archive(app):
+    app.context.config().set("message_storage_format", "sqlite")
+    app.context.config().set("number_of_saved_messages", 2)
+    for n in range(5):
+        app.save_message("aa" * 32, "bb" * 32, str(n))
+
+    messages = app.context.messages()
+    assert messages.archive is None
+    assert not os.path.exists(app.messages_archive_file)
+    assert contents(messages.get_all()) == ["3", "4"]
+    # amsg and cmsg read the same table
+    assert contents(messages.archived()) == ["0", "1", "2", "3", "4"]
+    page, _ = messages.conversation("aa" * 32, "bb" * 32)
+    assert contents(page) == ["0", "1", "2", "3", "4"]
@@ -0,0 +1,69 @@
+import os
+
+from core.archive import MessageArchive, ENTRY_SIZE
+
+
+def messages(start, count):
+    return [{"content": f"message {n}", "timestamp": f"2026-10-01 10:{n // 60:02d}:{n % 60:02d}"} for n in range(start, start + count)]
+
+
+def test_get_and_between(tmp_path):
+    archive = MessageArchive(str(tmp_path / "messages.archive"))
+    archive.append_many(messages(0, 100))
+    assert len(archive) == 100
+    assert archive.get(0)["content"] == "message 0"
+    assert archive.get(-1)["content"] == "message 99"
+
+    found = archive.between("2026-10-01 10:00:10", "2026-10-01 10:00:19")
+    assert [m["content"] for m in found] == [f"message {n}" for n in range(10, 20)]
+    assert len(archive.between(limit=5)) == 5
+    archive.close()
+
+
+def test_recover_drops_a_partial_index_entry(tmp_path):
+    path = str(tmp_path / "messages.archive")
+    archive = MessageArchive(path)
+    archive.append_many(messages(0, 10))
+    archive.close()
+    with open(f"{path}.idx", "ab") as f:
+        f.write(b"\1" * (ENTRY_SIZE // 2))
+
+    archive = MessageArchive(path)
+    assert len(archive) == 10
+    assert os.path.getsize(f"{path}.idx") == 10 * ENTRY_SIZE
+    assert archive.get(-1)["content"] == "message 9"
+    archive.close()
+
+
+def test_recover_drops_entries_past_the_segment(tmp_path):
+    path = str(tmp_path / "messages.archive")
+    archive = MessageArchive(path)
+    archive.append_many(messages(0, 10))
+    archive.close()
+    # the segment lost the last record's tail
+    with open(path, "r+b") as f:
+        f.truncate(os.path.getsize(path) - 3)
+
+    archive = MessageArchive(path)
+    assert len(archive) == 9
+    assert archive.get(-1)["content"] == "message 8"
+
+    # appending after a recovery continues cleanly
+    archive.append_many(messages(9, 2))
+    assert [archive.get(n)["content"] for n in (9, 10)] == ["message 9", "message 10"]
+    archive.close()
+
+
+def test_recover_drops_segment_bytes_without_an_entry(tmp_path):
+    path = str(tmp_path / "messages.archive")
+    archive = MessageArchive(path)
+    archive.append_many(messages(0, 3))
+    size = archive.size
+    archive.close()
+    with open(path, "ab") as f:
+        f.write(b'{"content": "never ind')
+
+    archive = MessageArchive(path)
+    assert len(archive) == 3
+    assert os.path.getsize(path) == size
+    archive.close()
@@ -0,0 +1,43 @@
+import os
+import pytest
+
+from core.compression import compress_payload, decompress_payload, choose_method, MARKER, METHOD_NONE, METHOD_ZLIB, METHOD_LZMA, ZLIB_MIN_SIZE
+
+TEXT = ("kari chilo toluri rilu kalugra dovengra " * 100).encode("utf-8")
+
+
+def test_round_trip_every_method():
+    for method in ("auto", "zlib", "lzma", "none", None):
+        payload, method_id = compress_payload(TEXT, method)
+        assert decompress_payload(payload) == TEXT
+        if method in ("zlib", "lzma"):
+            assert payload[0] == MARKER and len(payload) < len(TEXT)
+    assert compress_payload(TEXT, None) == (TEXT, METHOD_NONE)
+
+
+def test_auto_picks_by_size():
+    assert choose_method(ZLIB_MIN_SIZE - 1) == METHOD_NONE
+    assert choose_method(ZLIB_MIN_SIZE) == METHOD_ZLIB
+    assert choose_method(1 << 30) == METHOD_LZMA
+    assert compress_payload(b"short", "auto") == (b"short", METHOD_NONE)
+
+
+def test_incompressible_payload_stays_as_it_is():
+    data = os.urandom(512)
+    assert compress_payload(data, "zlib") == (data, METHOD_NONE)
+
+
+def test_uncompressed_utf8_passes_through():
+    # 0xFF never starts utf-8, so legacy payloads aren't mistaken for compressed ones
+    assert decompress_payload("hello".encode("utf-8")) == b"hello"
+    assert decompress_payload(b"") == b""
+
+
+def test_damaged_or_unknown_payloads_raise():
+    payload, _ = compress_payload(TEXT, "zlib")
+    with pytest.raises(ValueError):
+        decompress_payload(payload[:-5] + b"xxxxx")
+    with pytest.raises(ValueError):
+        decompress_payload(bytes((MARKER, 9)) + b"data")
+    with pytest.raises(ValueError):
+        compress_payload(TEXT, "bzip")
@@ -0,0 +1,139 @@
+import os
+import random
+
+import pytest
+
+from core.config import ConfigFile, Setting, schema_hash
+
+SCHEMA = {
+    "count": Setting(int, 10),
+    "format": Setting(str, "json", ("json", "jsonl")),
+    "enabled": Setting(bool, True)
+}
+
+
+def write(path, text):
+    with open(path, "w") as f:
+        f.write(text)
+
+
+def test_defaults_written_when_missing(tmp_path):
+    path = str(tmp_path / "conf.config")
+    cfg = ConfigFile(path, SCHEMA)
+    assert cfg.config == {"count": 10, "format": "json", "enabled": True}
+    assert os.path.exists(path)
+    assert os.path.exists(f"{path}.snapshot")
+
+
+def test_snapshot_used_while_the_file_is_unchanged(tmp_path, monkeypatch):
+    path = str(tmp_path / "conf.config")
+    write(path, "count = 5\n")
+    assert ConfigFile(path, SCHEMA).get("count") == 5
+
+    def parse(self, lines):
+        raise AssertionError("parsed although the snapshot is current")
+
+    monkeypatch.setattr(ConfigFile, "parse", parse)
+    assert ConfigFile(path, SCHEMA).get("count") == 5
+
+
+def test_snapshot_invalidated_by_an_edit(tmp_path):
+    path = str(tmp_path / "conf.config")
+    write(path, "count = 5\n")
+    cfg = ConfigFile(path, SCHEMA)
+
+    write(path, "count = 77\nformat = 'jsonl'\n")
+    assert ConfigFile(path, SCHEMA).get("count") == 77
+    assert cfg.refresh()
+    assert cfg.get("format") == "jsonl"
+    assert not cfg.refresh()
+
+
+def test_snapshot_invalidated_by_a_schema_change(tmp_path):
+    path = str(tmp_path / "conf.config")
+    write(path, "count = 5\n")
+    ConfigFile(path, SCHEMA)
+
+    schema = dict(SCHEMA, count=Setting(int, 10, (10, 20)))
+    assert ConfigFile(path, schema).get("count") == 10
+
+
+def test_invalid_values_fall_back_to_the_default(tmp_path):
+    path = str(tmp_path / "conf.config")
+    write(path, "count = 'many'\nformat = 'xml'\nenabled = 1\nextra = 'kept'\n")
+    warnings = []
+    cfg = ConfigFile(path, SCHEMA, on_warning=warnings.append)
+    assert cfg.config == {"count": 10, "format": "json", "enabled": True, "extra": "kept"}
+    assert len(warnings) == 3
+
+
+def test_set_checks_and_notifies(tmp_path):
+    cfg = ConfigFile(str(tmp_path / "conf.config"), SCHEMA)
+    changes = []
+    cfg.subscribe(lambda changed, config: changes.append(changed))
+
+    with pytest.raises(ValueError):
+        cfg.set("format", "xml")
+    with pytest.raises(ValueError):
+        cfg.set("count", "5")
+
+    with cfg.transaction():
+        cfg.set("count", 3)
+        cfg.set("enabled", False)
+    assert changes == [{"count": 3, "enabled": False}]
+    assert ConfigFile(cfg.filepath, SCHEMA).get("count") == 3
+
+
+def test_transaction_rolls_back(tmp_path):
+    cfg = ConfigFile(str(tmp_path / "conf.config"), SCHEMA)
+    with pytest.raises(RuntimeError):
+        with cfg.transaction():
+            cfg.set("count", 3)
+            raise RuntimeError("stop")
+    assert cfg.get("count") == 10
+    assert ConfigFile(cfg.filepath, SCHEMA).get("count") == 10
+
+
+def test_minimum(tmp_path):
+    schema = dict(SCHEMA, count=Setting(int, 10, minimum=0))
+    path = str(tmp_path / "conf.config")
+    write(path, "count = -1\n")
+    warnings = []
+    cfg = ConfigFile(path, schema, on_warning=warnings.append)
+    assert cfg.get("count") == 10
+    assert len(warnings) == 1
+
+    cfg.set("count", 0)
+    with pytest.raises(ValueError):
+        cfg.set("count", -5)
+    assert cfg.get("count") == 0
+
+    # the minimum is part of the schema: a stricter one re-parses the file
+    assert ConfigFile(path, dict(SCHEMA, count=Setting(int, 10, minimum=1))).get("count") == 10
+
+
+def random_name():
+    return f"user{random.randint(0, 90000000)}"
+
+
+def test_snapshot_reused_with_a_random_default(tmp_path, monkeypatch):
+    schema = dict(SCHEMA, name=Setting(str, random_name))
+    path = str(tmp_path / "user.config")
+    write(path, "count = 5\n")
+    first = ConfigFile(path, schema)
+    # a key missing from the file gets a fresh default on every load
+    assert first.get("name").startswith("user")
+
+    def parse(self, lines):
+        raise AssertionError("parsed although the snapshot is current")
+
+    monkeypatch.setattr(ConfigFile, "parse", parse)
+    assert ConfigFile(path, schema).get("count") == 5
+    assert schema_hash(schema) == schema_hash(dict(SCHEMA, name=Setting(str, random_name)))
+
+
+def test_random_default_written_once(tmp_path):
+    schema = dict(SCHEMA, name=Setting(str, random_name))
+    path = str(tmp_path / "user.config")
+    name = ConfigFile(path, schema).get("name")
+    assert ConfigFile(path, schema).get("name") == name
@@ -0,0 +1,90 @@
+from core.contacts import ContactIndex, CONTACT_ADDED, CONTACT_UPDATED, CONTACT_UNCHANGED
+from core.records import key_table
+
+
+def key(ssn, rest="0"):
+    # get_ssn is the first 12 hex digits of the key
+    return ssn + rest * 52
+
+
+def contact(public_key, name="someone"):
+    return {"name": name, "public_key": public_key}
+
+
+def test_add_is_an_upsert():
+    index = ContactIndex()
+    assert index.add(contact(key("aaaaaaaaaaaa"))) == CONTACT_ADDED
+    assert index.add(contact(key("aaaaaaaaaaaa"))) == CONTACT_UNCHANGED
+    assert index.add(contact(key("aaaaaaaaaaaa"), "renamed")) == CONTACT_UPDATED
+
+    assert len(index) == 1
+    assert index.get(key("aaaaaaaaaaaa"))["name"] == "renamed"
+    assert index.find_prefix("") == [contact(key("aaaaaaaaaaaa"), "renamed")]
+
+
+def test_bulk_build_keeps_the_last_duplicate():
+    index = ContactIndex([
+        contact(key("bbbbbbbbbbbb"), "first"),
+        {"name": "no key"},
+        contact(key("aaaaaaaaaaaa")),
+        contact(key("bbbbbbbbbbbb"), "second")
+    ])
+    assert len(index) == 2
+    assert index.get(key("bbbbbbbbbbbb"))["name"] == "second"
+    assert [found["public_key"] for found in index.find_prefix("")] == [key("aaaaaaaaaaaa"), key("bbbbbbbbbbbb")]
+
+
+def test_trim_drops_the_oldest():
+    index = ContactIndex()
+    for ssn in ("cccccccccccc", "aaaaaaaaaaaa", "bbbbbbbbbbbb"):
+        index.add(contact(key(ssn)))
+
+    assert index.trim(1) == [contact(key("cccccccccccc")), contact(key("aaaaaaaaaaaa"))]
+    assert index.all() == [contact(key("bbbbbbbbbbbb"))]
+    assert index.find_prefix("") == [contact(key("bbbbbbbbbbbb"))]
+    assert index.trim(5) == []
+
+
+def test_find_prefix_and_collisions():
+    index = ContactIndex()
+    keys = [key("abc000000000"), key("abc111111111"), key("abc111111111", "1"), key("abd000000000")]
+    for public_key in keys:
+        index.add(contact(public_key))
+
+    assert [found["public_key"] for found in index.find_prefix("ABC")] == keys[:3]
+    assert len(index.find_prefix("abc", limit=2)) == 2
+    assert index.find_prefix("abe") == []
+
+    assert index.colliding(keys[1]) == [keys[2]]
+    assert index.collisions() == {"abc111111111": [keys[1], keys[2]]}
+
+    index.remove(keys[2])
+    assert index.collisions() == {}
+    assert index.remove(keys[2]) is None
+    assert [found["public_key"] for found in index.find_prefix("ab")] == [keys[0], keys[1], keys[3]]
+
+
+def test_index_holds_its_keys():
+    public_key = key("eeeeeeeeeeee")
+    index = ContactIndex([contact(public_key)])
+    shared = key_table.intern(public_key)
+    held = key_table.refs[shared]
+
+    index.remove(public_key)
+    assert key_table.refs[shared] == held - 1
+
+
+def test_trim_keeps_the_recently_updated():
+    index = ContactIndex()
+    for ssn in ("aaaaaaaaaaaa", "bbbbbbbbbbbb", "cccccccccccc"):
+        index.add(contact(key(ssn)))
+    index.add(contact(key("aaaaaaaaaaaa"), "renamed"))
+    # unchanged doesn't count as use
+    index.add(contact(key("bbbbbbbbbbbb")))
+
+    assert index.trim(2) == [contact(key("bbbbbbbbbbbb"))]
+    assert index.all() == [contact(key("cccccccccccc")), contact(key("aaaaaaaaaaaa"), "renamed")]
+
+    # the bulk build orders by the last occurrence
+    rebuilt = ContactIndex([contact(key("aaaaaaaaaaaa")), contact(key("bbbbbbbbbbbb")), contact(key("aaaaaaaaaaaa"), "again")])
+    assert [found["public_key"] for found in rebuilt.all()] == [key("bbbbbbbbbbbb"), key("aaaaaaaaaaaa")]
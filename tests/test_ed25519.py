@@ -0,0 +1,189 @@
+import hashlib
+
+import pytest
+
+from core.ed25519 import (
+    B, O, L, clamp_scalar, encodepoint, point_equal, to_extended, ed_add, ed_double, scalarmult, scalarmult_base,
+    base_table, _save_base_table, _load_base_table, batch_inv, batch_to_affine, to_affine, generate_keypairs, verify_keypairs, decodepoint, decodepoint_cache_info, decodepoint_cache_clear, ed_sign, ed_verify, ed_verify_batch, wnaf, scalarmult_var, double_scalarmult, multi_scalarmult, verify_keypair
+)
+
+# public keys the original affine implementation derived for these seeds
+KNOWN_KEYS = {
+    "00" * 32: "3b6a27bcceb6a42d62a3a8d02a6f0d73653215771de243a63ac048a18b59daa9",
+    bytes(range(32)).hex(): "03a107bff3ce10be1d70dd18e74bc09967e4d6309ba50d5f1ddc866412553138",
+    hashlib.sha256(b"ani").hexdigest(): "e8f6575ef453d505869c9d0ff3ee779db82ff922175a8af141536f72bbeaf45e"
+}
+
+# e*B as the original implementation encoded it
+KNOWN_MULTIPLES = {
+    1: "58666666666666666666666666666666666666666666666666666666666666e6",
+    2: "c9a3f86aae465f0e56513864510f3997561fa2c9e85ea21dc2292309f3cd60a2",
+    9: "c0f1225584444ec730446e231390781ffdd2f256e9fcbeb2f40dddc2c2233dff",
+    2**200 + 12345: "5cf4e1a5ea1db5d14f2afc5724e7dfcf823eb7a91bb3278b2f08af2f7af24d40"
+}
+
+
+def public_key(seed):
+    return encodepoint(scalarmult(B, clamp_scalar(hashlib.sha512(seed).digest()[:32])))
+
+
+def test_public_keys_match_the_original():
+    for seed, expected in KNOWN_KEYS.items():
+        assert public_key(bytes.fromhex(seed)).hex() == expected
+        assert verify_keypair((bytes.fromhex(seed), bytes.fromhex(expected)))
+
+
+def test_base_multiples_match_the_original():
+    for e, expected in KNOWN_MULTIPLES.items():
+        assert encodepoint(scalarmult(B, e)).hex() == expected
+        assert encodepoint(scalarmult_base(e)).hex() == expected
+
+
+def test_scalarmult_base_edge_scalars():
+    for e in (0, 8, 15, 16, L - 1, L, L + 1, 2**255 - 1):
+        assert point_equal(scalarmult_base(e), scalarmult(B, e % L))
+
+
+def test_base_table_cache_round_trip(tmp_path):
+    path = str(tmp_path / "basepoint.table")
+    _save_base_table(path, base_table())
+    assert _load_base_table(path) == base_table()
+
+    # a damaged cache isn't used
+    with open(path, "r+b") as f:
+        f.seek(100)
+        f.write(b"\xff")
+    assert _load_base_table(path) is None
+
+
+def test_add_and_double_agree():
+    P = to_extended(B)
+    assert point_equal(ed_double(P), ed_add(P, P))
+    assert point_equal(ed_add(P, O), P)
+    assert encodepoint(ed_add(ed_double(P), P)) == encodepoint(scalarmult(B, 3))
+
+
+def test_wnaf_digits_sum_to_the_scalar():
+    for e in (0, 1, 31, 32, 2**200 + 12345, L - 1):
+        digits = wnaf(e)
+        assert sum(digit << i for i, digit in enumerate(digits)) == e
+        assert all(digit == 0 or (digit % 2 and abs(digit) < 16) for digit in digits)
+
+
+def test_variable_base_matches_scalarmult():
+    P = scalarmult(B, 7)
+    for e in (0, 1, 2, 2**130 + 5, L - 1):
+        assert point_equal(scalarmult_var(P, e), scalarmult(P, e))
+
+
+def test_multi_scalarmult_matches_separate_products():
+    P = scalarmult_base(7)
+    Q = scalarmult_base(2**130 + 5)
+    a, b = 2**250 + 99, L - 3
+    expected = encodepoint(scalarmult_base((a * 7 + b * (2**130 + 5)) % L))
+    assert encodepoint(multi_scalarmult([(a, P), (b, Q)])) == expected
+    assert encodepoint(double_scalarmult(a, P, b, Q)) == expected
+    assert point_equal(multi_scalarmult([(-a, P), (a, P)]), O)
+    assert point_equal(multi_scalarmult([]), O)
+
+
+def test_verify_keypair_rejects_a_wrong_key():
+    seed = bytes(range(32))
+    other = bytes.fromhex(KNOWN_KEYS["00" * 32])
+    assert not verify_keypair((seed, other))
+    assert verify_keypair(seed + public_key(seed))
+
+
+def test_batch_inversion():
+    values = [3, 5, 2**200 + 1, 12345]
+    inverses = batch_inv(values)
+    assert all(value * inverse % (2**255 - 19) == 1 for value, inverse in zip(values, inverses))
+
+    points = [scalarmult_base(e) for e in (1, 2, 3, 2**100)]
+    assert batch_to_affine(points) == [to_affine(P) for P in points]
+
+
+def test_generated_keypairs_are_valid():
+    keypairs = generate_keypairs(8, workers=1)
+    assert len(keypairs) == 8
+    for seed, pub, valid in keypairs:
+        assert valid
+        assert public_key(seed) == pub
+
+
+def test_generated_keypairs_across_a_pool():
+    keypairs = generate_keypairs(6, workers=2, chunk_size=2)
+    assert len(keypairs) == 6
+    assert len({seed for seed, _, _ in keypairs}) == 6
+    assert all(public_key(seed) == pub for seed, pub, _ in keypairs)
+
+
+def test_verify_keypairs_flags_the_mismatch():
+    keypairs = [(seed, pub) for seed, pub, _ in generate_keypairs(5, workers=1)]
+    seed, pub = keypairs[2]
+    keypairs[2] = (seed, keypairs[3][1])
+    assert verify_keypairs(keypairs, workers=1) == [True, True, False, True, True]
+    assert verify_keypairs(keypairs, workers=2, chunk_size=2) == [True, True, False, True, True]
+
+
+def test_decode_encode_round_trip():
+    for encoded in list(KNOWN_MULTIPLES.values()) + list(KNOWN_KEYS.values()):
+        assert encodepoint(decodepoint(bytes.fromhex(encoded))).hex() == encoded
+        assert point_equal(decodepoint(encoded), decodepoint(bytes.fromhex(encoded)))
+
+
+def test_decode_rejects_bad_encodings():
+    with pytest.raises(ValueError):
+        decodepoint(bytes(31))
+    with pytest.raises(ValueError):
+        decodepoint(b"\xff" * 31 + b"\x7f")   # y >= p
+    with pytest.raises(ValueError):
+        decodepoint((2).to_bytes(32, "little"))  # no x for y = 2
+
+
+def test_decode_cache_hits():
+    decodepoint_cache_clear()
+    encoded = bytes.fromhex(KNOWN_MULTIPLES[9])
+    decodepoint(encoded)
+    decodepoint(encoded)
+    info = decodepoint_cache_info()
+    assert (info.hits, info.misses) == (1, 1)
+
+
+def test_sign_verify():
+    seed = bytes(range(32))
+    pub = public_key(seed)
+    signature = ed_sign(seed, b"hello")
+
+    assert len(signature) == 64
+    assert ed_sign(seed, b"hello") == signature   # deterministic
+    assert ed_verify(pub, b"hello", signature)
+    assert not ed_verify(pub, b"hellp", signature)
+    assert not ed_verify(public_key(bytes(32)), b"hello", signature)
+
+    tampered = bytearray(signature)
+    tampered[40] ^= 1
+    assert not ed_verify(pub, b"hello", bytes(tampered))
+    assert not ed_verify(pub, b"hello", signature[:63])
+
+
+def test_batch_verify_finds_the_tampered_item():
+    seeds = [hashlib.sha256(bytes([n])).digest() for n in range(6)]
+    items = [(public_key(seed), f"message {n}".encode(), ed_sign(seed, f"message {n}".encode())) for n, seed in enumerate(seeds)]
+    assert ed_verify_batch(items) == [True] * len(items)
+
+    pub, message, signature = items[3]
+    items[3] = (pub, message + b"!", signature)
+    assert ed_verify_batch(items) == [True, True, True, False, True, True]
+
+    # a signature that can't even be parsed fails on its own
+    items[1] = (items[1][0], items[1][1], b"short")
+    assert ed_verify_batch(items) == [True, False, True, False, True, True]
+
+
+def test_batch_verify_same_key_many_messages():
+    seed = bytes(range(32))
+    pub = public_key(seed)
+    items = [(pub, bytes([n]), ed_sign(seed, bytes([n]))) for n in range(5)]
+    assert ed_verify_batch(items) == [True] * 5
+    assert ed_verify_batch([]) == []
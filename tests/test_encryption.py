@@ -0,0 +1,94 @@
+import io
+import hashlib
+
+from core.ed25519 import B, clamp_scalar, encodepoint, scalarmult
+from core.encryption import (
+    encrypt, decrypt_with_pub, encrypt_broadcast, decrypt_broadcast, encrypt_into, decrypt_into, encrypt_stream, decrypt_stream, encrypt_iter, decrypt_iter,
+    sign, check_integrity, check_integrity_batch
+)
+
+SEED = hashlib.sha256(b"sender").hexdigest()
+SENDER = encodepoint(scalarmult(B, clamp_scalar(hashlib.sha512(bytes.fromhex(SEED)).digest()[:32]))).hex()
+RECEIVER = hashlib.sha256(b"receiver").hexdigest()
+
+MESSAGE = "kari chilo toluri " * 50
+
+
+class ReadOnly:
+    # a source without readinto()
+    def __init__(self, data):
+        self.stream = io.BytesIO(data)
+
+    def read(self, n):
+        return self.stream.read(n)
+
+
+def test_encrypt_decrypt_round_trip():
+    ciphertext = encrypt(SENDER, RECEIVER, MESSAGE)
+    assert len(ciphertext) == 2 * len(MESSAGE)
+    assert decrypt_with_pub(ciphertext, RECEIVER) == MESSAGE
+
+
+def test_into_matches_encrypt():
+    data = MESSAGE.encode("utf-8")
+    buffer = bytearray(data)
+    assert encrypt_into(buffer, buffer, RECEIVER) == len(data)
+    assert buffer.hex() == encrypt(SENDER, RECEIVER, MESSAGE)
+
+    plain = bytearray(len(data))
+    decrypt_into(plain, buffer, RECEIVER)
+    assert plain == data
+
+
+def test_stream_matches_encrypt():
+    data = MESSAGE.encode("utf-8")
+    expected = bytes.fromhex(encrypt(SENDER, RECEIVER, MESSAGE))
+    for src in (io.BytesIO(data), ReadOnly(data)):
+        dst = io.BytesIO()
+        assert encrypt_stream(src, dst, RECEIVER, chunk_size=7) == len(data)
+        assert dst.getvalue() == expected
+
+    plain = io.BytesIO()
+    decrypt_stream(io.BytesIO(expected), plain, RECEIVER, chunk_size=64)
+    assert plain.getvalue() == data
+
+
+def test_iter_matches_encrypt():
+    data = MESSAGE.encode("utf-8")
+    chunks = [data[i:i + 13] for i in range(0, len(data), 13)]
+    encrypted = list(encrypt_iter(chunks, RECEIVER))
+    assert [len(chunk) for chunk in encrypted] == [len(chunk) for chunk in chunks]
+    assert b"".join(encrypted).hex() == encrypt(SENDER, RECEIVER, MESSAGE)
+    assert b"".join(decrypt_iter(encrypted, RECEIVER)) == data
+
+
+def test_sign_and_check_integrity():
+    message_signature, content_signature = sign(SENDER, RECEIVER, "hello there", SEED)
+    assert content_signature == hashlib.sha256(b"hello there").hexdigest()
+    assert check_integrity("hello there", message_signature, SENDER)
+    assert not check_integrity("hello therE", message_signature, SENDER)
+    assert not check_integrity("hello there", "zz", SENDER)
+
+    # the private key (seed + public key) signs the same
+    assert sign(SENDER, RECEIVER, "hello there", SEED + SENDER)[0] == message_signature
+
+
+def test_check_integrity_batch():
+    messages = [(f"message {n}", sign(SENDER, RECEIVER, f"message {n}", SEED)[0], SENDER) for n in range(4)]
+    assert check_integrity_batch(messages) == [True] * 4
+
+    messages[1] = ("changed", messages[1][1], SENDER)
+    messages[2] = (messages[2][0], "not hex", SENDER)
+    assert check_integrity_batch(messages) == [True, False, False, True]
+
+
+def test_broadcast_encrypts_the_body_once():
+    receivers = [hashlib.sha256(bytes([n])).hexdigest() for n in range(3)]
+    ciphertext, _, wrapped_keys = encrypt_broadcast(receivers, MESSAGE, None)
+    assert len(ciphertext) == len(MESSAGE)
+    assert [key for key, _ in wrapped_keys] == receivers
+    for receiver, wrapped in wrapped_keys:
+        assert decrypt_broadcast(ciphertext, wrapped, receiver) == MESSAGE
+
+    # someone else's wrapped key doesn't open it
+    assert decrypt_broadcast(ciphertext, wrapped_keys[0][1], receivers[1]) != MESSAGE
@@ -0,0 +1,113 @@
+import io
+
+import pytest
+
+from core.frame import make_frame, pack, unpack, render_armored, parse_armored, iter_armored, HEADER_SIZE, TOP_MARKING, BOTTOM_MARKING, FLAG_BROADCAST
+
+SSN = "0123456789ab"
+SIGNATURE = bytes(range(64))
+CONTENT_SIGNATURE = bytes(range(32))
+
+
+def frame(ciphertext=b"ciphertext bytes", **options):
+    return make_frame(SSN, SIGNATURE, CONTENT_SIGNATURE, ciphertext, timestamp=1760000000, flags=1, **options)
+
+
+def test_pack_unpack_round_trip():
+    original = frame()
+    packed = pack(original)
+    assert len(packed) == HEADER_SIZE + 64 + 32 + len(b"ciphertext bytes")
+
+    unpacked = unpack(packed)
+    assert unpacked.version == original.version
+    assert unpacked.flags == 1
+    assert unpacked.timestamp == 1760000000
+    assert unpacked.ssn == SSN
+    assert bytes(unpacked.message_signature) == SIGNATURE
+    assert bytes(unpacked.content_signature) == CONTENT_SIGNATURE
+    assert bytes(unpacked.ciphertext) == b"ciphertext bytes"
+    assert pack(unpacked) == packed
+
+
+def test_hex_signatures_and_empty_ciphertext():
+    packed = pack(make_frame(SSN, SIGNATURE.hex(), CONTENT_SIGNATURE.hex(), b"", timestamp=1))
+    unpacked = unpack(packed)
+    assert bytes(unpacked.message_signature) == SIGNATURE
+    assert bytes(unpacked.ciphertext) == b""
+
+
+def test_unpack_rejects_damaged_frames():
+    packed = pack(frame())
+    with pytest.raises(ValueError):
+        unpack(packed[:-1])
+    with pytest.raises(ValueError):
+        unpack(packed + b"x")
+    with pytest.raises(ValueError):
+        unpack(b"XXXX" + packed[4:])
+    with pytest.raises(ValueError):
+        unpack(packed[:10])
+    with pytest.raises(ValueError):
+        pack(make_frame("short", SIGNATURE, CONTENT_SIGNATURE, b""))
+
+
+def test_broadcast_round_trip():
+    recipients = [("aa" * 32, bytes(32)), ("bb" * 32, bytes(range(32)))]
+    unpacked = unpack(pack(frame(recipients=recipients)))
+    assert unpacked.flags & FLAG_BROADCAST
+    assert [(key, bytes(wrapped)) for key, wrapped in unpacked.recipients] == recipients
+    assert bytes(unpacked.ciphertext) == b"ciphertext bytes"
+
+
+def test_broadcast_rejects_bad_recipient_tables():
+    with pytest.raises(ValueError):
+        pack(frame(recipients=[("aa" * 31, bytes(32))]))
+    packed = bytearray(pack(frame(recipients=[("aa" * 32, bytes(32))])))
+    # claim a second recipient the table doesn't hold
+    packed[HEADER_SIZE + 64 + 32] = 9
+    with pytest.raises(ValueError):
+        unpack(bytes(packed))
+
+
+def test_armored_text():
+    text = render_armored(frame(), True, qr=False)
+    assert text.startswith(f"{TOP_MARKING}{b'ciphertext bytes'.hex()}{BOTTOM_MARKING}")
+    assert f"Sender SSN: {SSN}" in text
+    assert f"Message signature: {SIGNATURE.hex()}" in text
+    assert text.endswith(f"Content signature: {CONTENT_SIGNATURE.hex()}\n")
+
+
+def test_armored_recipients():
+    text = render_armored(frame(recipients=[("cc" * 32, bytes(32))]), True, qr=False)
+    assert f"Recipient: {'cc' * 32} {'00' * 32}" in text
+
+
+def test_armored_round_trip():
+    original = frame(recipients=[("cc" * 32, bytes(32))])
+    text = "noise before\n" + render_armored(original, True) + render_armored(frame(b"second"), False, qr=False)
+    first, second = parse_armored(text)
+
+    assert first["ciphertext"] == b"ciphertext bytes".hex()
+    assert first["ssn"] == SSN
+    assert first["integrity"] == "True"
+    assert first["message_signature"] == SIGNATURE.hex()
+    assert first["content_signature"] == CONTENT_SIGNATURE.hex()
+    assert first["recipients"] == [("cc" * 32, "00" * 32)]
+    assert second["ciphertext"] == b"second".hex()
+    assert second["recipients"] == []
+
+
+def test_iter_armored_in_small_chunks():
+    # chunk edges land inside markers, fields and the QR art
+    text = "".join(render_armored(frame(bytes([n]) * 40), n % 2 == 0) for n in range(3))
+    records = list(iter_armored(io.StringIO(text), chunk_size=7))
+    assert [record["ciphertext"] for record in records] == [(bytes([n]) * 40).hex() for n in range(3)]
+    assert records == parse_armored(text)
+
+
+def test_iter_armored_cut_off_message():
+    text = render_armored(frame(), True)
+    cut = text[:text.index(BOTTOM_MARKING)]
+    record, = iter_armored(io.StringIO(cut))
+    assert record["ciphertext"] == b"ciphertext bytes".hex()
+    assert record["truncated"]
+    assert "truncated" not in parse_armored(text)[0]
@@ -0,0 +1,51 @@
+import os
+import array
+import pytest
+
+import core.helpers as helpers
+from core.helpers import xor_into
+
+
+def plain_xor(a, b):
+    return bytes(x ^ y for x, y in zip(a, b))
+
+
+def test_xor_into_matches_bytewise_xor():
+    for n in (0, 1, 100, 5000):
+        src, keystream = os.urandom(n), os.urandom(n + 3)
+        dst = bytearray(n)
+        assert xor_into(dst, src, keystream) == n
+        assert bytes(dst) == plain_xor(src, keystream)
+
+
+def test_xor_in_place_and_across_blocks(monkeypatch):
+    monkeypatch.setattr(helpers, "XOR_BLOCK_SIZE", 7)
+    src, keystream = os.urandom(100), os.urandom(100)
+    buffer = bytearray(src)
+    xor_into(buffer, buffer, keystream)
+    assert bytes(buffer) == plain_xor(src, keystream)
+
+
+def test_xor_into_other_buffer_types():
+    src = array.array("I", range(10))
+    keystream = os.urandom(40)
+    dst = memoryview(bytearray(50))[5:]
+    assert xor_into(dst, src, keystream) == 40
+    assert bytes(dst[:40]) == plain_xor(src.tobytes(), keystream)
+
+
+def test_pure_python_path_matches_numpy(monkeypatch):
+    src, keystream = os.urandom(10000), os.urandom(10000)
+    dst = bytearray(10000)
+    monkeypatch.setattr(helpers, "numpy", None)
+    xor_into(dst, src, keystream)
+    assert bytes(dst) == plain_xor(src, keystream)
+
+
+def test_xor_into_rejects_bad_buffers():
+    with pytest.raises(ValueError):
+        xor_into(bytearray(4), b"abcd", b"ab")
+    with pytest.raises(ValueError):
+        xor_into(bytearray(2), b"abcd", b"abcd")
+    with pytest.raises(ValueError):
+        xor_into(b"read", b"abcd", b"abcd")
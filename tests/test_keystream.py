@@ -0,0 +1,70 @@
+import random
+import hashlib
+
+from core.keystream import Keystream, KeystreamCache, keystream_for, seed_from_key
+from core.encryption import generate_keystream, encrypt
+
+KEY = hashlib.sha256(b"receiver").hexdigest()
+
+
+def legacy_keystream(key, length):
+    # what encryption did before core/keystream.py
+    rng = random.Random(int(hashlib.sha256(key.encode()).hexdigest(), 16))
+    return bytes(rng.randint(0, 255) for _ in range(length))
+
+
+def test_seed_matches_legacy():
+    assert seed_from_key(KEY) == int(hashlib.sha256(KEY.encode()).hexdigest(), 16)
+
+
+def test_keystream_matches_randint():
+    for length in (0, 1, 7, 100, 5000):
+        assert bytes(generate_keystream(KEY, length)) == legacy_keystream(KEY, length)
+    for key in ("", "x", "ab" * 64):
+        assert keystream_for(key).read(300) == legacy_keystream(key, 300)
+
+
+def test_reads_in_pieces_match_one_read():
+    stream = Keystream(random.Random(seed_from_key(KEY)))
+    pieces = b"".join(stream.read(n) for n in (1, 0, 13, 300, 2, 4096))
+    assert pieces == legacy_keystream(KEY, len(pieces))
+
+
+def test_ciphertext_matches_the_legacy_xor():
+    message = "kari chilo toluri " * 20
+    data = message.encode("utf-8")
+    ciphertext = encrypt(hashlib.sha256(b"sender").hexdigest(), KEY, message)
+    assert bytes.fromhex(ciphertext) == bytes(a ^ b for a, b in zip(data, legacy_keystream(KEY, len(data))))
+
+
+def test_cached_keystream_matches_uncached():
+    cache = KeystreamCache(prefix_size=64)
+    for _ in range(3):
+        # past the cached prefix too, where it resumes from the packed state
+        assert cache.keystream(KEY).read(1000) == legacy_keystream(KEY, 1000)
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["misses"] == 1
+
+
+def test_cache_evicts_past_its_limits():
+    cache = KeystreamCache(max_entries=2, prefix_size=16)
+    keys = [hashlib.sha256(bytes([n])).hexdigest() for n in range(3)]
+    for key in keys:
+        cache.keystream(key)
+    assert cache.stats()["entries"] == 2
+    assert cache.stats()["evictions"] == 1
+    assert keys[0] not in cache.entries
+
+    cache.evict(keys[1])
+    assert cache.stats()["entries"] == 1
+    assert cache.keystream(keys[1]).read(40) == legacy_keystream(keys[1], 40)
+
+
+def test_byte_limit_and_disabled_cache():
+    small = KeystreamCache(max_bytes=10, prefix_size=64)
+    assert small.keystream(KEY).read(100) == legacy_keystream(KEY, 100)
+    assert small.stats()["entries"] == 0
+
+    off = KeystreamCache(max_entries=0)
+    assert off.keystream(KEY).read(100) == legacy_keystream(KEY, 100)
+    assert off.stats()["entries"] == 0
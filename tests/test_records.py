@@ -0,0 +1,142 @@
+import pytest
+
+from core.records import Message, Contact, Keypair, MessageRing, KeyTable, key_table, compact, as_dicts, pack_timestamp, unpack_timestamp, raw_key
+
+
+SENDER = "ab" * 32
+RECEIVER = "cd" * 32
+
+
+def message(n, sender=SENDER):
+    return {"content": f"message {n}", "sender_public_key": sender, "receiver_public_key": RECEIVER,
+            "timestamp": f"2026-10-01 10:00:{n % 60:02d}"}
+
+
+def test_timestamps():
+    assert pack_timestamp("2026-10-01 10:00:59") == 20261001100059
+    assert unpack_timestamp(20261001100059) == "2026-10-01 10:00:59"
+    assert pack_timestamp("2026-10-01T10:00:59") is None
+    assert pack_timestamp("2026-10-01 10:00:5x") is None
+    assert pack_timestamp(None) is None
+
+
+def test_message_round_trip():
+    record = compact(Message, message(3))
+    assert isinstance(record, Message)
+    assert record == message(3)
+    assert record.to_dict() == message(3)
+    assert record["sender_public_key"] == SENDER
+    assert record.get("missing", "default") == "default"
+    with pytest.raises(KeyError):
+        record["missing"]
+
+    record["timestamp"] = "2026-10-02 00:00:00"
+    assert record.stamp == 20261002000000
+    with pytest.raises(ValueError):
+        record["timestamp"] = "yesterday"
+
+
+def test_dicts_that_dont_fit_are_kept():
+    odd = [dict(message(0), extra=1), dict(message(0), timestamp="yesterday"), {"content": "only"}]
+    for record in odd:
+        assert compact(Message, record) is record
+    # a key that isn't lowercase hex stays a string
+    assert compact(Message, message(0, sender="AB" * 32)).sender == "AB" * 32
+
+
+def test_contact_and_keypair():
+    contact = compact(Contact, {"name": SENDER[:12], "public_key": SENDER})
+    assert contact.label is None
+    assert contact == {"name": SENDER[:12], "public_key": SENDER}
+    contact["name"] = "friend"
+    assert contact.to_dict() == {"name": "friend", "public_key": SENDER}
+
+    seed = "11" * 32
+    keypair = compact(Keypair, {"seed": seed, "public_key": SENDER, "private_key": seed + SENDER, "valid": True})
+    assert keypair.private is None
+    assert keypair["private_key"] == seed + SENDER
+    assert as_dicts([keypair, {"other": 1}]) == [{"seed": seed, "public_key": SENDER, "private_key": seed + SENDER, "valid": True}, {"other": 1}]
+
+
+def test_keys_are_shared():
+    first = compact(Message, message(0))
+    second = compact(Message, message(1))
+    assert first.sender is second.sender
+    assert first.sender == raw_key(SENDER)
+
+
+def test_key_table_retain_release_prune():
+    table = KeyTable()
+    kept = table.retain("01" * 32)
+    assert table.retain("01" * 32) is kept
+    dropped = table.retain("02" * 32)
+    table.intern("03" * 32)
+    assert len(table) == 3
+
+    table.release(dropped)
+    table.release(dropped)      # one release too many is ignored
+    table.release(kept)
+    assert table.prune() == 2
+    assert list(table.keys) == [kept]
+    assert table.refs[kept] == 1
+
+
+def test_holders_count_their_keys():
+    key = raw_key(SENDER)
+    before = key_table.refs.get(key, 0)
+
+    record = compact(Message, message(0))
+    assert key_table.refs[key] == before + 1
+    record["sender_public_key"] = RECEIVER
+    assert key_table.refs[key] == before
+    del record
+
+    ring = MessageRing(1, [message(0)])
+    assert key_table.refs[key] == before + 1
+    ring.append(message(1, sender=RECEIVER))
+    assert key_table.refs[key] == before
+    ring.append(message(2))
+    ring.clear()
+    assert key_table.refs[key] == before
+
+
+def test_records_are_unhashable():
+    with pytest.raises(TypeError):
+        hash(compact(Message, message(0)))
+
+
+def test_ring_wraps_around():
+    ring = MessageRing(3)
+    ring.extend(message(n) for n in range(5))
+    assert len(ring) == 3
+    assert ring.head == 2
+    assert [m["content"] for m in ring] == ["message 2", "message 3", "message 4"]
+    assert ring[0]["content"] == "message 2"
+    assert ring[-1]["content"] == "message 4"
+    with pytest.raises(IndexError):
+        ring[3]
+
+    # a dict that doesn't fit is stored as it is
+    ring.append({"content": "raw"})
+    assert ring[-1] == {"content": "raw"}
+    assert [m["content"] for m in ring] == ["message 3", "message 4", "raw"]
+
+
+def test_ring_delete():
+    ring = MessageRing(4)
+    ring.extend(message(n) for n in range(6))
+    del ring[1]
+    assert [m["content"] for m in ring] == ["message 2", "message 4", "message 5"]
+    del ring[-1]
+    assert [m["content"] for m in ring] == ["message 2", "message 4"]
+    with pytest.raises(IndexError):
+        del ring[2]
+
+    ring.extend(message(n) for n in range(6, 9))
+    assert [m["content"] for m in ring] == ["message 4", "message 6", "message 7", "message 8"]
+
+
+def test_ring_with_no_capacity():
+    ring = MessageRing(0, [message(0)])
+    assert len(ring) == 0
+    assert list(ring) == []
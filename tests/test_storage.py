@@ -0,0 +1,225 @@
+import os
+import json
+import time
+import threading
+
+import pytest
+
+from core.storage import JsonlLog, MessageDb, WriteBehind, write_atomic
+
+
+def test_jsonl_append_and_load(tmp_path):
+    log = JsonlLog(str(tmp_path / "data" / "log.jsonl"))
+    assert not log.exists()
+    assert log.load() == []
+
+    log.append({"n": 0})
+    log.extend([{"n": 1}, {"n": 2}])
+    log.close()
+    assert log.exists()
+
+    reopened = JsonlLog(log.filepath)
+    assert reopened.load() == [{"n": 0}, {"n": 1}, {"n": 2}]
+    assert reopened.count == 3
+    assert reopened.load(limit=2) == [{"n": 1}, {"n": 2}]
+
+
+def test_jsonl_skips_damaged_lines(tmp_path):
+    path = tmp_path / "log.jsonl"
+    path.write_text('{"n": 0}\n\n{"n": 1\n{"n": 2}\n{"n": ')
+    assert JsonlLog(str(path)).load() == [{"n": 0}, {"n": 2}]
+
+
+def test_jsonl_compact(tmp_path):
+    log = JsonlLog(str(tmp_path / "log.jsonl"), fsync_every=2)
+    log.extend([{"n": n} for n in range(5)])
+    assert log.unsynced == 0
+
+    log.compact([{"n": 3}, {"n": 4}])
+    assert log.count == 2
+    assert not (tmp_path / "log.jsonl.tmp").exists()
+
+    log.append({"n": 5})
+    log.close()
+    assert JsonlLog(log.filepath).load() == [{"n": 3}, {"n": 4}, {"n": 5}]
+
+
+def test_message_parser_jsonl_mode(app, tmp_path):
+    path = str(tmp_path / "data" / "messages.jsonl")
+    parser = app.MessageParser(path, limit=3, storage="jsonl")
+    for n in range(7):
+        parser.append_message({"content": str(n)})
+    parser.close()
+
+    # compacted once the log passed twice the limit
+    assert parser.log.count <= 2 * parser.limit
+    reopened = app.MessageParser(path, limit=3, storage="jsonl")
+    assert [message["content"] for message in reopened.get_all()] == ["4", "5", "6"]
+    reopened.close()
+
+
+def message(n, sender="aa", receiver="bb"):
+    return {"content": str(n), "sender_public_key": sender, "receiver_public_key": receiver,
+            "timestamp": f"2026-01-01 00:00:{n // 2:02d}"}
+
+
+def test_message_db_latest_and_trim(tmp_path):
+    db = MessageDb(str(tmp_path / "messages.db"))
+    db.insert_many([message(n) for n in range(10)])
+    assert db.count() == 10
+    assert [record["content"] for record in db.latest(3)] == ["7", "8", "9"]
+
+    db.insert_many([message(10)], keep=4)
+    assert db.count() == 4
+    assert [record["content"] for record in db.latest(10)] == ["7", "8", "9", "10"]
+    db.close()
+
+
+def test_message_db_conversation_pages(tmp_path):
+    db = MessageDb(str(tmp_path / "messages.db"))
+    records = []
+    for n in range(12):
+        # both directions, plus noise from a third key; pairs of messages share a timestamp
+        records.append(message(n, *(("aa", "bb") if n % 2 else ("bb", "aa"))))
+        records.append(message(n, "cc", "aa"))
+    db.insert_many(records)
+
+    seen, cursor = [], None
+    while True:
+        page, cursor = db.conversation("aa", "bb", cursor=cursor, page_size=5)
+        assert len(page) <= 5
+        seen.extend(record["content"] for record in page)
+        if cursor is None:
+            break
+    assert seen == [str(n) for n in range(12)]
+
+    page, cursor = db.conversation("bb", "aa", after="2026-01-01 00:00:03")
+    assert [record["content"] for record in page] == ["8", "9", "10", "11"]
+    assert cursor is None
+    db.close()
+
+
+def test_write_behind_coalesces(tmp_path):
+    path = str(tmp_path / "store.json")
+    written = []
+    writer = WriteBehind(delay=60, max_pending=1000, on_written=written.append)
+    for n in range(5):
+        writer.schedule(path, json.dumps([n]))
+    assert writer.owns(path)
+
+    writer.flush()
+    assert not writer.owns(path)
+    assert writer.writes == 1
+    assert written == [path]
+    with open(path) as f:
+        assert json.load(f) == [4]
+
+    writer.schedule(path, b"\x00binary")
+    writer.flush()
+    with open(path, "rb") as f:
+        assert f.read() == b"\x00binary"
+
+
+def wait_until(condition):
+    deadline = time.monotonic() + 5
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_write_behind_background_flush(tmp_path):
+    path = str(tmp_path / "store.json")
+    writer = WriteBehind(delay=60, max_pending=2)
+    writer.schedule(path, "[1]")
+    writer.schedule(path, "[2]")
+
+    # max_pending reached, the thread doesn't wait out the delay
+    assert wait_until(lambda: not writer.owns(path))
+    with open(path) as f:
+        assert json.load(f) == [2]
+
+
+def test_write_behind_failed_write_stays_pending(tmp_path):
+    # a file where the directory should be makes the write fail
+    blocker = tmp_path / "data"
+    blocker.write_text("")
+    path = str(blocker / "store.json")
+
+    writer = WriteBehind(delay=60, max_pending=1000)
+    writer.schedule(path, "[1]")
+    with pytest.raises(OSError):
+        writer.flush()
+    assert writer.owns(path)
+    assert writer.writes == 0
+
+    blocker.unlink()
+    writer.flush()
+    assert not writer.owns(path)
+    assert writer.last_error is None
+    with open(path) as f:
+        assert json.load(f) == [1]
+
+
+def test_write_behind_thread_reports_and_retries(tmp_path):
+    blocker = tmp_path / "data"
+    blocker.write_text("")
+    path = str(blocker / "store.json")
+    errors = []
+    writer = WriteBehind(delay=0.01, max_pending=1000, on_error=lambda filepath, error: errors.append(filepath))
+
+    writer.schedule(path, "[1]")
+    assert wait_until(lambda: errors)
+    assert errors[0] == path
+    assert writer.owns(path)
+
+    # the thread is still alive and picks the write up with the next one
+    blocker.unlink()
+    writer.schedule(str(tmp_path / "other.json"), "[2]")
+    assert wait_until(lambda: not writer.owns(path))
+    with open(path) as f:
+        assert json.load(f) == [1]
+
+
+def test_message_db_delete_latest(tmp_path):
+    db = MessageDb(str(tmp_path / "messages.db"))
+    db.insert_many([message(n) for n in range(5)])
+    db.delete_latest(1)
+    assert [record["content"] for record in db.latest(10)] == ["0", "1", "2", "4"]
+    db.trim(2)
+    assert [record["content"] for record in db.latest(10)] == ["2", "4"]
+    db.close()
+
+
+def test_concurrent_atomic_writes(tmp_path):
+    path = str(tmp_path / "store.json")
+    texts = [json.dumps([n] * 2000) for n in range(8)]
+    threads = [threading.Thread(target=lambda text=text: [write_atomic(path, text) for _ in range(10)]) for text in texts]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # one whole write won, no temp file is left behind
+    with open(path) as f:
+        assert f.read() in texts
+    assert os.listdir(tmp_path) == ["store.json"]
+
+
+def test_failed_atomic_write_leaves_nothing(tmp_path):
+    path = str(tmp_path / "store.json")
+    write_atomic(path, "[1]")
+    with pytest.raises(AttributeError):
+        write_atomic(path, None)
+    assert os.listdir(tmp_path) == ["store.json"]
+    with open(path) as f:
+        assert f.read() == "[1]"
+
+
+def test_message_db_between(tmp_path):
+    db = MessageDb(str(tmp_path / "messages.db"))
+    db.insert_many([message(n) for n in range(10)])
+    assert [record["content"] for record in db.between("2026-01-01 00:00:01", "2026-01-01 00:00:02")] == ["2", "3", "4", "5"]
+    assert [record["content"] for record in db.between(end="2026-01-01 00:00:00")] == ["0", "1"]
+    assert len(db.between()) == 10
+    assert [record["content"] for record in db.between("2026-01-01 00:00:04", limit=1)] == ["8"]
+    db.close()